@@ -0,0 +1,3 @@
+"""
+Бенчмарки парсера на локальных фикстурах (сайт, конфигурации, GitHub API)
+"""
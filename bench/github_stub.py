@@ -0,0 +1,170 @@
+"""
+Заглушка GitHub для bench/: raw файлы репозитория и Git Data API коммитов
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+RAW_PREFIX = "/raw/"
+API_PREFIX = "/api/"
+
+
+class GitHubStub:
+    """Локальный GitHub: GET raw файлов из каталога фикстур и запись коммитов в память"""
+
+    def __init__(self, files_dir: str, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0):
+        self.files_dir = files_dir
+        self.host = host
+        self.port = port
+        self.latency = latency
+
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+        self.head_sha = hashlib.sha1(b"bench-base").hexdigest()
+        self.calls: List[Tuple[str, str]] = []
+        self.blobs: Dict[str, int] = {}
+        self.commits: List[Dict[str, Any]] = []
+
+    @property
+    def raw_url(self) -> str:
+        return f"http://{self.host}:{self.port}{RAW_PREFIX.rstrip('/')}"
+
+    @property
+    def api_url(self) -> str:
+        return f"http://{self.host}:{self.port}{API_PREFIX.rstrip('/')}"
+
+    def environment(self) -> Dict[str, str]:
+        """Переменные окружения, направляющие GitHubManager на заглушку"""
+        return {
+            'GITHUB_API_URL': self.api_url,
+            'GITHUB_RAW_URL': self.raw_url,
+            'GITHUB_TOKEN': 'bench-token'
+        }
+
+    def start(self) -> 'GitHubStub':
+        """Запуск заглушки в фоновом потоке"""
+        self._server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Остановка заглушки"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        """Сводка обращений к заглушке"""
+        with self._lock:
+            return {
+                'requests': len(self.calls),
+                'raw_downloads': sum(1 for _, path in self.calls if path.startswith(RAW_PREFIX)),
+                'blobs': len(self.blobs),
+                'commits': len(self.commits)
+            }
+
+    def _new_sha(self, payload: bytes) -> str:
+        return hashlib.sha1(payload + str(time.time()).encode()).hexdigest()
+
+    def _handle_api(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        """Минимальное подмножество Git Data API, которое использует GitHubManager"""
+        parts = path[len(API_PREFIX):].split('/')
+        # repos/{owner}/{repo}/git/{kind}/...
+        if len(parts) < 5 or parts[0] != 'repos' or parts[3] != 'git':
+            return 404, {'message': 'Not Found'}
+        kind, rest = parts[4], parts[5:]
+
+        with self._lock:
+            if kind == 'refs' and method == 'GET':
+                return 200, {'object': {'sha': self.head_sha, 'type': 'commit'}}
+            if kind == 'refs' and method == 'PATCH':
+                self.head_sha = json.loads(body or b'{}').get('sha', self.head_sha)
+                return 200, {'object': {'sha': self.head_sha, 'type': 'commit'}}
+            if kind == 'commits' and method == 'GET' and rest:
+                return 200, {'sha': rest[0], 'tree': {'sha': hashlib.sha1(rest[0].encode()).hexdigest()}}
+            if kind == 'blobs' and method == 'POST':
+                sha = hashlib.sha1(body).hexdigest()
+                self.blobs[sha] = len(body)
+                return 201, {'sha': sha}
+            if kind == 'trees' and method == 'POST':
+                return 201, {'sha': self._new_sha(body)}
+            if kind == 'commits' and method == 'POST':
+                sha = self._new_sha(body)
+                self.commits.append({'sha': sha, 'payload': json.loads(body or b'{}')})
+                return 201, {'sha': sha}
+        return 404, {'message': 'Not Found'}
+
+    def _read_raw(self, path: str) -> Optional[bytes]:
+        """raw/{owner}/{repo}/{branch}/lib/<файл> -> файл из каталога фикстур"""
+        filename = os.path.basename(path.split('?', 1)[0])
+        full_path = os.path.join(self.files_dir, filename)
+        if not filename or not os.path.isfile(full_path):
+            return None
+        with open(full_path, 'rb') as f:
+            return f.read()
+
+    def _make_handler(self):
+        stub = self
+
+        class GitHubStubHandler(BaseHTTPRequestHandler):
+            def _dispatch(self, method: str):
+                if stub.latency > 0:
+                    time.sleep(stub.latency)
+                with stub._lock:
+                    stub.calls.append((method, self.path))
+
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+
+                if self.path.startswith(RAW_PREFIX) and method == 'GET':
+                    content = stub._read_raw(self.path)
+                    if content is None:
+                        self.send_error(404, "Not Found")
+                        return
+                    self._reply(200, content, 'text/plain; charset=utf-8')
+                    return
+
+                if self.path.startswith(API_PREFIX):
+                    status, payload = stub._handle_api(method, self.path, body)
+                    self._reply(status, json.dumps(payload).encode('utf-8'), 'application/json')
+                    return
+
+                self.send_error(404, "Not Found")
+
+            def _reply(self, status: int, content: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                self._dispatch('GET')
+
+            def do_POST(self):
+                self._dispatch('POST')
+
+            def do_PATCH(self):
+                self._dispatch('PATCH')
+
+            def log_message(self, format, *args):
+                pass
+
+        return GitHubStubHandler
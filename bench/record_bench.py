@@ -0,0 +1,112 @@
+"""
+Сравнение ServerRecord и словарей данных сервера: память и доступ к полям
+
+    python -m bench.record_bench --count 100000
+"""
+import sys
+import time
+import argparse
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from bench.run_bench import ROOT_DIR  # noqa: F401  - добавляет корень репозитория в sys.path
+from extractors.server_record import Protocol, ServerFlags, ServerRecord
+
+
+def make_dicts(count: int) -> List[Dict[str, Any]]:
+    """Словари в формате, который раньше шел по конвейеру"""
+    return [
+        {
+            'name': f"server-{i}",
+            'ip': f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+            'protocol': 'DNSCrypt relay' if i % 5 == 0 else 'DNSCrypt',
+            'dnssec': i % 2 == 0,
+            'no_filters': i % 3 == 0,
+            'no_logs': True,
+            'extraction_method': 'table_direct'
+        }
+        for i in range(count)
+    ]
+
+
+def measure_memory(build: Callable[[], list]) -> int:
+    """Прирост памяти на построение списка, байт"""
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    data = build()
+    size = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del data
+    return size
+
+
+def time_best(func: Callable[[], Any], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def scan_dicts(items: List[Dict[str, Any]]) -> int:
+    """Типичный проход конвейера: фильтр по протоколу и флагам"""
+    selected = 0
+    for item in items:
+        if item.get('ip') and item.get('protocol') == 'DNSCrypt' and item.get('no_logs', False) \
+                and item.get('dnssec', False):
+            selected += 1
+    return selected
+
+
+def scan_records(items: List[ServerRecord]) -> int:
+    """Тот же проход через свойства записи"""
+    selected = 0
+    for item in items:
+        if item.ip and item.protocol is Protocol.DNSCRYPT and item.no_logs and item.dnssec:
+            selected += 1
+    return selected
+
+
+def scan_records_packed(items: List[ServerRecord]) -> int:
+    """Тот же проход одной проверкой упакованных флагов"""
+    required = int(ServerFlags.NO_LOGS | ServerFlags.DNSSEC)
+    dnscrypt = Protocol.DNSCRYPT
+    selected = 0
+    for item in items:
+        if item.ip and item.protocol is dnscrypt and item.flags & required == required:
+            selected += 1
+    return selected
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="ServerRecord против словарей")
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    source = make_dicts(args.count)
+    records = [ServerRecord.from_dict(item) for item in source]
+    assert scan_dicts(source) == scan_records(records) == scan_records_packed(records)
+
+    # Строки общие в обоих случаях: сравнивается только сам контейнер записи
+    dict_memory = measure_memory(lambda: [dict(item) for item in source])
+    record_memory = measure_memory(lambda: [ServerRecord.from_dict(item) for item in source])
+    dict_scan = time_best(lambda: scan_dicts(source), args.repeat)
+    record_scan = time_best(lambda: scan_records(records), args.repeat)
+    packed_scan = time_best(lambda: scan_records_packed(records), args.repeat)
+    convert = time_best(lambda: [ServerRecord.from_dict(item) for item in source], args.repeat)
+
+    print(f"📊 {args.count} записей")
+    print(f"💾 Память: dict {dict_memory / args.count:.0f} Б/запись, "
+          f"ServerRecord {record_memory / args.count:.0f} Б/запись "
+          f"({dict_memory / max(record_memory, 1):.1f}x)")
+    print(f"⏱️ Проход с фильтром: dict {dict_scan * 1000:.1f} мс, "
+          f"ServerRecord {record_scan * 1000:.1f} мс, маска флагов {packed_scan * 1000:.1f} мс "
+          f"({dict_scan / max(packed_scan, 1e-9):.1f}x)")
+    print(f"🔄 Конвертация на границе: {convert / args.count * 1e6:.2f} мкс/запись")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
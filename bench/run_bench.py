@@ -0,0 +1,323 @@
+"""
+Бенчмарк полного цикла парсера на локальных фикстурах
+
+    python -m bench.run_bench --runs 3 --threshold 0.25
+
+Конфигурационные файлы и GitHub API отдает bench/github_stub.py, сайт -
+replay стенд utils/site_replay.py (по умолчанию bench/fixtures/site; записать
+настоящий сайт: python -m utils.site_replay record --out <каталог>).
+Результаты пишутся в bench/results/<время>.json, код возврата 1 при регрессии этапа.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import psutil
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from bench.github_stub import GitHubStub
+
+DEFAULT_SITE_DIR = os.path.join(BENCH_DIR, "fixtures", "site")
+DEFAULT_CONFIG_DIR = os.path.join(BENCH_DIR, "fixtures", "config")
+DEFAULT_RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+RESULT_VERSION = 1
+
+
+class PeakRSSSampler:
+    """Фоновый замер пикового RSS процесса Python и дерева Chrome/chromedriver"""
+
+    def __init__(self, interval: float = 0.25):
+        self.interval = interval
+        self.process = psutil.Process(os.getpid())
+        self.peak_python = 0
+        self.peak_tree = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'PeakRSSSampler':
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._sample()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        try:
+            own = self.process.memory_info().rss
+            tree = own
+            for child in self.process.children(recursive=True):
+                try:
+                    tree += child.memory_info().rss
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+            self.peak_python = max(self.peak_python, own)
+            self.peak_tree = max(self.peak_tree, tree)
+        except psutil.Error:
+            pass
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def median(values: List[float]) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def run_once(site_dir: str, config_dir: str, latency: float, seed: int, tabs: int = 1) -> Dict[str, Any]:
+    """Один прогон run_full_parsing в отдельном рабочем каталоге"""
+    from core.base_parser import DNSCryptParser
+
+    workdir = tempfile.mkdtemp(prefix="parser_bench_")
+    previous_cwd = os.getcwd()
+    previous_env = dict(os.environ)
+
+    sampler = PeakRSSSampler()
+    try:
+        with GitHubStub(config_dir) as github:
+            os.chdir(workdir)
+            os.environ.update(github.environment())
+            os.environ.update({
+                'PARSER_REPLAY_DIR': os.path.abspath(site_dir),
+                'PARSER_REPLAY_LATENCY': str(latency),
+                'PARSER_EXTRACTION_TABS': str(tabs),
+                'CHROME_HEADLESS': 'true'
+            })
+            random.seed(seed)
+
+            sampler.start()
+            started = time.time()
+            with DNSCryptParser() as parser:
+                result = parser.run_full_parsing()
+            total = time.time() - started
+            sampler.stop()
+            github_stats = github.stats()
+    finally:
+        os.chdir(previous_cwd)
+        os.environ.clear()
+        os.environ.update(previous_env)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    parsing_result = result.get('parsing_result', {})
+    driver_stats = result.get('driver_stats', {})
+    latencies = list(parsing_result.get('extraction_timings', {}).values())
+
+    return {
+        'success': bool(result.get('success')),
+        'total_duration': total,
+        'phases': {name: timing['duration'] for name, timing in result.get('phase_timings', {}).items()},
+        'phase_starts': {name: timing['start'] for name, timing in result.get('phase_timings', {}).items()},
+        'webdriver_commands': {
+            'total': driver_stats.get('total', 0),
+            'by_command': driver_stats.get('by_command', {}),
+            'by_phase': driver_stats.get('by_phase', {})
+        },
+        'peak_rss_mb': {
+            'python': sampler.peak_python / 1024 / 1024,
+            'process_tree': sampler.peak_tree / 1024 / 1024
+        },
+        'extraction_latency': {
+            'count': len(latencies),
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'max': max(latencies) if latencies else 0.0,
+            'total': sum(latencies)
+        },
+        'servers': {
+            'processed': parsing_result.get('total_processed', 0),
+            'successful': parsing_result.get('successful', 0)
+        },
+        'github': github_stats
+    }
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Медианы по нескольким прогонам"""
+    phase_names = []
+    for run in runs:
+        for name in run['phases']:
+            if name not in phase_names:
+                phase_names.append(name)
+
+    return {
+        'success': all(run['success'] for run in runs),
+        'total_duration': median([run['total_duration'] for run in runs]),
+        'phases': {name: median([run['phases'][name] for run in runs if name in run['phases']])
+                   for name in phase_names},
+        'webdriver_commands': median([run['webdriver_commands']['total'] for run in runs]),
+        'peak_rss_mb': max(run['peak_rss_mb']['process_tree'] for run in runs),
+        'extraction_latency_p50': median([run['extraction_latency']['p50'] for run in runs]),
+        'extraction_latency_p95': median([run['extraction_latency']['p95'] for run in runs])
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+            capture_output=True, text=True, timeout=10
+        ).stdout.strip()
+    except Exception:
+        return ''
+
+
+def load_history(results_dir: str, fixture: Dict[str, Any], window: int) -> List[Dict[str, Any]]:
+    """Предыдущие результаты на тех же фикстурах (последние window)"""
+    if not os.path.isdir(results_dir):
+        return []
+
+    history = []
+    for filename in sorted(os.listdir(results_dir)):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(results_dir, filename), 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if record.get('version') == RESULT_VERSION and record.get('fixture') == fixture \
+                and record.get('summary', {}).get('success'):
+            history.append(record)
+    return history[-window:]
+
+
+def find_regressions(summary: Dict[str, Any], history: List[Dict[str, Any]],
+                     threshold: float, min_delta: float) -> List[Dict[str, Any]]:
+    """Этапы, медиана которых выросла больше порога относительно истории"""
+    regressions = []
+    for phase, current in summary['phases'].items():
+        previous = [record['summary']['phases'][phase] for record in history
+                    if phase in record['summary']['phases']]
+        if not previous:
+            continue
+        baseline = median(previous)
+        if current > baseline * (1 + threshold) and current - baseline > min_delta:
+            regressions.append({
+                'phase': phase,
+                'baseline': baseline,
+                'current': current,
+                'change': (current - baseline) / baseline if baseline else None
+            })
+    return regressions
+
+
+def save_result(results_dir: str, record: Dict[str, Any]) -> str:
+    os.makedirs(results_dir, exist_ok=True)
+    filename = os.path.join(results_dir, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2, ensure_ascii=False)
+    return filename
+
+
+def print_summary(summary: Dict[str, Any], regressions: List[Dict[str, Any]]):
+    print("\n" + "=" * 70)
+    print("📊 BENCH: полный цикл на фикстурах")
+    print("=" * 70)
+    for phase, duration in summary['phases'].items():
+        print(f"   {phase:<18} {duration:8.2f}s")
+    print(f"   {'total':<18} {summary['total_duration']:8.2f}s")
+    print(f"🖥️ Команд WebDriver: {summary['webdriver_commands']:.0f}")
+    print(f"💾 Пиковый RSS (Python + Chrome): {summary['peak_rss_mb']:.1f} MB")
+    print(f"⏱️ Извлечение сервера: p50 {summary['extraction_latency_p50'] * 1000:.1f} мс, "
+          f"p95 {summary['extraction_latency_p95'] * 1000:.1f} мс")
+
+    for regression in regressions:
+        change = regression['change']
+        change_text = f"+{change * 100:.0f}%" if change is not None else "new"
+        print(f"❌ Регрессия {regression['phase']}: {regression['baseline']:.2f}s -> "
+              f"{regression['current']:.2f}s ({change_text})")
+    if not regressions:
+        print("✅ Регрессий этапов не обнаружено")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк парсера на локальных фикстурах")
+    parser.add_argument('--runs', type=int, default=1, help="число прогонов (берется медиана)")
+    parser.add_argument('--site', default=DEFAULT_SITE_DIR, help="фикстура сайта (utils/site_replay.py)")
+    parser.add_argument('--configs', default=DEFAULT_CONFIG_DIR, help="каталог с DNSCrypt_*.txt")
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка replay стенда, секунды")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tabs', type=int, default=1, help="вкладок для извлечения (PARSER_EXTRACTION_TABS)")
+    parser.add_argument('--results-dir', default=DEFAULT_RESULTS_DIR)
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="допустимый рост этапа относительно медианы истории (0.25 = 25%%)")
+    parser.add_argument('--min-delta', type=float, default=0.5,
+                        help="игнорировать рост этапа меньше этого числа секунд")
+    parser.add_argument('--window', type=int, default=5, help="сколько прошлых результатов учитывать")
+    parser.add_argument('--no-save', action='store_true', help="не сохранять результат")
+    args = parser.parse_args(argv)
+
+    import core  # noqa: F401  - порядок импорта пакетов как в parser_new.py
+
+    runs = []
+    for run_number in range(args.runs):
+        print(f"\n🏁 Прогон {run_number + 1}/{args.runs}")
+        runs.append(run_once(args.site, args.configs, args.latency, args.seed + run_number, args.tabs))
+
+    summary = summarize(runs)
+    fixture = {
+        'site': os.path.relpath(os.path.abspath(args.site), ROOT_DIR),
+        'configs': os.path.relpath(os.path.abspath(args.configs), ROOT_DIR),
+        'latency': args.latency,
+        'tabs': args.tabs
+    }
+    history = load_history(args.results_dir, fixture, args.window)
+    regressions = find_regressions(summary, history, args.threshold, args.min_delta) if summary['success'] else []
+
+    record = {
+        'version': RESULT_VERSION,
+        'timestamp': datetime.now().isoformat(),
+        'git_revision': git_revision(),
+        'fixture': fixture,
+        'threshold': args.threshold,
+        'baseline_runs': len(history),
+        'summary': summary,
+        'regressions': regressions,
+        'runs': runs
+    }
+
+    print_summary(summary, regressions)
+    if not args.no_save:
+        print(f"💾 Результат сохранен: {save_result(args.results_dir, record)}")
+
+    if not summary['success']:
+        print("❌ Прогон парсера завершился с ошибкой")
+        return 2
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,46 +4,73 @@
 import time
 import os
 import sys
-from typing import Dict, List, Optional, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Any, Tuple
 
 # Исправляем импорты на абсолютные для работы в Docker
 from core.config import ParserConfig
 from core.driver_manager import SmartDriverManager
 from extractors.dialog_extractor import AdvancedDialogExtractor
+from extractors.server_record import Protocol, ServerRecord
 from strategies.error_recovery import SmartErrorRecovery
-from utils.metrics import ParsingMetrics, ParsingCache
+from strategies.rate_governor import RateGovernor
+from utils.metrics import ParsingMetrics, ParsingCache, REGISTRY
 from file_handlers.config_parser import ConfigFileParser
 from file_handlers.file_updater import FileUpdater
 from github.github_manager import GitHubManager
 from page_handlers.page_navigator import PageNavigator
 from page_handlers.pagination_manager import PaginationManager
+from page_handlers.heap_watchdog import HeapWatchdog
 from data_handlers.server_processor import ServerProcessor
+from data_handlers.result_sinks import ConfigUpdateSink, JsonlSink, MetricsSink
+from utils.site_replay import ReplayServer
+from utils.resource_sampler import ResourceSampler
+from utils.run_result import build_run_result, write_run_result
+
+PHASE_SECONDS = REGISTRY.gauge(
+    'dnscrypt_parser_phase_duration_seconds', 'Длительность последнего выполнения этапа парсинга', ('phase',)
+)
+PHASE_COMPLETED = REGISTRY.gauge(
+    'dnscrypt_parser_phase_completed_timestamp_seconds', 'Время завершения этапа парсинга (unix)', ('phase',)
+)
 
 class DNSCryptParser:
     """Главный класс парсера DNSCrypt с полной модульной архитектурой"""
     
-    def __init__(self):
-        """Инициализация парсера с загрузкой конфигурации"""
+    def __init__(self, stop_event: Optional[threading.Event] = None):
+        """Инициализация парсера с загрузкой конфигурации.
+        
+        stop_event - мягкая остановка: извлечение завершается после текущего
+        сервера, файлы записываются с полученными данными.
+        """
         try:
             self.config = ParserConfig.from_env()
+            self.stop_event = stop_event or threading.Event()
             self.driver_manager = SmartDriverManager(self.config)
             self.driver = None
+            self.replay_server = None
+            
+            # Общий регулятор скорости для всех путей извлечения
+            self.rate_governor = RateGovernor.from_config(self.config)
             
             # Основные модули
             self.dialog_extractor = None
             self.error_recovery = None
             self.page_navigator = None
             self.pagination_manager = None
+            self.heap_watchdog = None
             self.server_processor = None
             
             # Файловые модули
-            self.config_parser = ConfigFileParser()
+            self.config_parser = ConfigFileParser(self.config.DOWNLOAD_CACHE_DIR)
             self.file_updater = FileUpdater()
             self.github_manager = GitHubManager()
             
             # Метрики и кэширование с обработкой ошибок
             print("📊 Инициализация системы метрик...")
-            self.metrics = ParsingMetrics()
+            self.metrics = ParsingMetrics(raw_retention_days=self.config.METRICS_RETENTION_DAYS)
             
             print("💾 Инициализация системы кэширования...")
             self.cache = ParsingCache()
@@ -62,6 +89,29 @@ class DNSCryptParser:
                 'end_time': None
             }
             
+            # Скачанные конфигурации: {имя файла: путь в хранилище} и признак изменений
+            self.config_sources = {}
+            self.download_result = {'changed': False, 'files': {}}
+            
+            # Поток результатов текущей сессии (results.jsonl)
+            self.results_file = None
+            
+            # Длительность этапов run_full_parsing: {этап: {'start', 'duration'}}
+            self.phase_timings = {}
+            self.current_phase = None
+            
+            # Замер ресурсов процесса и браузера по этапам
+            self.resource_sampler = None
+            if self.config.RESOURCE_SAMPLE_INTERVAL > 0:
+                self.resource_sampler = ResourceSampler(
+                    self.config.RESOURCE_SAMPLE_INTERVAL, phase_getter=lambda: self.current_phase
+                )
+            
+            # Экспорт метрик Prometheus (HTTP /metrics на время работы процесса)
+            self.metrics_server = None
+            if self.config.METRICS_HTTP_PORT:
+                self.metrics_server = REGISTRY.start_http_server(self.config.METRICS_HTTP_PORT)
+            
             print("🚀 DNSCrypt Parser v2.0 инициализирован")
             
         except Exception as e:
@@ -77,6 +127,12 @@ class DNSCryptParser:
         try:
             print("🔧 Инициализация компонентов парсера...")
             
+            # Локальный стенд вместо dnscrypt.info
+            if self.config.REPLAY_DIR:
+                self.replay_server = ReplayServer(
+                    self.config.REPLAY_DIR, latency=self.config.REPLAY_LATENCY
+                ).start()
+            
             # Создаем драйвер
             self.driver = self.driver_manager.create_stealth_driver()
             if not self.driver:
@@ -85,10 +141,19 @@ class DNSCryptParser:
             
             # Инициализируем основные модули
             self.dialog_extractor = AdvancedDialogExtractor(self.driver, self.config)
-            self.error_recovery = SmartErrorRecovery(self.driver, self.config)
+            self.error_recovery = SmartErrorRecovery(self.driver, self.config, self.rate_governor)
             self.page_navigator = PageNavigator(self.driver, self.config)
             self.pagination_manager = PaginationManager(self.driver, self.config)
-            self.server_processor = ServerProcessor(self.driver, self.config, self.dialog_extractor)
+            
+            # Перезагрузка страницы при росте памяти рендерера (как подготовка новой вкладки)
+            self.heap_watchdog = None
+            if self.config.HEAP_CHECK_EVERY > 0:
+                self.heap_watchdog = HeapWatchdog(self.driver, self.config, self._prepare_extraction_tab)
+            
+            self.server_processor = ServerProcessor(
+                self.driver, self.config, self.dialog_extractor, self.rate_governor, self.heap_watchdog,
+                self.stop_event
+            )
             
             # Очищаем устаревший кэш (если доступен)
             if self.cache and self.cache.cache_enabled:
@@ -101,8 +166,19 @@ class DNSCryptParser:
             print(f"❌ Ошибка инициализации: {e}")
             return False
     
+    def request_stop(self):
+        """Мягкая остановка (из обработчика сигнала или другого потока)"""
+        self.stop_event.set()
+    
     def run_full_parsing(self) -> Dict[str, Any]:
-        """Запуск полного цикла парсинга"""
+        """Запуск полного цикла парсинга с записью документа результата (RUN_RESULT_FILE)"""
+        result = self._run_full_parsing()
+        if self.config.RUN_RESULT_FILE:
+            if write_run_result(self.config.RUN_RESULT_FILE, build_run_result(result)):
+                print(f"🧾 Результат запуска: {self.config.RUN_RESULT_FILE}")
+        return result
+    
+    def _run_full_parsing(self) -> Dict[str, Any]:
         try:
             self.session_stats['start_time'] = time.time()
             
@@ -111,69 +187,98 @@ class DNSCryptParser:
             if self.metrics:
                 session_id = self.metrics.start_session()
             
+            if self.resource_sampler:
+                self.resource_sampler.start()
+            
             print("🎯 Запуск полного цикла парсинга DNSCrypt серверов")
             print("=" * 70)
             
-            # Этап 1: Скачивание и парсинг конфигурационных файлов
-            print("\n📥 ЭТАП 1: Загрузка конфигурационных файлов")
-            print("-" * 50)
-            
-            target_servers = self._download_and_parse_configs()
-            if not target_servers:
-                return self._create_error_result("Не удалось загрузить конфигурационные файлы")
-            
-            print(f"✅ Загружено {len(target_servers)} серверов для обработки")
-            
-            # Этап 2: Навигация и загрузка страницы
-            print("\n🌐 ЭТАП 2: Навигация на страницу")
-            print("-" * 50)
-            
-            if not self.page_navigator.navigate_to_page("https://dnscrypt.info/public-servers"):
-                return self._create_error_result("Не удалось загрузить страницу")
-            
-            # Этап 3: Настройка пагинации
-            print("\n🔧 ЭТАП 3: Настройка пагинации")
-            print("-" * 50)
-            
-            pagination_success = self.pagination_manager.setup_pagination()
-            if pagination_success:
-                print("✅ Пагинация настроена успешно")
-            else:
-                print("⚠️ Пагинация не настроена, продолжаем с ограниченными данными")
+            # Этапы 1-3: конфигурации, навигация, пагинация
+            target_servers, error_message = self._prepare_targets()
+            if error_message:
+                return self._create_error_result(error_message)
             
             # Этап 4: Извлечение и обработка данных
             print("\n🔍 ЭТАП 4: Извлечение данных серверов")
             print("-" * 50)
             
-            parsing_result = self.server_processor.process_servers(target_servers)
+            # Записи идут в приемники сразу после извлечения: строки файлов
+            # правятся по ходу, этап 5 только записывает готовые документы
+            config_sink = self._create_config_sink()
+            stream_sinks = []
+            if self.config.RESULTS_DIR:
+                self.results_file = os.path.join(
+                    self.config.RESULTS_DIR, session_id or f"session_{int(time.time())}", "results.jsonl"
+                )
+                stream_sinks.append(JsonlSink(
+                    self.results_file, self.config.RESULTS_FLUSH_EVERY, self.config.RESULTS_FLUSH_INTERVAL
+                ))
+                print(f"🧾 Результаты сессии: {self.results_file}")
+            if self.metrics:
+                stream_sinks.append(MetricsSink(self.metrics, self.server_processor.extraction_timings))
+            
+            with self._phase('extraction'):
+                try:
+                    parsing_result = self.server_processor.collect(
+                        self._iter_extraction(target_servers), target_servers, [config_sink] + stream_sinks
+                    )
+                finally:
+                    # Поток результатов закрывается и при сбое извлечения
+                    for sink in stream_sinks:
+                        sink.close()
+            
+            # Остановка во время извлечения: этап 5 записывает то, что успели получить
+            cancelled = self.server_processor.stopped
             
             # Этап 5: Обновление файлов
             print("\n📝 ЭТАП 5: Обновление конфигурационных файлов")
             print("-" * 50)
             
-            update_result = self._update_config_files(parsing_result, target_servers)
+            with self._phase('file_update'):
+                update_result = self._update_config_files(parsing_result, config_sink)
             
             # Этап 6: Отправка в GitHub
             print("\n🚀 ЭТАП 6: Отправка в GitHub")
             print("-" * 50)
             
-            github_result = self._push_to_github(update_result['total_updated'])
+            if cancelled and not self.config.PUSH_ON_CANCEL:
+                print("🛑 Запуск остановлен, частичный результат в GitHub не отправляется")
+                github_result = {'success': False, 'reason': 'cancelled'}
+            else:
+                with self._phase('github_push'):
+                    github_result = self._push_to_github(update_result['total_updated'])
             
             # Финализация сессии
             self.session_stats['end_time'] = time.time()
+            resource_stats = {}
+            if self.resource_sampler:
+                self.resource_sampler.stop()
+                resource_stats = self.resource_sampler.summary()
             
             # Завершаем сессию метрик если доступна
             session = None
             if self.metrics:
+                self.metrics.record_driver_stats(self.driver_manager.get_command_stats())
+                self.metrics.record_rate_stats(self.rate_governor.get_stats())
+                self.metrics.record_phase_timings(self.phase_timings)
+                self.metrics.record_resource_stats(resource_stats)
                 session = self.metrics.end_session()
             
             # Подготовка итогового результата
             result = {
                 'success': True,
+                'cancelled': cancelled,
                 'parsing_result': parsing_result,
+                'download_result': self.download_result,
+                'results_file': self.results_file,
                 'update_result': update_result,
                 'github_result': github_result,
                 'session_stats': self.session_stats,
+                'phase_timings': dict(self.phase_timings),
+                'driver_stats': self.driver_manager.get_command_stats(),
+                'rate_governor': self.rate_governor.get_stats(),
+                'resource_stats': resource_stats,
+                'heap_watchdog': self.heap_watchdog.get_stats() if self.heap_watchdog else {},
                 'metrics': self.metrics.generate_detailed_report() if self.metrics else "Метрики недоступны",
                 'duration': self.session_stats['end_time'] - self.session_stats['start_time']
             }
@@ -187,29 +292,171 @@ class DNSCryptParser:
             traceback.print_exc()
             return self._create_error_result(str(e))
     
+    @contextmanager
+    def _phase(self, name: str, background: bool = False):
+        """Замер длительности этапа относительно начала сессии.
+        
+        Фоновый этап не меняет текущий этап драйвера: команды WebDriver
+        в это время относятся к этапу основного потока.
+        """
+        started = time.time()
+        if not background:
+            self.current_phase = name
+            self.driver_manager.set_phase(name)
+        try:
+            yield
+        finally:
+            self.phase_timings[name] = {
+                'start': started - (self.session_stats['start_time'] or started),
+                'duration': time.time() - started
+            }
+            if background:
+                self.phase_timings[name]['background'] = True
+            else:
+                self.current_phase = None
+                self.driver_manager.set_phase(None)
+            
+            PHASE_SECONDS.set(self.phase_timings[name]['duration'], phase=name)
+            PHASE_COMPLETED.set_to_current_time(phase=name)
+            self._publish_metrics()
+    
+    def _publish_metrics(self):
+        """Запись textfile для node-exporter (атомарно)"""
+        if self.config.METRICS_TEXTFILE:
+            REGISTRY.write_textfile(self.config.METRICS_TEXTFILE)
+    
+    def _download_configs_in_background(self) -> List[Dict[str, Any]]:
+        """Этап 1 в фоновом потоке"""
+        with self._phase('config_download', background=True):
+            return self._download_and_parse_configs()
+    
+    def iter_servers(self) -> Iterator[ServerRecord]:
+        """Потоковый API: этапы 1-3, затем ServerRecord сразу после извлечения.
+        
+        Файлы, метрики и GitHub не затрагиваются - записи обрабатывают приемники
+        вызывающего кода (data_handlers.result_sinks). Требует initialize().
+        """
+        if not self.session_stats['start_time']:
+            self.session_stats['start_time'] = time.time()
+        
+        target_servers, error_message = self._prepare_targets()
+        if error_message:
+            raise RuntimeError(error_message)
+        
+        with self._phase('extraction'):
+            yield from self._iter_extraction(target_servers)
+    
+    def _prepare_targets(self) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+        """Этапы 1-3: (целевые серверы, None) или (None, причина ошибки)"""
+        # Этап 1 не зависит от браузера: при OVERLAP_CONFIG_DOWNLOAD конфигурации
+        # загружаются в фоне, пока идут навигация и настройка пагинации
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='config-download') as executor:
+            print("\n📥 ЭТАП 1: Загрузка конфигурационных файлов")
+            print("-" * 50)
+            
+            if self.config.OVERLAP_CONFIG_DOWNLOAD:
+                print("🔀 Загрузка в фоне, параллельно с этапами 2-3")
+                config_future = executor.submit(self._download_configs_in_background)
+            else:
+                with self._phase('config_download'):
+                    target_servers = self._download_and_parse_configs()
+                config_future = None
+                if not target_servers:
+                    return None, "Не удалось загрузить конфигурационные файлы"
+            
+            # Этап 2: Навигация и загрузка страницы
+            print("\n🌐 ЭТАП 2: Навигация на страницу")
+            print("-" * 50)
+            
+            with self._phase('navigation'):
+                page_loaded = self.page_navigator.navigate_to_page(self._get_target_url())
+            if not page_loaded:
+                return None, "Не удалось загрузить страницу"
+            
+            # Этап 3: Настройка пагинации
+            print("\n🔧 ЭТАП 3: Настройка пагинации")
+            print("-" * 50)
+            
+            with self._phase('pagination'):
+                pagination_success = self.pagination_manager.setup_pagination()
+            if pagination_success:
+                print("✅ Пагинация настроена успешно")
+            else:
+                print("⚠️ Пагинация не настроена, продолжаем с ограниченными данными")
+            
+            # Точка соединения: до извлечения нужен список целевых серверов
+            if config_future is not None:
+                with self._phase('config_join'):
+                    target_servers = config_future.result()
+                if not target_servers:
+                    return None, "Не удалось загрузить конфигурационные файлы"
+        
+        print(f"✅ Загружено {len(target_servers)} серверов для обработки")
+        return target_servers, None
+    
+    def _iter_extraction(self, target_servers: List[Dict[str, Any]]) -> Iterator[ServerRecord]:
+        """Поток записей выбранным способом извлечения"""
+        if self.config.SNAPSHOT_MODE:
+            return self._iter_via_snapshot(target_servers)
+        if self.config.EXTRACTION_TABS > 1:
+            return self.server_processor.iter_servers_multitab(
+                target_servers, self.config.EXTRACTION_TABS, self._prepare_extraction_tab
+            )
+        return self.server_processor.iter_servers(target_servers)
+    
+    def _create_config_sink(self) -> ConfigUpdateSink:
+        """Приемник правок DNSCrypt_relay.txt / DNSCrypt_servers.txt по разобранным документам"""
+        targets = {}
+        for protocol, output_name in ((Protocol.RELAY, 'DNSCrypt_relay.txt'),
+                                      (Protocol.DNSCRYPT, 'DNSCrypt_servers.txt')):
+            source = self.config_sources.get(output_name)
+            document = None
+            if source:
+                try:
+                    document = self.config_parser.load_document(source)
+                except OSError as e:
+                    print(f"⚠️ Не удалось открыть {output_name}: {e}")
+            targets[protocol] = (output_name, document)
+        return ConfigUpdateSink(self.file_updater, targets)
+    
+    def _get_target_url(self) -> str:
+        """Адрес страницы серверов с учетом replay стенда"""
+        if self.replay_server:
+            return self.replay_server.url_for(self.config.TARGET_URL)
+        return self.config.TARGET_URL
+    
+    def _prepare_extraction_tab(self) -> bool:
+        """Загрузка страницы и настройка пагинации в текущей (новой) вкладке"""
+        if not self.page_navigator.navigate_to_page(self._get_target_url()):
+            return False
+        return self.pagination_manager.setup_pagination()
+    
     def _download_and_parse_configs(self) -> List[Dict[str, Any]]:
         """Скачивание и парсинг конфигурационных файлов"""
         try:
             # Формируем URLs для скачивания
-            github_config = self.github_manager.get_config()
             github_urls = {
-                'DNSCrypt_relay.txt': f'https://github.com/{github_config["owner"]}/{github_config["repo"]}/blob/{github_config["branch"]}/lib/DNSCrypt_relay.txt',
-                'DNSCrypt_servers.txt': f'https://github.com/{github_config["owner"]}/{github_config["repo"]}/blob/{github_config["branch"]}/lib/DNSCrypt_servers.txt'
+                'DNSCrypt_relay.txt': self.github_manager.get_raw_file_url('lib/DNSCrypt_relay.txt'),
+                'DNSCrypt_servers.txt': self.github_manager.get_raw_file_url('lib/DNSCrypt_servers.txt')
             }
             
-            # Скачиваем файлы
-            temp_files = []
-            for filename, url in github_urls.items():
-                temp_filename = f"temp_{filename}"
-                if self.config_parser.download_file(url, temp_filename):
-                    temp_files.append(temp_filename)
-                else:
+            # Скачиваем файлы параллельно, неизмененные - одним 304 без записи на диск
+            downloads = self.config_parser.download_files(github_urls)
+            for filename, download in downloads.items():
+                if not download.ok:
                     print(f"❌ Не удалось скачать {filename}")
                     return []
             
+            self.config_sources = {filename: download.path for filename, download in downloads.items()}
+            self.download_result = {
+                'changed': any(download.changed for download in downloads.values()),
+                'files': {filename: download.to_dict() for filename, download in downloads.items()}
+            }
+            print(f"📋 Входные файлы {'изменились' if self.download_result['changed'] else 'не изменились'}")
+            
             # Парсим файлы
-            relay_servers = self.config_parser.parse_config_file('temp_DNSCrypt_relay.txt')
-            dnscrypt_servers = self.config_parser.parse_config_file('temp_DNSCrypt_servers.txt')
+            relay_servers = self.config_parser.parse_config_file(self.config_sources['DNSCrypt_relay.txt'])
+            dnscrypt_servers = self.config_parser.parse_config_file(self.config_sources['DNSCrypt_servers.txt'])
             
             # Объединяем все серверы
             all_servers = relay_servers + dnscrypt_servers
@@ -224,45 +471,50 @@ class DNSCryptParser:
             print(f"❌ Ошибка загрузки конфигураций: {e}")
             return []
     
-    def _update_config_files(self, parsing_result: Dict[str, Any], target_servers: List[Dict]) -> Dict[str, Any]:
-        """Обновление конфигурационных файлов"""
+    def _iter_via_snapshot(self, target_servers: List[Dict[str, Any]]) -> Iterator[ServerRecord]:
+        """Извлечение по снимку страницы, браузер освобождается после прохода по снимку"""
+        snapshot_extractor = self.server_processor.snapshot_extractor
+        
+        html = snapshot_extractor.capture(self.driver)
+        if self.config.SNAPSHOT_DIR:
+            snapshot_extractor.save_snapshot(html, self.config.SNAPSHOT_DIR)
+        
+        snapshot_rows = snapshot_extractor.parse_rows(html)
+        if not snapshot_rows:
+            print("⚠️ Снимок не содержит строк, переходим к живому извлечению")
+            yield from self.server_processor.iter_servers(target_servers)
+            return
+        
+        # Браузер нужен до конца прохода: серверы без IP в ячейках таблицы
+        # извлекаются с живой страницы (диалог)
+        yield from self.server_processor.iter_snapshot(target_servers, snapshot_rows)
+        
+        # Этапам записи файлов и отправки WebDriver не нужен
+        print("🧹 Браузер больше не нужен, освобождаем ресурсы")
+        self.driver_manager.quit_driver()
+    
+    def _update_config_files(self, parsing_result: Dict[str, Any], config_sink: ConfigUpdateSink) -> Dict[str, Any]:
+        """Запись конфигурационных файлов, строки которых правились во время извлечения"""
         try:
             servers_data = parsing_result.get('servers_data', {})
             
             # Разделяем данные по типам
             relay_data = {name: info for name, info in servers_data.items() 
-                         if info.get('protocol') == 'DNSCrypt relay'}
+                         if info.protocol is Protocol.RELAY}
             server_data = {name: info for name, info in servers_data.items() 
-                          if info.get('protocol') == 'DNSCrypt'}
-            
-            total_updated = 0
+                          if info.protocol is Protocol.DNSCRYPT}
             
-            # Обновляем файл релеев
+            written = config_sink.close()
+            relay_count = written.get('DNSCrypt_relay.txt', 0)
+            server_count = written.get('DNSCrypt_servers.txt', 0)
             if relay_data:
-                print(f"📝 Обновление файла релеев ({len(relay_data)} серверов)...")
-                if os.path.exists('temp_DNSCrypt_relay.txt'):
-                    os.rename('temp_DNSCrypt_relay.txt', 'DNSCrypt_relay.txt')
-                
-                updated_count = self.file_updater.update_config_file(
-                    'DNSCrypt_relay.txt', relay_data, is_relay_file=True
-                )
-                total_updated += updated_count
-                print(f"✅ Обновлено релеев: {updated_count}")
-            
-            # Обновляем файл серверов
+                print(f"✅ Обновлено релеев: {relay_count}")
             if server_data:
-                print(f"📝 Обновление файла серверов ({len(server_data)} серверов)...")
-                if os.path.exists('temp_DNSCrypt_servers.txt'):
-                    os.rename('temp_DNSCrypt_servers.txt', 'DNSCrypt_servers.txt')
-                
-                updated_count = self.file_updater.update_config_file(
-                    'DNSCrypt_servers.txt', server_data, is_relay_file=False
-                )
-                total_updated += updated_count
-                print(f"✅ Обновлено серверов: {updated_count}")
+                print(f"✅ Обновлено серверов: {server_count}")
             
             return {
-                'total_updated': total_updated,
+                'total_updated': relay_count + server_count,
+                'files': written,
                 'relay_updated': len(relay_data),
                 'server_updated': len(server_data),
                 'relay_data': relay_data,
@@ -291,7 +543,12 @@ class DNSCryptParser:
             
             if success:
                 print("✅ Успешно отправлено в GitHub")
-                return {'success': True, 'files_updated': total_updated}
+                return {
+                    'success': True,
+                    'files_updated': total_updated,
+                    'commit_sha': self.github_manager.last_commit_sha,
+                    'pushed_files': dict(self.github_manager.last_pushed_files)
+                }
             else:
                 print("❌ Ошибка отправки в GitHub")
                 return {'success': False, 'reason': 'push_failed'}
@@ -311,15 +568,31 @@ class DNSCryptParser:
         duration = result.get('duration', 0)
         
         print(f"⏱️ Общее время выполнения: {duration:.1f} секунд")
+        if result.get('cancelled'):
+            print("🛑 Запуск остановлен досрочно: результат частичный")
         print(f"🎯 Обработано серверов: {parsing_result.get('successful', 0)}/{parsing_result.get('total_processed', 0)}")
         print(f"📈 Процент успеха: {parsing_result.get('success_rate', 0):.1f}%")
         print(f"💾 Кэш хиты: {parsing_result.get('cache_hits', 0)}")
         print(f"🔄 Восстановления: {parsing_result.get('recovery_attempts', 0)}")
         print(f"📝 Обновлено файлов: {update_result.get('total_updated', 0)}")
         
+        heap_stats = result.get('heap_watchdog') or {}
+        if heap_stats.get('refreshes') or heap_stats.get('failed_refreshes'):
+            peak = heap_stats.get('peak', {})
+            print(f"🧹 Перезагрузки страницы: {heap_stats.get('refreshes', 0)} "
+                  f"(пик heap {peak.get('JSHeapUsedSize', 0) / 2**20:.0f} МБ, узлов {peak.get('Nodes', 0):.0f})")
+
+        phase_timings = result.get('phase_timings', {})
+        if phase_timings:
+            print("⏱️ Этапы:")
+            for phase, timing in phase_timings.items():
+                suffix = " (в фоне)" if timing.get('background') else ""
+                print(f"   {phase}: +{timing['start']:.1f}s, {timing['duration']:.1f}s{suffix}")
+
         github_result = result.get('github_result', {})
         if github_result.get('success'):
-            print("🚀 GitHub: Успешно отправлено")
+            commit_sha = github_result.get('commit_sha')
+            print(f"🚀 GitHub: Успешно отправлено{f' ({commit_sha[:7]})' if commit_sha else ''}")
         else:
             print(f"⚠️ GitHub: {github_result.get('reason', 'неизвестная ошибка')}")
         
@@ -343,7 +616,8 @@ class DNSCryptParser:
                 'failed': 0,
                 'success_rate': 0
             },
-            'session_stats': self.session_stats
+            'session_stats': self.session_stats,
+            'phase_timings': dict(self.phase_timings)
         }
     
     def cleanup(self):
@@ -351,26 +625,35 @@ class DNSCryptParser:
         try:
             print("🧹 Очистка ресурсов...")
             
+            # Останавливаем замер ресурсов (если сессия оборвалась)
+            if self.resource_sampler:
+                self.resource_sampler.stop()
+            
             # Закрываем драйвер
             if self.driver_manager:
                 self.driver_manager.quit_driver()
             
+            # Останавливаем replay стенд
+            if self.replay_server:
+                self.replay_server.stop()
+                self.replay_server = None
+            
+            # Останавливаем HTTP сервер метрик
+            if self.metrics_server:
+                self.metrics_server.shutdown()
+                self.metrics_server.server_close()
+                self.metrics_server = None
+            
             # Сохраняем финальные метрики если доступны
             if self.metrics:
                 try:
+                    # Дописываются только строки завершенной сессии
                     self.metrics.export_csv_report()
+                    if self.config.METRICS_COLUMNAR_EXPORT:
+                        self.metrics.export_columnar()
                 except Exception as e:
                     print(f"⚠️ Не удалось экспортировать метрики: {e}")
             
-            # Очистка временных файлов
-            temp_files = ['temp_DNSCrypt_relay.txt', 'temp_DNSCrypt_servers.txt']
-            for temp_file in temp_files:
-                try:
-                    if os.path.exists(temp_file):
-                        os.remove(temp_file)
-                except:
-                    pass
-            
             print("✅ Ресурсы очищены")
             
         except Exception as e:
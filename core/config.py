@@ -18,6 +18,84 @@ class ParserConfig:
     RETRY_DELAY_BASE: float = 2.0
     DIALOG_CLICK_RETRIES: int = 3
     
+    # Адрес страницы с публичными серверами
+    TARGET_URL: str = "https://dnscrypt.info/public-servers"
+    
+    # Офлайн воспроизведение записанного сайта (см. utils/site_replay.py)
+    REPLAY_DIR: str = ""
+    REPLAY_LATENCY: float = 0.0
+    RECORD_NETWORK: bool = False
+    
+    # Сопоставление строк таблицы с целевыми серверами (нечеткий поиск - только явно, > 0)
+    ROW_MATCH_MAX_DISTANCE: int = 0
+    
+    # Режим снимка: один outerHTML таблицы вместо сотен запросов WebDriver
+    SNAPSHOT_MODE: bool = False
+    SNAPSHOT_DIR: str = "./output/snapshots"
+    
+    # Кэш скачанных конфигураций (ETag/Last-Modified и хранилище содержимого)
+    DOWNLOAD_CACHE_DIR: str = "./output/download_cache"
+    
+    # Загрузка конфигураций в фоне, параллельно с навигацией и пагинацией
+    OVERLAP_CONFIG_DOWNLOAD: bool = True
+    
+    # Поток результатов сессии: <RESULTS_DIR>/<сессия>/results.jsonl (пусто - не писать)
+    RESULTS_DIR: str = "./output/results"
+    RESULTS_FLUSH_EVERY: int = 10
+    RESULTS_FLUSH_INTERVAL: float = 2.0
+    
+    # Документ результата запуска (JSON с версией формата) для scheduler'а (пусто - не писать)
+    RUN_RESULT_FILE: str = "./output/run_result.json"
+    
+    # Аренда запуска (один запуск на каталог output, пусто - без аренды); при занятой аренде:
+    # wait - ждать и запуститься, piggyback - дождаться и взять чужой результат, exit - выйти сразу
+    RUN_LEASE_FILE: str = "./output/run.lease"
+    RUN_LEASE_POLICY: str = "exit"
+    RUN_LEASE_WAIT_TIMEOUT: float = 3600.0
+    RUN_LEASE_HEARTBEAT: float = 15.0
+    RUN_LEASE_STALE_AFTER: float = 120.0
+    
+    # Мягкая остановка (SIGTERM/SIGUSR1): текущий сервер дорабатывается, файлы записываются
+    # с полученными данными; отправлять ли частичный результат в GitHub
+    PUSH_ON_CANCEL: bool = False
+    
+    # База метрик (SQLite): сырые метрики серверов хранятся N дней, дневные сводки - всегда
+    METRICS_RETENTION_DAYS: int = 30
+    # Колоночный экспорт метрик серверов (output/metrics_columns) после каждого запуска
+    METRICS_COLUMNAR_EXPORT: bool = False
+    
+    # Экспорт метрик Prometheus: textfile для node-exporter (пишется на границах этапов)
+    # и/или HTTP /metrics на время работы процесса (0 - выключен)
+    METRICS_TEXTFILE: str = ""
+    METRICS_HTTP_PORT: int = 0
+    
+    # Интервал замера CPU/RSS/FD процесса и дерева Chrome (секунды, 0 - выключен)
+    RESOURCE_SAMPLE_INTERVAL: float = 1.0
+    
+    # Контроль памяти страницы (CDP Performance.getMetrics) каждые N серверов (0 - выключен):
+    # при превышении порога (0 - без порога) или роста относительно загрузки страница
+    # перезагружается между серверами с повторной настройкой пагинации
+    HEAP_CHECK_EVERY: int = 25
+    HEAP_MAX_JS_MB: int = 512
+    HEAP_MAX_NODES: int = 150000
+    HEAP_MAX_LISTENERS: int = 50000
+    HEAP_GROWTH_FACTOR: float = 4.0
+    
+    # Учет команд WebDriver по типу, этапу и месту вызова
+    INSTRUMENT_DRIVER: bool = True
+    
+    # Число вкладок одного Chrome для параллельного извлечения
+    EXTRACTION_TABS: int = 1
+    
+    # Регулятор скорости (запросов в секунду): AIMD по сигналам блокировки
+    RATE_INITIAL: float = 0.8
+    RATE_MIN: float = 0.05
+    RATE_MAX: float = 3.0
+    RATE_INCREASE_STEP: float = 0.05
+    RATE_DECREASE_FACTOR: float = 0.5
+    RATE_BLOCK_COOLDOWN: float = 15.0
+    RATE_MAX_COOLDOWN: float = 120.0
+    
     # Селекторы для различных версий Vuetify
     TABLE_ROW_SELECTORS: List[str] = field(default_factory=lambda: [
         # Vuetify 3.x селекторы
@@ -123,6 +201,68 @@ class ParserConfig:
         config.MAX_RETRIES = int(os.getenv('PARSER_MAX_RETRIES', 5))
         config.RETRY_DELAY_BASE = float(os.getenv('PARSER_RETRY_DELAY', 2.0))
         
+        # Источник данных: живой сайт или записанная фикстура
+        config.TARGET_URL = os.getenv('PARSER_TARGET_URL', config.TARGET_URL)
+        config.REPLAY_DIR = os.getenv('PARSER_REPLAY_DIR', '')
+        config.REPLAY_LATENCY = float(os.getenv('PARSER_REPLAY_LATENCY', 0.0))
+        
+        # Нечеткое сопоставление имен (0 - только точные, нормализованные и однозначные префиксные)
+        config.ROW_MATCH_MAX_DISTANCE = int(os.getenv('PARSER_MATCH_MAX_DISTANCE', config.ROW_MATCH_MAX_DISTANCE))
+        
+        # Офлайн разбор снимка страницы
+        config.SNAPSHOT_MODE = os.getenv('PARSER_SNAPSHOT_MODE', 'false').lower() == 'true'
+        config.SNAPSHOT_DIR = os.getenv('PARSER_SNAPSHOT_DIR', config.SNAPSHOT_DIR)
+        
+        # Кэш скачанных конфигураций
+        config.DOWNLOAD_CACHE_DIR = os.getenv('PARSER_DOWNLOAD_CACHE_DIR', config.DOWNLOAD_CACHE_DIR)
+        config.OVERLAP_CONFIG_DOWNLOAD = os.getenv('PARSER_OVERLAP_CONFIG_DOWNLOAD', 'true').lower() == 'true'
+        
+        # Поток результатов сессии (JSONL с периодическим fsync)
+        config.RESULTS_DIR = os.getenv('PARSER_RESULTS_DIR', config.RESULTS_DIR)
+        config.RESULTS_FLUSH_EVERY = max(1, int(os.getenv('PARSER_RESULTS_FLUSH_EVERY', config.RESULTS_FLUSH_EVERY)))
+        config.RESULTS_FLUSH_INTERVAL = float(os.getenv('PARSER_RESULTS_FLUSH_INTERVAL', config.RESULTS_FLUSH_INTERVAL))
+        
+        # Документ результата запуска
+        config.RUN_RESULT_FILE = os.getenv('PARSER_RUN_RESULT_FILE', config.RUN_RESULT_FILE)
+        
+        # Аренда запуска
+        config.RUN_LEASE_FILE = os.getenv('PARSER_RUN_LEASE_FILE', config.RUN_LEASE_FILE)
+        config.RUN_LEASE_POLICY = os.getenv('PARSER_RUN_LEASE_POLICY', config.RUN_LEASE_POLICY).lower()
+        config.RUN_LEASE_WAIT_TIMEOUT = float(os.getenv('PARSER_RUN_LEASE_WAIT_TIMEOUT', config.RUN_LEASE_WAIT_TIMEOUT))
+        config.RUN_LEASE_HEARTBEAT = float(os.getenv('PARSER_RUN_LEASE_HEARTBEAT', config.RUN_LEASE_HEARTBEAT))
+        config.RUN_LEASE_STALE_AFTER = float(os.getenv('PARSER_RUN_LEASE_STALE_AFTER', config.RUN_LEASE_STALE_AFTER))
+        
+        # Мягкая остановка
+        config.PUSH_ON_CANCEL = os.getenv('PARSER_PUSH_ON_CANCEL', 'false').lower() == 'true'
+        
+        # Хранение сырых метрик в базе (0 - без ограничения)
+        config.METRICS_RETENTION_DAYS = int(os.getenv('PARSER_METRICS_RETENTION_DAYS', config.METRICS_RETENTION_DAYS))
+        config.METRICS_COLUMNAR_EXPORT = os.getenv('PARSER_METRICS_COLUMNAR_EXPORT', 'false').lower() == 'true'
+        
+        # Экспорт метрик Prometheus
+        config.METRICS_TEXTFILE = os.getenv('PARSER_METRICS_TEXTFILE', config.METRICS_TEXTFILE)
+        config.METRICS_HTTP_PORT = int(os.getenv('PARSER_METRICS_HTTP_PORT', config.METRICS_HTTP_PORT))
+        config.RESOURCE_SAMPLE_INTERVAL = float(os.getenv('PARSER_RESOURCE_SAMPLE_INTERVAL', config.RESOURCE_SAMPLE_INTERVAL))
+        
+        # Контроль памяти страницы
+        config.HEAP_CHECK_EVERY = int(os.getenv('PARSER_HEAP_CHECK_EVERY', config.HEAP_CHECK_EVERY))
+        config.HEAP_MAX_JS_MB = int(os.getenv('PARSER_HEAP_MAX_JS_MB', config.HEAP_MAX_JS_MB))
+        config.HEAP_MAX_NODES = int(os.getenv('PARSER_HEAP_MAX_NODES', config.HEAP_MAX_NODES))
+        config.HEAP_MAX_LISTENERS = int(os.getenv('PARSER_HEAP_MAX_LISTENERS', config.HEAP_MAX_LISTENERS))
+        config.HEAP_GROWTH_FACTOR = float(os.getenv('PARSER_HEAP_GROWTH_FACTOR', config.HEAP_GROWTH_FACTOR))
+        
+        # Инструментирование драйвера
+        config.INSTRUMENT_DRIVER = os.getenv('PARSER_INSTRUMENT_DRIVER', 'true').lower() == 'true'
+        
+        # Вкладки для извлечения (1 - последовательно в одной вкладке)
+        config.EXTRACTION_TABS = max(1, int(os.getenv('PARSER_EXTRACTION_TABS', 1)))
+        
+        # Регулятор скорости запросов
+        config.RATE_INITIAL = float(os.getenv('PARSER_RATE_INITIAL', config.RATE_INITIAL))
+        config.RATE_MIN = float(os.getenv('PARSER_RATE_MIN', config.RATE_MIN))
+        config.RATE_MAX = float(os.getenv('PARSER_RATE_MAX', config.RATE_MAX))
+        config.RATE_BLOCK_COOLDOWN = float(os.getenv('PARSER_RATE_BLOCK_COOLDOWN', config.RATE_BLOCK_COOLDOWN))
+        
         # Chrome настройки
         if os.getenv('CHROME_HEADLESS', 'true').lower() == 'true':
             config.CHROME_OPTIONS.append("--headless=new")
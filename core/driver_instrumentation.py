@@ -0,0 +1,103 @@
+"""
+Инструментирование WebDriver: счетчики команд, задержки и места вызова
+"""
+import os
+import sys
+import time
+import threading
+from typing import Any, Dict, Optional
+
+from utils.metrics import LatencyHistogram
+
+# Понятные имена для команд, важных при разборе производительности
+COMMAND_NAMES = {
+    'findElement': 'find_element',
+    'findElements': 'find_elements',
+    'findChildElement': 'find_element',
+    'findChildElements': 'find_elements',
+    'w3cExecuteScript': 'execute_script',
+    'w3cExecuteScriptAsync': 'execute_script',
+    'executeCdpCommand': 'execute_cdp',
+    'getElementText': 'element_text',
+    'clickElement': 'click',
+    'getElementAttribute': 'element_attribute',
+    'getElementProperty': 'element_attribute',
+    'getElementRect': 'element_rect',
+    'actions': 'actions',
+    'get': 'navigate',
+    'getPageSource': 'page_source',
+    'getTitle': 'title'
+}
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+
+class DriverInstrumentation:
+    """Счетчики команд WebDriver по типу, этапу и месту вызова"""
+
+    def __init__(self):
+        self.current_phase: Optional[str] = None
+        self._lock = threading.Lock()
+        self.by_command: Dict[str, int] = {}
+        self.by_phase: Dict[str, int] = {}
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self.call_sites: Dict[str, Dict[str, float]] = {}
+
+    def install(self, driver):
+        """Подмена driver.execute: через него идут и команды элементов"""
+        original_execute = driver.execute
+        if getattr(original_execute, '_instrumented', False):
+            return driver
+
+        def execute(driver_command, params=None):
+            started = time.perf_counter()
+            try:
+                return original_execute(driver_command, params)
+            finally:
+                self.record(driver_command, time.perf_counter() - started, sys._getframe(1))
+
+        execute._instrumented = True
+        driver.execute = execute
+        return driver
+
+    def record(self, driver_command: str, duration: float, frame=None):
+        """Учет одной команды"""
+        command = COMMAND_NAMES.get(driver_command, driver_command)
+        phase = self.current_phase or 'startup'
+        site = self._call_site(frame)
+
+        with self._lock:
+            self.by_command[command] = self.by_command.get(command, 0) + 1
+            self.by_phase[phase] = self.by_phase.get(phase, 0) + 1
+
+            histogram = self.latency.get(command)
+            if histogram is None:
+                histogram = self.latency[command] = LatencyHistogram()
+            histogram.record(duration)
+
+            stats = self.call_sites.setdefault(site, {'count': 0, 'total_time': 0.0})
+            stats['count'] += 1
+            stats['total_time'] += duration
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Снимок статистики в формате ParsingMetrics.record_driver_stats"""
+        with self._lock:
+            return {
+                'total': sum(self.by_command.values()),
+                'by_command': dict(self.by_command),
+                'by_phase': dict(self.by_phase),
+                'latency': {command: histogram.to_dict() for command, histogram in self.latency.items()},
+                'call_sites': {site: dict(stats) for site, stats in self.call_sites.items()}
+            }
+
+    def _call_site(self, frame) -> str:
+        """Первый кадр стека в коде парсера: модуль.функция"""
+        while frame is not None:
+            filename = os.path.abspath(frame.f_code.co_filename)
+            if (filename != _THIS_FILE and filename.startswith(ROOT_DIR)
+                    and os.sep + 'site-packages' + os.sep not in filename):
+                module = os.path.splitext(os.path.relpath(filename, ROOT_DIR))[0].replace(os.sep, '.')
+                return f"{module}.{frame.f_code.co_name}"
+            frame = frame.f_back
+        return 'external'
@@ -8,6 +8,7 @@ from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import WebDriverException
 from typing import Optional
 from .config import ParserConfig
+from .driver_instrumentation import DriverInstrumentation
 
 class SmartDriverManager:
     """Интеллектуальный менеджер Chrome драйвера"""
@@ -17,6 +18,9 @@ class SmartDriverManager:
         self.driver: Optional[webdriver.Chrome] = None
         self._session_id = None
         
+        # Статистика команд сохраняется между пересозданиями драйвера
+        self.instrumentation = DriverInstrumentation() if config.INSTRUMENT_DRIVER else None
+        
     def create_stealth_driver(self) -> webdriver.Chrome:
         """Создание скрытого драйвера с антибот защитой"""
         self._kill_existing_chrome()
@@ -35,6 +39,10 @@ class SmartDriverManager:
         options.add_experimental_option("excludeSwitches", ["enable-automation"])
         options.add_experimental_option('useAutomationExtension', False)
         
+        # Performance-лог нужен для записи сетевых ответов (utils/site_replay.py)
+        if self.config.RECORD_NETWORK:
+            options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        
         # Реалистичный User-Agent
         user_agents = [
             "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
@@ -46,6 +54,9 @@ class SmartDriverManager:
         try:
             driver = webdriver.Chrome(options=options)
             
+            if self.instrumentation:
+                self.instrumentation.install(driver)
+            
             # Удаляем webdriver свойства
             self._inject_stealth_scripts(driver)
             
@@ -191,4 +202,13 @@ class SmartDriverManager:
     
     def get_driver(self) -> Optional[webdriver.Chrome]:
         """Получение текущего драйвера"""
-        return self.driver
\ No newline at end of file
+        return self.driver
+    
+    def set_phase(self, phase: Optional[str]):
+        """Текущий этап парсинга для статистики команд"""
+        if self.instrumentation:
+            self.instrumentation.current_phase = phase
+    
+    def get_command_stats(self) -> dict:
+        """Статистика команд WebDriver (пустая, если учет выключен)"""
+        return self.instrumentation.get_stats() if self.instrumentation else {}
\ No newline at end of file
@@ -3,7 +3,14 @@
 """
 
 from .server_processor import ServerProcessor
+from .row_matcher import RowMatchIndex
+from .result_sinks import ConfigUpdateSink, JsonlSink, MetricsSink, load_jsonl_results
 
 __all__ = [
-    'ServerProcessor'
+    'ServerProcessor',
+    'RowMatchIndex',
+    'ConfigUpdateSink',
+    'JsonlSink',
+    'MetricsSink',
+    'load_jsonl_results'
 ]
\ No newline at end of file
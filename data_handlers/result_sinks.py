@@ -0,0 +1,157 @@
+"""
+Приемники потока ServerRecord: каждая запись обрабатывается сразу после извлечения
+"""
+import os
+import json
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+
+try:
+    from ..extractors.server_record import Protocol, ServerRecord
+    from ..file_handlers.config_document import ConfigDocument
+    from ..file_handlers.file_updater import FileUpdater
+except ImportError:
+    # Fallback для случаев когда относительный импорт не работает
+    import sys
+    from pathlib import Path
+    sys.path.append(str(Path(__file__).parent.parent))
+    from extractors.server_record import Protocol, ServerRecord
+    from file_handlers.config_document import ConfigDocument
+    from file_handlers.file_updater import FileUpdater
+
+
+class ConfigUpdateSink:
+    """Правка строк конфигурационных файлов по мере поступления записей.
+
+    targets: {протокол: (имя выходного файла, документ)}; файлы пишутся в close().
+    """
+
+    def __init__(self, file_updater: FileUpdater, targets: Dict[Protocol, Tuple[str, Optional[ConfigDocument]]]):
+        self.file_updater = file_updater
+        self.targets = targets
+        # Выходной файл -> записей получено / строк обновлено
+        self.received: Dict[str, int] = {output_name: 0 for output_name, _ in targets.values()}
+        self.updated: Dict[str, int] = dict(self.received)
+
+    def consume(self, record: ServerRecord):
+        target = self.targets.get(record.protocol)
+        if not target:
+            return
+        output_name, document = target
+        self.received[output_name] += 1
+        if document is not None:
+            self.updated[output_name] += self.file_updater.apply_record(
+                document, record.name, record, is_relay_file=record.is_relay
+            )
+
+    def close(self) -> Dict[str, int]:
+        """Запись файлов, по которым пришли данные; {выходной файл: обновлено строк}"""
+        written = {}
+        for output_name, document in self.targets.values():
+            if document is None or not self.received[output_name]:
+                continue
+            print(f"📝 Запись {output_name} ({self.received[output_name]} серверов)...")
+            saved = self.file_updater.save_document(document, output_name, self.updated[output_name])
+            written[output_name] = self.updated[output_name] if saved else 0
+        return written
+
+
+class JsonlSink:
+    """Запись потока в JSON Lines: одна строка ServerRecord.to_dict() на сервер.
+
+    Буфер сбрасывается на диск с fsync каждые flush_every записей или
+    flush_interval секунд, поэтому после падения процесса в файле остается
+    все, кроме последней пачки (читается load_jsonl_results).
+    """
+
+    def __init__(self, filename: str, flush_every: int = 10, flush_interval: float = 2.0):
+        self.filename = filename
+        self.flush_every = max(1, flush_every)
+        self.flush_interval = flush_interval
+        self.count = 0
+        self._pending = 0
+        self._last_flush = 0.0
+        self._file = None
+
+    def consume(self, record: ServerRecord):
+        if self._file is None:
+            self._open()
+        self._file.write(json.dumps(record.to_dict(), ensure_ascii=False) + '\n')
+        self.count += 1
+        self._pending += 1
+        if self._pending >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Сброс буфера и fsync"""
+        if self._file is None or not self._pending:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def close(self) -> int:
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+        return self.count
+
+    def _open(self):
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(self.filename, 'a', encoding='utf-8')
+        self._last_flush = time.monotonic()
+        # Запись о новом файле в каталоге тоже должна пережить сбой
+        try:
+            directory_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(directory_fd)
+            finally:
+                os.close(directory_fd)
+        except OSError:
+            pass
+
+
+def load_jsonl_results(filename: str) -> Dict[str, ServerRecord]:
+    """servers_data из потока JsonlSink: последняя запись по имени побеждает,
+    оборванная при сбое последняя строка пропускается"""
+    servers_data = {}
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                data = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(data, dict) and data.get('name'):
+                servers_data[data['name']] = ServerRecord.from_dict(data)
+    return servers_data
+
+
+class MetricsSink:
+    """Метрики извлечения по серверам (ParsingMetrics.record_server_extraction).
+
+    Успехи учитываются по мере поступления, неудачи - в close() по журналу
+    времени извлечения процессора (там есть и неудачные попытки).
+    """
+
+    def __init__(self, metrics, extraction_timings: Dict[str, float]):
+        self.metrics = metrics
+        self.extraction_timings = extraction_timings
+        self.seen: Set[str] = set()
+
+    def consume(self, record: ServerRecord):
+        self.seen.add(record.name)
+        self.metrics.record_server_extraction(
+            record.name, True, self.extraction_timings.get(record.name, 0.0),
+            extraction_method=record.source or None
+        )
+
+    def close(self) -> Dict[str, Any]:
+        failed = [name for name in self.extraction_timings if name not in self.seen]
+        for name in failed:
+            self.metrics.record_server_extraction(
+                name, False, self.extraction_timings[name], error_type='extraction_failed'
+            )
+        return {'successful': len(self.seen), 'failed': len(failed)}
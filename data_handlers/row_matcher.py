@@ -0,0 +1,284 @@
+"""
+Индекс сопоставления строк таблицы с именами целевых серверов
+"""
+import re
+import bisect
+import heapq
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Все, что не буква и не цифра, при нормализации отбрасывается
+_NON_ALNUM = re.compile(r'[\W_]+', re.UNICODE)
+_DIGITS = re.compile(r'\d+')
+
+# Токены не длиннее этого - коды локаций и версий ("nl", "la", "pri", "v2"):
+# их замена означает другой сервер, а не опечатку
+SHORT_TOKEN_LENGTH = 3
+
+
+def normalize_name(name: str) -> str:
+    """Нормализация имени: casefold и удаление пунктуации/пробелов"""
+    if not name:
+        return ''
+    return _NON_ALNUM.sub('', str(name).casefold())
+
+
+def bounded_levenshtein(a: str, b: str, max_distance: int) -> Optional[int]:
+    """Расстояние Левенштейна с отсечкой: None если больше max_distance"""
+    if a == b:
+        return 0
+    len_a, len_b = len(a), len(b)
+    if abs(len_a - len_b) > max_distance:
+        return None
+    if len_a > len_b:
+        a, b, len_a, len_b = b, a, len_b, len_a
+
+    previous = list(range(len_b + 1))
+    for i in range(1, len_a + 1):
+        current = [i] + [0] * len_b
+        row_min = i
+        char_a = a[i - 1]
+        # Считаем только полосу шириной 2*max_distance вокруг диагонали
+        start = max(1, i - max_distance)
+        end = min(len_b, i + max_distance)
+        if start > 1:
+            current[start - 1] = max_distance + 1
+        for j in range(start, end + 1):
+            cost = 0 if char_a == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if end < len_b:
+            current[end + 1:] = [max_distance + 1] * (len_b - end)
+        if row_min > max_distance:
+            return None
+        previous = current
+
+    distance = previous[len_b]
+    return distance if distance <= max_distance else None
+
+
+def _tokens(name: str) -> List[str]:
+    return [token for token in _NON_ALNUM.split(str(name).casefold()) if token]
+
+
+def is_sibling_name(a: str, b: str) -> bool:
+    """Имена соседних серверов, а не опечатка: "dnscrypt.uk-ipv4" / "dnscrypt.uk-ipv6".
+    
+    Соседними считаются имена с разными числами (номер, ip4/ip6, версия)
+    или с заменой короткого токена (локация, версия).
+    """
+    if _DIGITS.findall(normalize_name(a)) != _DIGITS.findall(normalize_name(b)):
+        return True
+    changed = set(_tokens(a)) ^ set(_tokens(b))
+    return any(len(token) <= SHORT_TOKEN_LENGTH or _DIGITS.search(token) for token in changed)
+
+
+class RowMatchIndex:
+    """Индекс строк: точный, нормализованный, префиксный и нечеткий поиск.
+    
+    Неточное совпадение не принимается, если найденное имя само есть в
+    known_names (другой целевой сервер конфигурации) или отличается от
+    искомого как имя соседнего сервера (is_sibling_name). Нечеткий поиск
+    по умолчанию выключен (max_distance=0).
+    """
+
+    def __init__(self, max_distance: int = 0, ngram_size: int = 3,
+                 max_candidates: int = 32, min_prefix_length: int = 4,
+                 known_names: Iterable[str] = ()):
+        self.max_distance = max_distance
+        self.ngram_size = ngram_size
+        self.max_candidates = max_candidates
+        self.min_prefix_length = min_prefix_length
+        # Нормализованные имена целевых серверов: неточное совпадение на чужое имя запрещено
+        self.known_names = {normalize_name(name) for name in known_names}
+
+        self._exact: Dict[str, Any] = {}
+        self._normalized: Dict[str, str] = {}
+        self._sorted_keys: List[str] = []
+        self._ngrams: Dict[str, List[str]] = {}
+
+        # Журнал всех неточных совпадений для аудита
+        self.fuzzy_matches: List[Dict[str, Any]] = []
+        # Отклоненные совпадения (другой целевой сервер или соседнее имя)
+        self.rejected_matches: List[Dict[str, Any]] = []
+        self.stats = {
+            'exact': 0,
+            'normalized': 0,
+            'prefix': 0,
+            'fuzzy': 0,
+            'not_found': 0,
+            'collisions': 0,
+            'rejected': 0
+        }
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def __contains__(self, name: str) -> bool:
+        return self.find(name, record=False) is not None
+
+    def add(self, name: str, row: Any):
+        """Добавление строки в индекс"""
+        if not name or name in self._exact:
+            return
+
+        self._exact[name] = row
+        normalized = normalize_name(name)
+        if not normalized:
+            return
+
+        if normalized in self._normalized:
+            # Первая строка с таким ключом остается основной
+            self.stats['collisions'] += 1
+            return
+
+        self._normalized[normalized] = name
+        bisect.insort(self._sorted_keys, normalized)
+        for gram in self._iter_ngrams(normalized):
+            self._ngrams.setdefault(gram, []).append(normalized)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """Совместимость с dict.get: только точное совпадение"""
+        return self._exact.get(name, default)
+
+    def find(self, name: str, record: bool = True) -> Any:
+        """Поиск строки с каскадом стратегий, возвращает строку или None"""
+        row, _, _ = self.lookup(name, record=record)
+        return row
+
+    def lookup(self, name: str, record: bool = True) -> Tuple[Any, str, Optional[str]]:
+        """Поиск строки: (строка, тип совпадения, найденное имя)"""
+        if name in self._exact:
+            if record:
+                self.stats['exact'] += 1
+            return self._exact[name], 'exact', name
+
+        normalized = normalize_name(name)
+        if not normalized:
+            if record:
+                self.stats['not_found'] += 1
+            return None, 'not_found', None
+
+        if normalized in self._normalized:
+            return self._matched(name, normalized, 'normalized', 0, record)
+
+        matched = self._find_by_prefix(normalized)
+        # Дописанные в таблице токены ("-ipv4") допустимы, если совпадение однозначно
+        if matched is not None and self._acceptable(name, normalized, matched, record, siblings=False):
+            return self._matched(name, matched, 'prefix', None, record)
+
+        matched, distance = self._find_fuzzy(normalized)
+        if matched is not None and self._acceptable(name, normalized, matched, record):
+            return self._matched(name, matched, 'fuzzy', distance, record)
+
+        if record:
+            self.stats['not_found'] += 1
+        return None, 'not_found', None
+
+    def get_audit(self) -> List[Dict[str, Any]]:
+        """Список всех неточных совпадений"""
+        return list(self.fuzzy_matches)
+
+    def _acceptable(self, query: str, normalized: str, normalized_key: str, record: bool,
+                    siblings: bool = True) -> bool:
+        """Проверка неточного совпадения: не другой целевой сервер и не соседнее имя"""
+        original = self._normalized[normalized_key]
+        if normalized_key != normalized and normalized_key in self.known_names:
+            reason = "это имя другого целевого сервера"
+        elif siblings and is_sibling_name(query, original):
+            reason = "имя соседнего сервера"
+        else:
+            return True
+        if record:
+            self.stats['rejected'] += 1
+            self.rejected_matches.append({'query': query, 'matched': original, 'reason': reason})
+            print(f"🚫 Совпадение отклонено ({reason}): '{query}' -> '{original}'")
+        return False
+
+    def _matched(self, query: str, normalized_key: str, match_type: str,
+                 distance: Optional[int], record: bool) -> Tuple[Any, str, str]:
+        """Фиксация найденного совпадения"""
+        original = self._normalized[normalized_key]
+        if record:
+            self.stats[match_type] += 1
+            if match_type in ('prefix', 'fuzzy'):
+                self.fuzzy_matches.append({
+                    'query': query,
+                    'matched': original,
+                    'match_type': match_type,
+                    'distance': distance
+                })
+                print(f"🔎 Неточное совпадение ({match_type}): '{query}' -> '{original}'")
+        return self._exact[original], match_type, original
+
+    def _find_by_prefix(self, normalized: str) -> Optional[str]:
+        """Префиксный поиск: имя в таблице длиннее искомого, только однозначное совпадение.
+        
+        Обратное направление (самый длинный префикс искомого имени) не
+        используется: "cloudflaresecurity" указывал бы на строку "cloudflare".
+        """
+        if len(normalized) < self.min_prefix_length:
+            return None
+
+        # "scalewayfr" -> "scalewayfripv4"
+        candidates = []
+        position = bisect.bisect_left(self._sorted_keys, normalized)
+        while position < len(self._sorted_keys):
+            key = self._sorted_keys[position]
+            if not key.startswith(normalized):
+                break
+            candidates.append(key)
+            if len(candidates) > 1:
+                break
+            position += 1
+        if len(candidates) == 1:
+            return candidates[0]
+        return None
+
+    def _find_fuzzy(self, normalized: str) -> Tuple[Optional[str], Optional[int]]:
+        """Нечеткий поиск: кандидаты по n-граммам, затем ограниченное расстояние"""
+        max_distance = min(self.max_distance, len(normalized) // 4)
+        if max_distance < 1:
+            return None, None
+
+        # Частые n-граммы (общие суффиксы вроде "ipv4") почти не отсекают
+        # кандидатов, но стоят дороже всего: считаем только редкие
+        grams = set(self._iter_ngrams(normalized))
+        posting_limit = max(64, len(self._normalized) // 20)
+        rare_grams = [gram for gram in grams
+                      if len(self._ngrams.get(gram, ())) <= posting_limit]
+        if not rare_grams:
+            rare_grams = list(grams)
+
+        overlap: Dict[str, int] = {}
+        for gram in rare_grams:
+            for key in self._ngrams.get(gram, ()):
+                overlap[key] = overlap.get(key, 0) + 1
+        if not overlap:
+            return None, None
+
+        candidates = heapq.nlargest(self.max_candidates, overlap.items(), key=lambda item: item[1])
+        best_key, best_distance, ambiguous = None, None, False
+        for key, _ in candidates:
+            distance = bounded_levenshtein(normalized, key, max_distance)
+            if distance is None:
+                continue
+            if best_distance is None or distance < best_distance:
+                best_key, best_distance, ambiguous = key, distance, False
+            elif distance == best_distance:
+                ambiguous = True
+
+        if best_key is None or ambiguous:
+            return None, None
+        return best_key, best_distance
+
+    def _iter_ngrams(self, normalized: str):
+        """N-граммы с краевыми маркерами"""
+        padded = f"^{normalized}$"
+        size = self.ngram_size
+        if len(padded) <= size:
+            yield padded
+            return
+        for i in range(len(padded) - size + 1):
+            yield padded[i:i + size]
@@ -4,14 +4,21 @@
 import time
 import random
 import re
+from collections import deque
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Tuple
 
 # Используем относительные импорты для лучшей совместимости
 try:
     from ..core.config import ParserConfig
     from ..extractors.dialog_extractor import AdvancedDialogExtractor
+    from ..extractors.snapshot_extractor import PageSnapshotExtractor
+    from ..extractors.server_record import ServerRecord
+    from .row_matcher import RowMatchIndex
+    from ..strategies.rate_governor import RateGovernor, THROTTLE_SIGNALS
+    from ..strategies.error_recovery import classify_error_text
+    from ..utils.metrics import REGISTRY
 except ImportError:
     # Fallback для случаев когда относительный импорт не работает
     import sys
@@ -19,21 +26,76 @@ except ImportError:
     sys.path.append(str(Path(__file__).parent.parent))
     from core.config import ParserConfig
     from extractors.dialog_extractor import AdvancedDialogExtractor
+    from extractors.snapshot_extractor import PageSnapshotExtractor
+    from extractors.server_record import ServerRecord
+    from data_handlers.row_matcher import RowMatchIndex
+    from strategies.rate_governor import RateGovernor, THROTTLE_SIGNALS
+    from strategies.error_recovery import classify_error_text
+    from utils.metrics import REGISTRY
+
+EXTRACTIONS_TOTAL = REGISTRY.counter(
+    'dnscrypt_parser_server_extractions_total', 'Извлечения данных серверов по результату и методу',
+    ('result', 'method')
+)
+EXTRACTION_SECONDS = REGISTRY.histogram(
+    'dnscrypt_parser_server_extraction_seconds', 'Длительность извлечения данных одного сервера',
+    ('result',), buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+class _ExtractionTab:
+    """Вкладка браузера со своим индексом строк и очередью целевых серверов"""
+    __slots__ = ('handle', 'row_index', 'queue', 'task', 'server_name', 'started', 'ready_at', 'row')
+    
+    def __init__(self, handle: str, row_index: RowMatchIndex):
+        self.handle = handle
+        self.row_index = row_index
+        self.queue = deque()
+        self.task = None
+        self.server_name = None
+        self.started = 0.0
+        self.ready_at = 0.0
+        # Найденная строка следующего сервера, ждущего разрешения регулятора
+        self.row = None
 
 class ServerProcessor:
     """Обработчик данных серверов - ОБНОВЛЕННАЯ ВЕРСИЯ v2.1"""
     
-    def __init__(self, driver: webdriver.Chrome, config: ParserConfig, dialog_extractor: AdvancedDialogExtractor):
+    def __init__(self, driver: webdriver.Chrome, config: ParserConfig, dialog_extractor: AdvancedDialogExtractor,
+                 rate_governor: Optional[RateGovernor] = None, heap_watchdog=None, stop_event=None):
         self.driver = driver
         self.config = config
         self.dialog_extractor = dialog_extractor
+        # Общий регулятор скорости вместо фиксированных пауз между серверами
+        self.rate_governor = rate_governor or RateGovernor.from_config(config)
+        self.snapshot_extractor = PageSnapshotExtractor(config, dialog_extractor)
+        # Перезагрузка страницы при росте памяти рендерера (HeapWatchdog)
+        self.heap_watchdog = heap_watchdog
+        # Мягкая остановка (threading.Event): новые серверы не начинаются, текущий дорабатывается
+        self.stop_event = stop_event
+        self.stopped = False
         self.processing_stats = {
             'total_found_rows': 0,
             'target_servers_found': 0,
             'successful_extractions': 0,
-            'failed_extractions': 0
+            'failed_extractions': 0,
+            'fuzzy_matches': 0,
+            'rejected_matches': 0,
+            'snapshot_fallbacks': 0
         }
         
+        # Журнал неточных совпадений строк с целевыми серверами и отклоненных совпадений
+        self.fuzzy_matches = []
+        self.rejected_matches = []
+        
+        # Время извлечения по серверам, секунды
+        self.extraction_timings = {}
+        
+        # Причина, по которой последний поток записей завершился без извлечения
+        self.stream_error = None
+        
+        # Имена целевых серверов текущего потока: неточное совпадение на них не принимается
+        self.target_names = []
+        
         # Регулярные выражения для очистки и валидации данных
         self.patterns = {
             'ip_address': re.compile(r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b'),
@@ -67,66 +129,377 @@ class ServerProcessor:
     
     def process_servers(self, target_servers: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Основная функция обработки серверов"""
+        return self.collect(self.iter_servers(target_servers), target_servers)
+    
+    def process_snapshot(self, target_servers: List[Dict[str, Any]], snapshot_rows: List) -> Dict[str, Any]:
+        """Обработка серверов по строкам снимка (WebDriver - только для строк без IP, если драйвер есть)"""
+        return self.collect(
+            self.iter_snapshot(target_servers, snapshot_rows, live_fallback=self.driver is not None), target_servers
+        )
+    
+    def process_servers_multitab(self, target_servers: List[Dict[str, Any]], tab_count: int,
+                                 prepare_tab) -> Dict[str, Any]:
+        """Извлечение в нескольких вкладках одного браузера с чередованием по готовности"""
+        return self.collect(self.iter_servers_multitab(target_servers, tab_count, prepare_tab), target_servers)
+    
+    def collect(self, records: Iterator[ServerRecord], target_servers: List[Dict[str, Any]],
+                sinks: Iterable = ()) -> Dict[str, Any]:
+        """Сбор потока записей в результат обработки; каждая запись сразу передается приемникам"""
+        sinks = list(sinks)
+        servers_data = {}
+        for record in records:
+            servers_data[record.name] = record
+            for sink in sinks:
+                sink.consume(record)
+        
+        if self.stream_error:
+            return self._create_empty_result(self.stream_error)
+        return self._create_result(servers_data, target_servers)
+    
+    def iter_servers(self, target_servers: List[Dict[str, Any]]) -> Iterator[ServerRecord]:
+        """Извлечение с живой страницы: ServerRecord по мере готовности"""
+        self.stream_error = None
         print(f"🎯 Начало обработки {len(target_servers)} целевых серверов")
         
         # Получаем все строки серверов с сайта
         all_rows = self._get_server_rows_enhanced()
         if not all_rows:
             print("❌ Не удалось получить строки серверов")
-            return self._create_empty_result("Не удалось найти строки серверов")
+            self.stream_error = "Не удалось найти строки серверов"
+            return
         
         print(f"✅ Найдено {len(all_rows)} строк на сайте")
         self.processing_stats['total_found_rows'] = len(all_rows)
         
         # Создаем индекс имен целевых серверов
-        target_names = {server['name'] for server in target_servers}
-        print(f"🎯 Ищем {len(target_names)} целевых серверов")
+        self.target_names = [server['name'] for server in target_servers]
+        print(f"🎯 Ищем {len(set(self.target_names))} целевых серверов")
         
         # Создаем индекс строк по именам серверов
         row_index = self._create_row_index(all_rows)
         
-        # Обрабатываем каждый целевой сервер
-        servers_data = {}
+        rebuild_index = None
+        if self.heap_watchdog:
+            self.heap_watchdog.reset_baseline()
+            rebuild_index = self._rebuild_row_index
+        
+        yield from self._iter_targets(
+            target_servers, row_index, self.dialog_extractor.extract_server_info_smart,
+            rebuild_index=rebuild_index
+        )
+    
+    def _rebuild_row_index(self) -> Optional[RowMatchIndex]:
+        """Индекс строк заново после перезагрузки страницы (старые элементы устарели)"""
+        rows = self._get_server_rows_enhanced()
+        if not rows:
+            return None
+        print(f"✅ После перезагрузки найдено {len(rows)} строк")
+        return self._create_row_index(rows)
+    
+    def iter_snapshot(self, target_servers: List[Dict[str, Any]], snapshot_rows: List,
+                      live_fallback: bool = True) -> Iterator[ServerRecord]:
+        """Извлечение по строкам снимка страницы: ServerRecord по мере разбора.
+        
+        В ячейках таблицы IP есть не всегда (он бывает только в диалоге):
+        такие серверы при live_fallback извлекаются с живой страницы, поэтому
+        браузер должен оставаться открытым до конца прохода.
+        """
+        self.stream_error = None
+        self.target_names = [server['name'] for server in target_servers]
+        print(f"🎯 Офлайн обработка {len(target_servers)} целевых серверов по снимку")
+        
+        if not snapshot_rows:
+            print("❌ В снимке не найдено строк серверов")
+            self.stream_error = "Не удалось найти строки серверов в снимке"
+            return
+        
+        self.processing_stats['total_found_rows'] = len(snapshot_rows)
+        
+        row_index = RowMatchIndex(max_distance=self.config.ROW_MATCH_MAX_DISTANCE,
+                                  known_names=self.target_names)
+        for row in snapshot_rows:
+            row_index.add(row.name, row)
+        print(f"📊 Создан индекс для {len(row_index)} серверов")
+        
+        extract = self.snapshot_extractor.extract_server_info
+        if live_fallback:
+            extract = self._snapshot_extract_with_fallback()
+        
+        yield from self._iter_targets(target_servers, row_index, extract, throttle=False)
+    
+    def _snapshot_extract_with_fallback(self):
+        """Разбор строки снимка, а без IP - живое извлечение (диалог) той же строки"""
+        live_index = None
+        
+        def extract(row, server_name: str) -> Optional[ServerRecord]:
+            nonlocal live_index
+            record = self.snapshot_extractor.extract_server_info(row, server_name)
+            if record is not None and record.ip:
+                return record
+            
+            # Индекс строк живой страницы строится только при первом таком сервере
+            if live_index is None:
+                live_index = self._create_row_index(self._get_server_rows_enhanced())
+            live_row = live_index.find(server_name)
+            if live_row is None:
+                return record
+            
+            print(f"   🔄 В снимке нет IP для {server_name}, извлекаем с живой страницы")
+            self.processing_stats['snapshot_fallbacks'] += 1
+            self.rate_governor.acquire()
+            try:
+                live_record = self.dialog_extractor.extract_server_info_smart(live_row, server_name)
+            except Exception as e:
+                self._report_rate_signal(False, str(e))
+                raise
+            self._report_rate_signal(live_record is not None and bool(live_record.ip))
+            return live_record
+        
+        return extract
+    
+    def _iter_targets(self, target_servers: List[Dict[str, Any]], row_index: RowMatchIndex,
+                      extract, throttle: bool = True, rebuild_index=None) -> Iterator[ServerRecord]:
+        """Обработка целевых серверов по индексу строк.
+        
+        rebuild_index вызывается, если HeapWatchdog перезагрузил страницу
+        между серверами.
+        """
         processed_count = 0
+        # Журнал неточных совпадений индексов, замененных после перезагрузки
+        audit, rejected = [], []
+        
+        try:
+            for server in target_servers:
+                server_name = server['name']
+                
+                if self._stop_requested():
+                    break
+                
+                # Безопасная точка между серверами: диалог предыдущего закрыт
+                if rebuild_index and processed_count and self.heap_watchdog.after_server():
+                    new_index = rebuild_index()
+                    if new_index is not None:
+                        audit.extend(row_index.get_audit())
+                        rejected.extend(row_index.rejected_matches)
+                        row_index = new_index
+                    else:
+                        print("⚠️ Не удалось получить строки после перезагрузки страницы")
+                
+                processed_count += 1
+                
+                print(f"\n[{processed_count}/{len(target_servers)}] Обрабатываем {server_name}...")
+                
+                # Ищем строку для этого сервера (точно, нормализованно или нечетко)
+                row, _, _ = row_index.lookup(server_name)
+                if not row:
+                    print(f"⚠️ Строка не найдена для {server_name}")
+                    self.processing_stats['failed_extractions'] += 1
+                    continue
+                
+                self.processing_stats['target_servers_found'] += 1
+                
+                # Ждем разрешения регулятора скорости (только для живой страницы)
+                if throttle:
+                    self.rate_governor.acquire()
+                
+                # Извлекаем информацию о сервере
+                try:
+                    start_time = time.time()
+                    info = extract(row, server_name)
+                    record = self._record_extraction(server_name, info, time.time() - start_time)
+                    if throttle:
+                        self._report_rate_signal(record is not None)
+                    
+                except Exception as e:
+                    record = None
+                    self.processing_stats['failed_extractions'] += 1
+                    print(f"❌ Ошибка обработки {server_name}: {e}")
+                    if throttle:
+                        self._report_rate_signal(False, str(e))
+                
+                if record is not None:
+                    yield record
+        finally:
+            # Сохраняем журнал неточных совпадений для аудита (и при досрочной остановке потока)
+            self.fuzzy_matches = audit + row_index.get_audit()
+            self.rejected_matches = rejected + row_index.rejected_matches
+            self.processing_stats['fuzzy_matches'] = len(self.fuzzy_matches)
+            self.processing_stats['rejected_matches'] = len(self.rejected_matches)
+    
+    def iter_servers_multitab(self, target_servers: List[Dict[str, Any]], tab_count: int,
+                              prepare_tab) -> Iterator[ServerRecord]:
+        """Извлечение в нескольких вкладках: ServerRecord по мере готовности любой вкладки"""
+        tab_count = max(1, min(tab_count, len(target_servers)))
+        if tab_count == 1:
+            yield from self.iter_servers(target_servers)
+            return
+        
+        self.stream_error = None
+        self.target_names = [server['name'] for server in target_servers]
+        print(f"🗂️ Извлечение в {tab_count} вкладках: {len(target_servers)} целевых серверов")
+        main_handle = self.driver.current_window_handle
+        handles = [main_handle]
+        tabs = []
         
-        for server in target_servers:
-            server_name = server['name']
-            processed_count += 1
+        try:
+            # Дополнительные вкладки открываются на той же странице с настроенной пагинацией
+            for number in range(2, tab_count + 1):
+                self.driver.switch_to.new_window('tab')
+                handles.append(self.driver.current_window_handle)
+                print(f"🗂️ Подготовка вкладки {number}/{tab_count}...")
+                if not prepare_tab():
+                    print(f"⚠️ Вкладка {number} не подготовлена, работаем без нее")
+            
+            # Ссылки на строки привязаны к документу вкладки - индекс строится в каждой
+            for handle in handles:
+                self.driver.switch_to.window(handle)
+                rows = self._get_server_rows_enhanced()
+                if not rows:
+                    continue
+                if not tabs:
+                    self.processing_stats['total_found_rows'] = len(rows)
+                tabs.append(_ExtractionTab(handle, self._create_row_index(rows)))
             
-            print(f"\n[{processed_count}/{len(target_servers)}] Обрабатываем {server_name}...")
+            if not tabs:
+                print("❌ Не удалось получить строки серверов ни в одной вкладке")
+                self.stream_error = "Не удалось найти строки серверов"
+                return
             
-            # Ищем строку для этого сервера
-            row = row_index.get(server_name)
-            if not row:
-                print(f"⚠️ Строка не найдена для {server_name}")
-                self.processing_stats['failed_extractions'] += 1
-                continue
+            for position, server in enumerate(target_servers):
+                tabs[position % len(tabs)].queue.append(server['name'])
             
-            self.processing_stats['target_servers_found'] += 1
+            yield from self._iter_tabs_round_robin(tabs, len(target_servers))
             
-            # Извлекаем информацию о сервере
+        finally:
+            for handle in handles[1:]:
+                try:
+                    self.driver.switch_to.window(handle)
+                    self.driver.close()
+                except Exception:
+                    pass
             try:
-                start_time = time.time()
-                info = self.dialog_extractor.extract_server_info_smart(row, server_name)
-                duration = time.time() - start_time
+                self.driver.switch_to.window(main_handle)
+            except Exception:
+                pass
+            
+            self.fuzzy_matches = [entry for tab in tabs for entry in tab.row_index.get_audit()]
+            self.rejected_matches = [entry for tab in tabs for entry in tab.row_index.rejected_matches]
+            self.processing_stats['fuzzy_matches'] = len(self.fuzzy_matches)
+            self.processing_stats['rejected_matches'] = len(self.rejected_matches)
+    
+    def _iter_tabs_round_robin(self, tabs: List[_ExtractionTab], total: int) -> Iterator[ServerRecord]:
+        """Шаг вкладки, готовой раньше других: пока одна ждет анимацию, работает другая"""
+        started_count = 0
+        current_handle = self.driver.current_window_handle
+        active = list(tabs)
+        
+        while active:
+            tab = min(active, key=lambda item: item.ready_at)
+            wait = tab.ready_at - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            
+            if tab.handle != current_handle:
+                self.driver.switch_to.window(tab.handle)
+                current_handle = tab.handle
+            
+            if tab.task is None:
+                if self._stop_requested() or (tab.row is None and not tab.queue):
+                    active.remove(tab)
+                    continue
                 
-                if info and info.get('ip'):
-                    servers_data[server_name] = info
-                    self.processing_stats['successful_extractions'] += 1
-                    print(f"✅ {server_name} -> {info['ip']} ({info['protocol']}) [{duration:.1f}s]")
-                else:
-                    self.processing_stats['failed_extractions'] += 1
-                    print(f"❌ Не удалось получить данные для {server_name} [{duration:.1f}s]")
+                if tab.row is None:
+                    started_count += 1
+                    server_name = tab.queue.popleft()
+                    print(f"\n[{started_count}/{total}] Обрабатываем {server_name} (вкладка {tabs.index(tab) + 1})...")
+                    
+                    # Сначала строка: без нее запроса к сайту нет и токен регулятора не нужен
+                    row, _, _ = tab.row_index.lookup(server_name)
+                    if not row:
+                        print(f"⚠️ Строка не найдена для {server_name}")
+                        self.processing_stats['failed_extractions'] += 1
+                        continue
+                    
+                    self.processing_stats['target_servers_found'] += 1
+                    tab.server_name, tab.row = server_name, row
+                    
+                    # Старт сервера - по резервированию у регулятора, чтобы остальные
+                    # вкладки продолжали работу, пока эта ждет
+                    delay = self.rate_governor.reserve()
+                    if delay > 0:
+                        tab.ready_at = time.time() + delay
+                        continue
                 
+                row, tab.row = tab.row, None
+                tab.started = time.time()
+                tab.task = self.dialog_extractor.iter_extract_server_info(row, tab.server_name)
+            
+            try:
+                tab.ready_at = time.time() + next(tab.task)
+            except StopIteration as finished:
+                tab.task = None
+                record = self._record_extraction(tab.server_name, finished.value, time.time() - tab.started)
+                self._report_rate_signal(record is not None)
+                if record is not None:
+                    yield record
             except Exception as e:
                 self.processing_stats['failed_extractions'] += 1
-                print(f"❌ Ошибка обработки {server_name}: {e}")
-            
-            # Пауза между серверами для человекоподобного поведения
-            time.sleep(random.uniform(0.5, 2.0))
+                print(f"❌ Ошибка обработки {tab.server_name}: {e}")
+                self._report_rate_signal(False, str(e))
+                tab.task = None
+    
+    def _stop_requested(self) -> bool:
+        """Проверка мягкой остановки между серверами"""
+        if self.stopped:
+            return True
+        if self.stop_event is None or not self.stop_event.is_set():
+            return False
+        self.stopped = True
+        print("🛑 Запрошена остановка: новые серверы не обрабатываются, сохраняем полученные данные")
+        return True
+    
+    def _report_rate_signal(self, success: bool, error_text: str = ""):
+        """Сигнал регулятору скорости: чистый ответ или признаки блокировки"""
+        if success:
+            self.rate_governor.on_success()
+            return
         
-        # Подготавливаем результат
-        return self._create_result(servers_data, target_servers)
+        signal = classify_error_text(error_text) if error_text else self._detect_block_signal()
+        if signal in THROTTLE_SIGNALS:
+            self.rate_governor.on_throttle(signal)
+    
+    def _detect_block_signal(self) -> Optional[str]:
+        """Проверка страницы на заглушку Cloudflare / rate limit после неудачи"""
+        try:
+            # Текст страницы смотрим только если таблицы нет: в ней бывают
+            # серверы с именами вроде "cloudflare"
+            page_text = self.driver.execute_script(
+                "return document.title + ' ' + (document.querySelector('table tbody tr') ? '' : "
+                "(document.body ? document.body.innerText.slice(0, 2000) : ''));"
+            )
+        except Exception as e:
+            page_text = str(e)
+        return classify_error_text(page_text or '')
+    
+    def _record_extraction(self, server_name: str, info: Optional[ServerRecord],
+                           duration: float) -> Optional[ServerRecord]:
+        """Учет результата извлечения одного сервера: запись с каноническим именем или None"""
+        self.extraction_timings[server_name] = duration
+        
+        if info and info.ip:
+            # Имя в конфигурации остается каноническим (ключ записи в потоке)
+            info = info.with_name(server_name)
+            self.processing_stats['successful_extractions'] += 1
+            EXTRACTIONS_TOTAL.inc(result='success', method=info.source or 'unknown')
+            EXTRACTION_SECONDS.observe(duration, result='success')
+            print(f"✅ {server_name} -> {info.ip} ({info.protocol}) [{duration:.1f}s]")
+            return info
+        
+        self.processing_stats['failed_extractions'] += 1
+        EXTRACTIONS_TOTAL.inc(result='failed', method='none')
+        EXTRACTION_SECONDS.observe(duration, result='failed')
+        print(f"❌ Не удалось получить данные для {server_name} [{duration:.1f}s]")
+        return None
     
     def process_servers_batch(self, servers_data: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
         """Обработка партии серверов с разделением на серверы и релеи"""
@@ -570,9 +943,10 @@ class ServerProcessor:
             except:
                 continue
     
-    def _create_row_index(self, all_rows: List) -> Dict[str, Any]:
+    def _create_row_index(self, all_rows: List) -> RowMatchIndex:
         """Создание индекса строк по именам серверов"""
-        row_index = {}
+        row_index = RowMatchIndex(max_distance=self.config.ROW_MATCH_MAX_DISTANCE,
+                                  known_names=self.target_names)
         
         for row in all_rows:
             try:
@@ -580,14 +954,14 @@ class ServerProcessor:
                 if len(cells) > 0:
                     server_name = cells[0].text.strip()
                     if server_name and len(server_name) > 2:
-                        row_index[server_name] = row
+                        row_index.add(server_name, row)
             except:
                 continue
         
         print(f"📊 Создан индекс для {len(row_index)} серверов")
         return row_index
     
-    def _create_result(self, servers_data: Dict[str, Any], target_servers: List[Dict]) -> Dict[str, Any]:
+    def _create_result(self, servers_data: Dict[str, ServerRecord], target_servers: List[Dict]) -> Dict[str, Any]:
         """Создание результата обработки"""
         total_processed = len(target_servers)
         successful = len(servers_data)
@@ -600,6 +974,10 @@ class ServerProcessor:
             'failed': total_processed - successful,
             'success_rate': success_rate,
             'processing_stats': self.processing_stats.copy(),
+            'fuzzy_matches': list(self.fuzzy_matches),
+            'rejected_matches': list(self.rejected_matches),
+            'extraction_timings': dict(self.extraction_timings),
+            'rate_governor': self.rate_governor.get_stats(),
             'cache_hits': 0,  # Будет заполнено в dialog_extractor
             'recovery_attempts': 0  # Будет заполнено в error_recovery
         }
@@ -607,6 +985,11 @@ class ServerProcessor:
         print(f"\n📊 РЕЗУЛЬТАТЫ ОБРАБОТКИ:")
         print(f"   Всего строк найдено: {self.processing_stats['total_found_rows']}")
         print(f"   Целевых серверов найдено: {self.processing_stats['target_servers_found']}")
+        print(f"   Неточных совпадений имен: {self.processing_stats['fuzzy_matches']}")
+        if self.processing_stats['snapshot_fallbacks']:
+            print(f"   Живое извлечение вместо снимка (нет IP в таблице): {self.processing_stats['snapshot_fallbacks']}")
+        if self.processing_stats['rejected_matches']:
+            print(f"   Отклонено совпадений (соседние имена): {self.processing_stats['rejected_matches']}")
         print(f"   Успешно извлечено: {self.processing_stats['successful_extractions']}")
         print(f"   Неудачных попыток: {self.processing_stats['failed_extractions']}")
         print(f"   Общий процент успеха: {success_rate:.1f}%")
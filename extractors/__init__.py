@@ -4,5 +4,7 @@
 """
 
 from .dialog_extractor import AdvancedDialogExtractor
+from .snapshot_extractor import PageSnapshotExtractor
+from .server_record import ServerRecord, Protocol, ServerFlags
 
-__all__ = ['AdvancedDialogExtractor']
\ No newline at end of file
+__all__ = ['AdvancedDialogExtractor', 'PageSnapshotExtractor', 'ServerRecord', 'Protocol', 'ServerFlags']
\ No newline at end of file
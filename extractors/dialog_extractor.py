@@ -5,11 +5,11 @@ import time
 import re
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 from selenium.webdriver.common.action_chains import ActionChains
 
+from .server_record import ServerRecord
+
 class AdvancedDialogExtractor:
     """Извлечение данных из диалогов - ОБНОВЛЕННАЯ ВЕРСИЯ v2.1 для Vue.js"""
     
@@ -213,68 +213,73 @@ class AdvancedDialogExtractor:
             if not cells:
                 return None
             
-            server_data = {
-                'name': '',
-                'ip': '',
-                'protocol': 'DNSCrypt',
-                'row_index': row_index,
-                'extraction_method': 'table_direct'
-            }
-            
-            # Пытаемся извлечь данные из первой ячейки (обычно название)
-            if len(cells) > 0:
-                first_cell = cells[0]
-                cell_text = first_cell.text.strip()
-                
-                # Извлекаем имя сервера
-                name_match = None
-                for pattern in self.data_patterns['server_name']:
-                    match = re.search(pattern, cell_text)
-                    if match:
-                        name_match = match.group(1).strip()
-                        break
-                
-                if name_match:
-                    server_data['name'] = name_match
-                elif cell_text and len(cell_text) < 100:  # Простое имя
-                    server_data['name'] = cell_text
-            
-            # Ищем IP адрес во всех ячейках
-            for cell in cells:
-                cell_text = cell.text.strip()
-                for pattern in self.data_patterns['ip_address']:
-                    match = re.search(pattern, cell_text)
-                    if match:
-                        ip = match.group(1).strip()
-                        # Простая валидация IP
-                        ip_parts = ip.split('.')
-                        if len(ip_parts) == 4 and all(part.isdigit() and 0 <= int(part) <= 255 for part in ip_parts):
-                            server_data['ip'] = ip
-                            break
-                if server_data['ip']:
-                    break
-            
-            # Определяем протокол
-            full_row_text = row_text.lower()
-            if 'doh' in full_row_text or 'dns-over-https' in full_row_text:
-                server_data['protocol'] = 'DoH'
-            elif 'dot' in full_row_text or 'dns-over-tls' in full_row_text:
-                server_data['protocol'] = 'DoT'
-            elif 'relay' in full_row_text:
-                server_data['protocol'] = 'DNSCrypt relay'
-            
-            # Если нет имени, используем любой доступный текст
-            if not server_data['name'] and row_text:
-                clean_text = row_text.split('\n')[0].strip()
-                if clean_text and len(clean_text) < 50:
-                    server_data['name'] = clean_text
+            # Текст ячеек читаем лениво: каждый .text - отдельный запрос к WebDriver
+            first_cell_text = cells[0].text.strip()
+            cell_texts = (cell.text.strip() for cell in cells)
             
-            return server_data if server_data['name'] else None
+            return self.parse_row_texts(row_text, first_cell_text, cell_texts, row_index)
             
         except Exception as e:
             print(f"⚠️ Ошибка извлечения из строки {row_index}: {e}")
             return None
     
+    def parse_row_texts(self, row_text: str, first_cell_text: str, cell_texts, row_index) -> dict:
+        """Разбор текста строки таблицы, общий для живого DOM и снимков страницы"""
+        server_data = {
+            'name': '',
+            'ip': '',
+            'protocol': 'DNSCrypt',
+            'row_index': row_index,
+            'extraction_method': 'table_direct'
+        }
+        
+        # Пытаемся извлечь данные из первой ячейки (обычно название)
+        cell_text = first_cell_text
+        
+        # Извлекаем имя сервера
+        name_match = None
+        for pattern in self.data_patterns['server_name']:
+            match = re.search(pattern, cell_text)
+            if match:
+                name_match = match.group(1).strip()
+                break
+        
+        if name_match:
+            server_data['name'] = name_match
+        elif cell_text and len(cell_text) < 100:  # Простое имя
+            server_data['name'] = cell_text
+        
+        # Ищем IP адрес во всех ячейках
+        for cell_text in cell_texts:
+            for pattern in self.data_patterns['ip_address']:
+                match = re.search(pattern, cell_text)
+                if match:
+                    ip = match.group(1).strip()
+                    # Простая валидация IP
+                    ip_parts = ip.split('.')
+                    if len(ip_parts) == 4 and all(part.isdigit() and 0 <= int(part) <= 255 for part in ip_parts):
+                        server_data['ip'] = ip
+                        break
+            if server_data['ip']:
+                break
+        
+        # Определяем протокол
+        full_row_text = row_text.lower()
+        if 'doh' in full_row_text or 'dns-over-https' in full_row_text:
+            server_data['protocol'] = 'DoH'
+        elif 'dot' in full_row_text or 'dns-over-tls' in full_row_text:
+            server_data['protocol'] = 'DoT'
+        elif 'relay' in full_row_text:
+            server_data['protocol'] = 'DNSCrypt relay'
+        
+        # Если нет имени, используем любой доступный текст
+        if not server_data['name'] and row_text:
+            clean_text = row_text.split('\n')[0].strip()
+            if clean_text and len(clean_text) < 50:
+                server_data['name'] = clean_text
+        
+        return server_data if server_data['name'] else None
+    
     def _extract_via_dialogs(self, max_count: int = 100) -> list:
         """Извлечение данных через открытие диалогов"""
         servers = []
@@ -363,13 +368,25 @@ class AdvancedDialogExtractor:
 
     def _wait_for_dialog(self):
         """Ожидание появления диалогового окна"""
+        return self.run_extraction_steps(self._iter_wait_for_dialog())
+    
+    def _iter_wait_for_dialog(self, timeout: float = 5.0, poll_interval: float = 0.25):
+        """Пошаговое ожидание диалога: проверка, yield - пауза до следующей проверки"""
         combined_selector = ", ".join(self.selectors['dialogs'])
-        try:
-            return WebDriverWait(self.driver, 5).until(
-                EC.visibility_of_element_located((By.CSS_SELECTOR, combined_selector))
-            )
-        except TimeoutException:
-            return None
+        deadline = time.time() + timeout
+        while True:
+            try:
+                for dialog_element in self.driver.find_elements(By.CSS_SELECTOR, combined_selector):
+                    if dialog_element.is_displayed():
+                        return dialog_element
+            except WebDriverException:
+                # Диалог перерисовывается - проверим на следующем шаге
+                pass
+            
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            yield min(poll_interval, remaining)
 
     def _get_dialog_text(self, dialog_element) -> str:
         """Извлечение текста из диалогового окна с несколькими стратегиями."""
@@ -462,13 +479,17 @@ class AdvancedDialogExtractor:
 
     def _close_dialog_if_present(self):
         """Закрытие диалогового окна, если оно присутствует"""
+        self.run_extraction_steps(self._iter_close_dialog())
+    
+    def _iter_close_dialog(self):
+        """Пошаговое закрытие диалога: yield - пауза на анимацию закрытия"""
         for selector in self.selectors['dialog_close']:
             try:
                 close_button = self.driver.find_element(By.CSS_SELECTOR, selector)
                 if close_button.is_displayed():
                     actions = ActionChains(self.driver)
                     actions.move_to_element(close_button).click().perform()
-                    time.sleep(0.5)
+                    yield 0.5
                     return
             except (NoSuchElementException, WebDriverException):
                 continue
@@ -476,9 +497,9 @@ class AdvancedDialogExtractor:
         try:
             actions = ActionChains(self.driver)
             actions.move_by_offset(10, 10).click().perform()
-            time.sleep(0.5)
         except Exception:
-            pass
+            return
+        yield 0.5
 
     def _extract_via_javascript(self) -> list:
         """Извлечение данных из Vue.js компонента через JavaScript"""
@@ -532,6 +553,22 @@ class AdvancedDialogExtractor:
         Умное извлечение информации о сервере из строки таблицы
         Добавлено для обратной совместимости с legacy кодом
         """
+        return self.run_extraction_steps(self.iter_extract_server_info(row, server_name))
+    
+    @staticmethod
+    def run_extraction_steps(steps):
+        """Выполнение пошагового извлечения с ожиданием на месте"""
+        try:
+            while True:
+                time.sleep(next(steps))
+        except StopIteration as finished:
+            return finished.value
+    
+    def iter_extract_server_info(self, row, server_name):
+        """
+        Пошаговое извлечение: yield - сколько секунд ждать (анимация, рендер),
+        return - данные сервера. Ожидание одной вкладки можно занять работой другой.
+        """
         try:
             print(f"🔍 Извлекаем информацию о сервере: {server_name}")
             
@@ -541,7 +578,7 @@ class AdvancedDialogExtractor:
             # Если данных мало, пытаемся открыть диалог для этой строки
             if not server_data or not server_data.get('ip'):
                 print(f"   🔄 Пытаемся извлечь через диалог...")
-                dialog_data = self._try_extract_via_row_dialog(row, server_name)
+                dialog_data = yield from self._iter_row_dialog(row, server_name)
                 if dialog_data:
                     # Объединяем данные
                     if server_data:
@@ -551,12 +588,12 @@ class AdvancedDialogExtractor:
             
             # Проверяем и нормализуем данные
             if server_data:
-                server_data = self._normalize_server_data(server_data, server_name)
-                if server_data.get('ip'):
-                    print(f"   ✅ Успешно извлечено: {server_data.get('name', 'N/A')} -> {server_data.get('ip', 'N/A')}")
+                record = self._normalize_server_data(server_data, server_name)
+                if record.ip:
+                    print(f"   ✅ Успешно извлечено: {record.name or 'N/A'} -> {record.ip}")
                 else:
-                    print(f"   ⚠️  Извлечено имя, но не IP: {server_data.get('name', 'N/A')}")
-                return server_data
+                    print(f"   ⚠️  Извлечено имя, но не IP: {record.name or 'N/A'}")
+                return record
             else:
                 print(f"   ❌ Не удалось извлечь данные для {server_name}")
                 return None
@@ -567,6 +604,10 @@ class AdvancedDialogExtractor:
     
     def _try_extract_via_row_dialog(self, row, server_name):
         """Попытка извлечь данные через диалог конкретной строки"""
+        return self.run_extraction_steps(self._iter_row_dialog(row, server_name))
+    
+    def _iter_row_dialog(self, row, server_name):
+        """Пошаговое открытие диалога строки: yield - пауза на прокрутку и анимацию"""
         try:
             # Ищем кнопки или кликабельные элементы в строке
             clickable_elements = []
@@ -586,18 +627,18 @@ class AdvancedDialogExtractor:
                 try:
                     # Скроллим к элементу
                     self.driver.execute_script("arguments[0].scrollIntoView(true);", element)
-                    time.sleep(0.5)
+                    yield 0.5
                     
                     # Кликаем
                     if element.is_displayed() and element.is_enabled():
                         ActionChains(self.driver).move_to_element(element).click().perform()
-                        time.sleep(1)
+                        yield 1
                         
-                        # Ждем диалог
-                        dialog_element = self._wait_for_dialog()
+                        # Ждем диалог: проверки чередуются с работой других вкладок
+                        dialog_element = yield from self._iter_wait_for_dialog()
                         if dialog_element:
                             dialog_text = self._get_dialog_text(dialog_element)
-                            self._close_dialog_if_present()
+                            yield from self._iter_close_dialog()
                             
                             if dialog_text:
                                 print(f"      📄 Диалог для '{server_name}' получен, {len(dialog_text)} символов.")
@@ -616,27 +657,18 @@ class AdvancedDialogExtractor:
             return None
     
     def _normalize_server_data(self, server_data, original_name):
-        """Нормализация и проверка данных сервера"""
+        """Нормализация и проверка данных сервера: словарь извлечения -> ServerRecord"""
         if not server_data:
             return None
         
-        # Если нет имени, используем оригинальное
-        if not server_data.get('name') and original_name:
-            server_data['name'] = original_name
-        
         # Проверяем валидность IP
-        ip = server_data.get('ip', '')
+        ip = server_data.get('ip') or ''
         if ip:
             # Простая валидация IP
             ip_parts = ip.split('.')
-            if len(ip_parts) == 4 and all(part.isdigit() and 0 <= int(part) <= 255 for part in ip_parts):
-                server_data['ip'] = ip
-            else:
+            if not (len(ip_parts) == 4 and all(part.isdigit() and 0 <= int(part) <= 255 for part in ip_parts)):
                 # Если IP невалидный, убираем его
                 server_data['ip'] = ''
         
-        # Устанавливаем протокол по умолчанию
-        if not server_data.get('protocol'):
-            server_data['protocol'] = 'DNSCrypt'
-        
-        return server_data
\ No newline at end of file
+        # Без имени используется оригинальное, без протокола - DNSCrypt
+        return ServerRecord.from_dict(server_data, default_name=original_name or '')
\ No newline at end of file
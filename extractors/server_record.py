@@ -0,0 +1,128 @@
+"""
+Компактная запись сервера: протокол-перечисление и упакованные флаги
+"""
+from dataclasses import dataclass, replace
+from enum import Enum, IntFlag
+from typing import Any, Dict, Optional
+
+
+class Protocol(str, Enum):
+    """Протокол сервера (значение - как в конфигурационных файлах)"""
+    DNSCRYPT = 'DNSCrypt'
+    RELAY = 'DNSCrypt relay'
+    DOH = 'DoH'
+    DOT = 'DoT'
+    UNKNOWN = 'Unknown'
+
+    @classmethod
+    def parse(cls, value: Any) -> 'Protocol':
+        """Протокол из текста извлечения; пустое значение - DNSCrypt"""
+        if isinstance(value, cls):
+            return value
+        text = str(value or '').strip().lower()
+        if not text:
+            return cls.DNSCRYPT
+        return _PROTOCOL_ALIASES.get(text, cls.UNKNOWN)
+
+    def __str__(self) -> str:
+        return self.value
+
+
+_PROTOCOL_ALIASES = {
+    'dnscrypt': Protocol.DNSCRYPT,
+    'dnscrypt relay': Protocol.RELAY,
+    'relay': Protocol.RELAY,
+    'doh': Protocol.DOH,
+    'dns-over-https': Protocol.DOH,
+    'dot': Protocol.DOT,
+    'dns-over-tls': Protocol.DOT
+}
+
+
+class ServerFlags(IntFlag):
+    """Свойства сервера одним целым"""
+    NONE = 0
+    DNSSEC = 1
+    NO_FILTERS = 2
+    NO_LOGS = 4
+
+
+# Битовые маски как int: операции IntFlag в горячих циклах заметно медленнее
+_DNSSEC = int(ServerFlags.DNSSEC)
+_NO_FILTERS = int(ServerFlags.NO_FILTERS)
+_NO_LOGS = int(ServerFlags.NO_LOGS)
+_RELAY = Protocol.RELAY
+
+# Ключи словаря извлечения -> флаги
+_FLAG_KEYS = (('dnssec', _DNSSEC), ('no_filters', _NO_FILTERS), ('no_logs', _NO_LOGS))
+
+
+@dataclass(frozen=True, slots=True)
+class ServerRecord:
+    """Данные одного сервера после извлечения.
+
+    Словари остаются только на границах: разбор строки/диалога
+    (from_dict) и сериализация в JSON (to_dict).
+    """
+    name: str
+    ip: str = ''
+    protocol: Protocol = Protocol.DNSCRYPT
+    flags: int = 0      # ServerFlags
+    source: str = ''
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], default_name: str = '') -> 'ServerRecord':
+        """Запись из словаря извлечения (отсутствующие флаги - False)"""
+        flags = 0
+        for key, flag in _FLAG_KEYS:
+            if data.get(key):
+                flags |= flag
+        return cls(
+            name=data.get('name') or default_name,
+            ip=data.get('ip') or '',
+            protocol=Protocol.parse(data.get('protocol')),
+            flags=flags,
+            source=data.get('extraction_method') or data.get('source') or ''
+        )
+
+    @classmethod
+    def coerce(cls, value) -> Optional['ServerRecord']:
+        """ServerRecord или словарь старого формата -> ServerRecord"""
+        if value is None or isinstance(value, cls):
+            return value
+        return cls.from_dict(value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Словарь в прежнем формате данных сервера"""
+        return {
+            'name': self.name,
+            'ip': self.ip,
+            'protocol': self.protocol.value,
+            'dnssec': self.dnssec,
+            'no_filters': self.no_filters,
+            'no_logs': self.no_logs,
+            'extraction_method': self.source
+        }
+
+    def with_name(self, name: str) -> 'ServerRecord':
+        return self if name == self.name else replace(self, name=name)
+
+    @property
+    def server_flags(self) -> ServerFlags:
+        return ServerFlags(self.flags)
+
+    @property
+    def dnssec(self) -> bool:
+        return self.flags & _DNSSEC != 0
+
+    @property
+    def no_filters(self) -> bool:
+        return self.flags & _NO_FILTERS != 0
+
+    @property
+    def no_logs(self) -> bool:
+        return self.flags & _NO_LOGS != 0
+
+    @property
+    def is_relay(self) -> bool:
+        return self.protocol is _RELAY
@@ -0,0 +1,217 @@
+"""
+Извлечение данных из снимка страницы - офлайн разбор HTML без WebDriver
+"""
+import os
+import time
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+
+from .dialog_extractor import AdvancedDialogExtractor
+from .server_record import ServerRecord
+
+try:
+    import lxml.html
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+# Скрипт получения outerHTML таблицы серверов одним запросом
+CAPTURE_TABLE_SCRIPT = """
+const selectors = arguments[0];
+for (const selector of selectors) {
+    const row = document.querySelector(selector);
+    if (row) {
+        const table = row.closest('table');
+        if (table) {
+            return table.outerHTML;
+        }
+    }
+}
+return null;
+"""
+
+# Признаки "галочки" в ячейках с флагами (Vuetify рисует их иконками)
+TRUE_MARKERS = ('yes', 'true', '✓', '✔', 'да')
+TRUE_ICON_CLASSES = ('mdi-check', 'mdi-checkbox-marked', 'fa-check')
+
+
+class SnapshotRow:
+    """Строка таблицы из снимка страницы"""
+    __slots__ = ('name', 'cells', 'text', 'index', 'checked')
+
+    def __init__(self, cells: List[str], checked: List[bool], index: int):
+        self.cells = cells
+        self.checked = checked
+        self.index = index
+        self.name = cells[0] if cells else ''
+        self.text = '\n'.join(cell for cell in cells if cell)
+
+
+class _TableHTMLParser(HTMLParser):
+    """Резервный разбор таблицы стандартным html.parser (если нет lxml)"""
+
+    def __init__(self):
+        super().__init__()
+        self.headers: List[str] = []
+        self.rows: List[tuple] = []
+        self._in_header = False
+        self._in_body = False
+        self._cells: Optional[List[str]] = None
+        self._checked: Optional[List[bool]] = None
+        self._cell_parts: Optional[List[str]] = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'thead':
+            self._in_header = True
+        elif tag == 'tbody':
+            self._in_body = True
+        elif tag == 'tr':
+            self._cells, self._checked = [], []
+        elif tag in ('td', 'th') and self._cells is not None:
+            self._cell_parts = []
+            self._checked.append(False)
+        elif self._cell_parts is not None:
+            classes = dict(attrs).get('class') or ''
+            if any(marker in classes for marker in TRUE_ICON_CLASSES):
+                self._checked[-1] = True
+
+    def handle_endtag(self, tag):
+        if tag == 'thead':
+            self._in_header = False
+        elif tag == 'tbody':
+            self._in_body = False
+        elif tag in ('td', 'th') and self._cell_parts is not None:
+            self._cells.append(' '.join(''.join(self._cell_parts).split()))
+            self._cell_parts = None
+        elif tag == 'tr' and self._cells is not None:
+            if self._in_header:
+                self.headers = [cell.lower() for cell in self._cells]
+            elif self._cells and self._in_body:
+                self.rows.append((self._cells, self._checked))
+            self._cells, self._checked = None, None
+
+    def handle_data(self, data):
+        if self._cell_parts is not None:
+            self._cell_parts.append(data)
+
+
+class PageSnapshotExtractor:
+    """Снимок таблицы серверов и его офлайн разбор в записи строк"""
+
+    def __init__(self, config=None, row_parser: AdvancedDialogExtractor = None):
+        self.config = config
+        # Разбор текста строк общий с живым извлечением
+        self.row_parser = row_parser or AdvancedDialogExtractor(None, config)
+        self.headers: List[str] = []
+
+    def capture(self, driver) -> str:
+        """Снимок HTML таблицы (или всей страницы) одним запросом"""
+        selectors = list(self.config.TABLE_ROW_SELECTORS) if self.config else ['table tbody tr']
+        try:
+            html = driver.execute_script(CAPTURE_TABLE_SCRIPT, selectors)
+            if html:
+                print(f"📸 Снимок таблицы получен: {len(html)} символов")
+                return html
+        except Exception as e:
+            print(f"⚠️ Не удалось получить outerHTML таблицы: {e}")
+
+        html = driver.page_source
+        print(f"📸 Снимок страницы получен: {len(html)} символов")
+        return html
+
+    def save_snapshot(self, html: str, directory: str) -> str:
+        """Сохранение снимка для повторного воспроизведения"""
+        try:
+            os.makedirs(directory, exist_ok=True)
+            filename = os.path.join(directory, f"snapshot_{int(time.time())}.html")
+            with open(filename, 'w', encoding='utf-8') as f:
+                f.write(html)
+            print(f"💾 Снимок сохранен: {filename}")
+            return filename
+        except Exception as e:
+            print(f"⚠️ Не удалось сохранить снимок: {e}")
+            return ""
+
+    def load_snapshot(self, filename: str) -> str:
+        """Загрузка сохраненного снимка"""
+        with open(filename, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def parse_rows(self, html: str) -> List[SnapshotRow]:
+        """Разбор снимка в записи строк таблицы"""
+        if not html:
+            return []
+
+        if LXML_AVAILABLE:
+            headers, raw_rows = self._parse_with_lxml(html)
+        else:
+            parser = _TableHTMLParser()
+            parser.feed(html)
+            headers, raw_rows = parser.headers, parser.rows
+
+        self.headers = headers
+        rows = []
+        for cells, checked in raw_rows:
+            if len(cells) < 2:
+                continue
+            text = ' '.join(cells)
+            if len(text) < 10 or any(skip in text.lower() for skip in
+                                     ["no data available", "loading", "please wait"]):
+                continue
+            if len(cells[0]) <= 2:
+                continue
+            rows.append(SnapshotRow(cells, checked, len(rows)))
+
+        print(f"📊 Из снимка разобрано {len(rows)} строк ({'lxml' if LXML_AVAILABLE else 'html.parser'})")
+        return rows
+
+    def _parse_with_lxml(self, html: str):
+        """Быстрый разбор через lxml"""
+        document = lxml.html.fromstring(html)
+        headers = [' '.join(th.text_content().split()).lower()
+                   for th in document.xpath('//thead//th')]
+
+        raw_rows = []
+        for tr in document.xpath('//tbody/tr'):
+            cells, checked = [], []
+            for td in tr.xpath('./td'):
+                cells.append(' '.join(td.text_content().split()))
+                classes = ' '.join(td.xpath('.//@class'))
+                checked.append(any(marker in classes for marker in TRUE_ICON_CLASSES))
+            raw_rows.append((cells, checked))
+        return headers, raw_rows
+
+    def extract_server_info(self, row: SnapshotRow, server_name: str) -> Optional[ServerRecord]:
+        """Извлечение данных сервера из строки снимка (формат как у extract_server_info_smart)"""
+        try:
+            server_data = self.row_parser.parse_row_texts(
+                row.text, row.name, iter(row.cells), server_name
+            )
+            if not server_data:
+                return None
+
+            server_data['extraction_method'] = 'snapshot'
+            server_data.update(self._extract_flags(row))
+            return self.row_parser._normalize_server_data(server_data, server_name)
+
+        except Exception as e:
+            print(f"   ❌ Ошибка разбора снимка для {server_name}: {e}")
+            return None
+
+    def _extract_flags(self, row: SnapshotRow) -> Dict[str, bool]:
+        """Флаги DNSSEC / no logs / no filter по заголовкам колонок"""
+        flags = {'dnssec': False, 'no_filters': False, 'no_logs': False}
+        columns = {
+            'dnssec': ('dnssec',),
+            'no_logs': ('no log', 'nolog'),
+            'no_filters': ('no filter', 'nofilter')
+        }
+
+        for position, header in enumerate(self.headers):
+            if position >= len(row.cells):
+                break
+            for flag, keywords in columns.items():
+                if any(keyword in header for keyword in keywords):
+                    value = row.cells[position].lower()
+                    flags[flag] = row.checked[position] or value in TRUE_MARKERS
+        return flags
@@ -4,8 +4,12 @@
 
 from .config_parser import ConfigFileParser
 from .file_updater import FileUpdater
+from .download_cache import ConditionalDownloader
+from .config_document import ConfigDocument
 
 __all__ = [
     'ConfigFileParser',
-    'FileUpdater'
+    'FileUpdater',
+    'ConditionalDownloader',
+    'ConfigDocument'
 ]
\ No newline at end of file
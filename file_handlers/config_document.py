@@ -0,0 +1,154 @@
+"""
+Модель конфигурационного файла DNSCrypt: разбор один раз, точечные правки строк
+"""
+import os
+import tempfile
+from typing import Dict, List, Optional, Any
+
+
+def _default_mode() -> int:
+    """Права нового файла как у open(): 0666 с учетом umask процесса"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def copy_target_mode(temp_path: str, path: str):
+    """Права заменяемого файла (или обычные права нового) на временный файл перед os.replace.
+
+    mkstemp создает файл с правами 0600, и rename сохранил бы их у
+    опубликованного файла.
+    """
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except OSError:
+        mode = _default_mode()
+    os.chmod(temp_path, mode)
+
+
+def write_text_atomic(path: str, text: str, encoding: str = 'utf-8') -> bool:
+    """Запись через временный файл и rename, только если байты отличаются.
+
+    Возвращает True, если файл был записан.
+    """
+    data = text.encode(encoding)
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        copy_target_mode(temp_path, path)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return True
+
+
+class ConfigDocument:
+    """Строки файла как есть (комментарии и разделители не трогаются),
+    секции страна -> город -> серверы и индекс имя -> номера строк"""
+
+    def __init__(self, text: str = "", source: Optional[str] = None):
+        self.source = source
+        self.original_text = text
+        self.lines: List[str] = text.splitlines(keepends=True)
+        # Имя сервера -> номера строк (имя может повторяться в разных секциях)
+        self.index: Dict[str, List[int]] = {}
+        # Страна -> город -> имена серверов в порядке файла
+        self.sections: Dict[str, Dict[Optional[str], List[str]]] = {}
+        self._entries: List[Dict[str, Any]] = []
+        self._parse()
+
+    @classmethod
+    def load(cls, filename: str) -> 'ConfigDocument':
+        # newline='' сохраняет исходные окончания строк
+        with open(filename, 'r', encoding='utf-8', newline='') as f:
+            return cls(f.read(), source=filename)
+
+    def _parse(self):
+        current_country = None
+        current_city = None
+
+        for number, raw_line in enumerate(self.lines):
+            line = raw_line.strip()
+
+            # Комментарии и пустые строки
+            if not line or line.startswith('#'):
+                continue
+
+            # Страна в квадратных скобках
+            if line.startswith('[') and line.endswith(']'):
+                current_country = line[1:-1]
+                current_city = None
+                self.sections.setdefault(current_country, {})
+                continue
+
+            # Город в кавычках
+            if line.startswith('"') and line.endswith('"'):
+                current_city = line[1:-1]
+                if current_country is not None:
+                    self.sections[current_country].setdefault(current_city, [])
+                continue
+
+            # Строка сервера: имя до первого пробела
+            server_name = line.split()[0]
+            self.index.setdefault(server_name, []).append(number)
+            if current_country is None:
+                continue
+
+            self.sections[current_country].setdefault(current_city, []).append(server_name)
+            self._entries.append({
+                'name': server_name,
+                'country': current_country,
+                'city': current_city,
+                'original_line': line
+            })
+
+    def servers(self) -> List[Dict[str, Any]]:
+        """Серверы внутри секций (формат ConfigFileParser.parse_config_file)"""
+        return [dict(entry) for entry in self._entries]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def get_line(self, name: str) -> Optional[str]:
+        """Текущая строка сервера без окончания строки"""
+        numbers = self.index.get(name)
+        if not numbers:
+            return None
+        return self.lines[numbers[0]].rstrip('\r\n')
+
+    def set_line(self, name: str, text: str) -> int:
+        """Замена строк сервера по индексу, возвращает число замененных строк"""
+        numbers = self.index.get(name)
+        if not numbers:
+            return 0
+
+        for number in numbers:
+            line = self.lines[number]
+            # Окончание строки сохраняется как было (у последней строки его может не быть)
+            ending = line[len(line.rstrip('\r\n')):]
+            self.lines[number] = text + ending
+        return len(numbers)
+
+    def to_text(self) -> str:
+        return ''.join(self.lines)
+
+    @property
+    def modified(self) -> bool:
+        return self.to_text() != self.original_text
+
+    def save(self, filename: str) -> bool:
+        """Атомарная запись, только если содержимое отличается от файла на диске"""
+        return write_text_atomic(filename, self.to_text())
@@ -4,16 +4,41 @@
 import urllib.request
 from typing import List, Dict, Any
 
+from .config_document import ConfigDocument
+from .download_cache import ConditionalDownloader, DownloadResult
+
 class ConfigFileParser:
     """Парсер конфигурационных файлов DNSCrypt"""
     
+    def __init__(self, cache_dir: str = "./output/download_cache"):
+        self.cache_dir = cache_dir
+        self._downloader = None
+        # Путь -> разобранный документ, используется повторно FileUpdater
+        self.documents: Dict[str, ConfigDocument] = {}
+    
+    def download_files(self, urls: Dict[str, str]) -> Dict[str, DownloadResult]:
+        """Параллельное условное скачивание {имя: url} через кэш ETag"""
+        if self._downloader is None:
+            self._downloader = ConditionalDownloader(self.cache_dir)
+        
+        raw_urls = {name: self._to_raw_url(url) for name, url in urls.items()}
+        print(f"📥 Проверяем {len(raw_urls)} файлов конфигурации...")
+        return self._downloader.fetch_all(raw_urls)
+    
+    @staticmethod
+    def _to_raw_url(url: str) -> str:
+        """GitHub URL страницы файла -> raw URL (прямые адреса без изменений)"""
+        if '/blob/' in url:
+            return url.replace('github.com', 'raw.githubusercontent.com').replace('/blob/', '/')
+        return url
+    
     def download_file(self, url: str, filename: str) -> bool:
         """Скачивание файла с GitHub"""
         try:
             print(f"📥 Скачиваем {filename} с GitHub...")
             
             # Преобразуем GitHub URL в raw URL
-            raw_url = url.replace('github.com', 'raw.githubusercontent.com').replace('/blob/', '/')
+            raw_url = self._to_raw_url(url)
             
             urllib.request.urlretrieve(raw_url, filename)
             print(f"✅ Файл {filename} успешно скачан")
@@ -22,49 +47,20 @@ class ConfigFileParser:
             print(f"❌ Ошибка скачивания {filename}: {e}")
             return False
     
+    def load_document(self, filename: str) -> ConfigDocument:
+        """Разобранный файл конфигурации (разбирается один раз на путь)"""
+        document = self.documents.get(filename)
+        if document is None:
+            document = self.documents[filename] = ConfigDocument.load(filename)
+        return document
+    
     def parse_config_file(self, filename: str) -> List[Dict[str, Any]]:
         """Парсинг файлов конфигурации для извлечения имен серверов"""
-        servers = []
-        current_country = None
-        current_city = None
-        
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                
-            for line in lines:
-                line = line.strip()
-                
-                # Пропускаем комментарии и пустые строки
-                if not line or line.startswith('#'):
-                    continue
-                    
-                # Страна в квадратных скобках
-                if line.startswith('[') and line.endswith(']'):
-                    current_country = line[1:-1]
-                    current_city = None
-                    continue
-                    
-                # Город в кавычках
-                if line.startswith('"') and line.endswith('"'):
-                    current_city = line[1:-1]
-                    continue
-                    
-                # Имя сервера (не начинается с [ или ")
-                if not line.startswith('[') and not line.startswith('"') and current_country:
-                    # Извлекаем имя сервера (до первого пробела или табуляции)
-                    server_name = line.split()[0] if line.split() else line
-                    
-                    servers.append({
-                        'name': server_name,
-                        'country': current_country,
-                        'city': current_city,
-                        'original_line': line
-                    })
-                    
+            servers = self.load_document(filename).servers()
             print(f"✅ Извлечено {len(servers)} серверов из {filename}")
             return servers
             
         except Exception as e:
             print(f"❌ Ошибка парсинга {filename}: {e}")
-            return []
\ No newline at end of file
+            return []
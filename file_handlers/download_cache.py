@@ -0,0 +1,184 @@
+"""
+Условное параллельное скачивание файлов с кэшем ETag/Last-Modified
+"""
+import os
+import re
+import json
+import hashlib
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Dict, Optional
+
+INDEX_FILE = "index.json"
+OBJECTS_DIR = "objects"
+
+# Имя объекта хранилища - SHA-256 содержимого (временные файлы записи не подходят)
+_OBJECT_NAME = re.compile(r'^[0-9a-f]{64}$')
+
+
+@dataclass
+class DownloadResult:
+    """Результат скачивания одного файла"""
+    name: str
+    url: str
+    path: Optional[str] = None      # файл в локальном хранилище (None - нет содержимого)
+    status: str = 'error'           # downloaded / not_modified / stale / error
+    changed: bool = False
+    sha256: Optional[str] = None
+    size: int = 0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.path is not None
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class ConditionalDownloader:
+    """Скачивание с If-None-Match/If-Modified-Since и контентным хранилищем"""
+
+    def __init__(self, cache_dir: str = "./output/download_cache", max_workers: int = 4,
+                 timeout: float = 30.0):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, OBJECTS_DIR)
+        self.index_file = os.path.join(cache_dir, INDEX_FILE)
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._index_dirty = False
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.index: Dict[str, Dict] = self._load_index()
+
+    def fetch_all(self, urls: Dict[str, str]) -> Dict[str, DownloadResult]:
+        """Параллельное скачивание {имя: url}, индекс сохраняется один раз"""
+        workers = max(1, min(self.max_workers, len(urls)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {name: executor.submit(self.fetch, name, url) for name, url in urls.items()}
+            results = {name: future.result() for name, future in futures.items()}
+        if self._save_index():
+            # Новое содержимое вытеснило прежнее - объекты без ссылок из индекса удаляются
+            self.prune()
+        return results
+
+    def fetch(self, name: str, url: str) -> DownloadResult:
+        """Условный запрос одного файла"""
+        with self._lock:
+            entry = dict(self.index.get(url, {}))
+        cached_path = self._object_path(entry.get('sha256')) if entry else None
+        if cached_path and not os.path.exists(cached_path):
+            # Хранилище очищено - валидаторы без содержимого бесполезны
+            entry, cached_path = {}, None
+
+        request = urllib.request.Request(url, headers={'User-Agent': 'dnscrypt-parser'})
+        if cached_path:
+            if entry.get('etag'):
+                request.add_header('If-None-Match', entry['etag'])
+            if entry.get('last_modified'):
+                request.add_header('If-Modified-Since', entry['last_modified'])
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                content = response.read()
+                headers = response.headers
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and cached_path:
+                print(f"✅ {name}: не изменился (304)")
+                return DownloadResult(name, url, cached_path, 'not_modified', False,
+                                      entry['sha256'], entry.get('size', 0))
+            return self._fallback(name, url, entry, cached_path, f"HTTP {e.code}")
+        except Exception as e:
+            return self._fallback(name, url, entry, cached_path, str(e))
+
+        sha256 = hashlib.sha256(content).hexdigest()
+        path = self._store(sha256, content)
+        changed = sha256 != entry.get('sha256')
+
+        validators = (headers.get('ETag'), headers.get('Last-Modified'), sha256)
+        if validators != (entry.get('etag'), entry.get('last_modified'), entry.get('sha256')):
+            with self._lock:
+                self.index[url] = {
+                    'etag': validators[0],
+                    'last_modified': validators[1],
+                    'sha256': sha256,
+                    'size': len(content),
+                    'fetched_at': datetime.now().isoformat()
+                }
+                self._index_dirty = True
+
+        print(f"{'📥' if changed else '✅'} {name}: {len(content)} байт"
+              f"{'' if changed else ' (содержимое не изменилось)'}")
+        return DownloadResult(name, url, path, 'downloaded', changed, sha256, len(content))
+
+    def _fallback(self, name: str, url: str, entry: Dict, cached_path: Optional[str],
+                  error: str) -> DownloadResult:
+        """Ошибка сети: используем последнюю сохраненную версию, если есть"""
+        if cached_path:
+            print(f"⚠️ {name}: {error}, используем сохраненную версию")
+            return DownloadResult(name, url, cached_path, 'stale', False,
+                                  entry.get('sha256'), entry.get('size', 0), error)
+        print(f"❌ Ошибка скачивания {name}: {error}")
+        return DownloadResult(name, url, error=error)
+
+    def _object_path(self, sha256: Optional[str]) -> Optional[str]:
+        return os.path.join(self.objects_dir, sha256) if sha256 else None
+
+    def _store(self, sha256: str, content: bytes) -> str:
+        """Запись в контентное хранилище (повторное содержимое не пишется)"""
+        path = self._object_path(sha256)
+        if not os.path.exists(path):
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(content)
+            os.replace(temp_path, path)
+        return path
+
+    def prune(self) -> int:
+        """Удаление объектов, на которые не ссылается ни одна запись индекса"""
+        with self._lock:
+            referenced = {entry.get('sha256') for entry in self.index.values()}
+        removed = 0
+        try:
+            names = os.listdir(self.objects_dir)
+        except OSError:
+            return 0
+        for name in names:
+            if not _OBJECT_NAME.match(name) or name in referenced:
+                continue
+            try:
+                os.remove(os.path.join(self.objects_dir, name))
+                removed += 1
+            except OSError:
+                pass
+        if removed:
+            print(f"🧹 Кэш загрузок: удалено неиспользуемых объектов: {removed}")
+        return removed
+
+    def _load_index(self) -> Dict[str, Dict]:
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self) -> bool:
+        """Атомарная запись индекса, только если он изменился (True - записан)"""
+        with self._lock:
+            if not self._index_dirty:
+                return False
+            temp_file = self.index_file + ".tmp"
+            try:
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(self.index, f, indent=2, ensure_ascii=False)
+                os.replace(temp_file, self.index_file)
+                self._index_dirty = False
+                return True
+            except OSError as e:
+                print(f"⚠️ Не удалось сохранить индекс кэша загрузок: {e}")
+                return False
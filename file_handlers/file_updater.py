@@ -2,116 +2,115 @@
 Модуль для обновления конфигурационных файлов
 """
 import os
-from typing import Dict, Any
+from typing import Dict, Optional
+
+from .config_document import ConfigDocument, write_text_atomic
+
+try:
+    from ..extractors.server_record import ServerRecord
+except ImportError:
+    from extractors.server_record import ServerRecord
 
 class FileUpdater:
     """Обновлятор конфигурационных файлов"""
     
-    def format_relay_line(self, server_info: Dict[str, Any]) -> str:
+    def format_relay_line(self, server_info: ServerRecord) -> Optional[str]:
         """Форматирование строки релея"""
-        if not server_info['ip']:
+        server_info = ServerRecord.coerce(server_info)
+        if not server_info.ip:
             return None
         
-        name = server_info['name']
-        protocol = server_info['protocol']
-        ip = server_info['ip']
-        
-        return f"{name:<30} Anonymized DNS relay | {protocol} | {ip}"
+        return f"{server_info.name:<30} Anonymized DNS relay | {server_info.protocol} | {server_info.ip}"
     
-    def format_server_line(self, server_info: Dict[str, Any]) -> str:
+    def format_server_line(self, server_info: ServerRecord) -> Optional[str]:
         """Форматирование строки обычного сервера"""
-        if not server_info['ip']:
+        server_info = ServerRecord.coerce(server_info)
+        if not server_info.ip:
             return None
         
-        name = server_info['name']
-        no_filter = "no filter" if server_info['no_filters'] else "filter"
-        no_logs = "no logs" if server_info['no_logs'] else "logs"
-        dnssec = "DNSSEC" if server_info['dnssec'] else "-----"
-        protocol = server_info['protocol']
-        ip = server_info['ip']
+        no_filter = "no filter" if server_info.no_filters else "filter"
+        no_logs = "no logs" if server_info.no_logs else "logs"
+        dnssec = "DNSSEC" if server_info.dnssec else "-----"
         
-        return f"{name:<30} {no_filter} | {no_logs} | {dnssec} | IPv4 server | {protocol} | {ip}"
+        return (f"{server_info.name:<30} {no_filter} | {no_logs} | {dnssec} | IPv4 server | "
+                f"{server_info.protocol} | {server_info.ip}")
     
-    def update_config_file(self, filename: str, servers_data: Dict[str, Any], is_relay_file: bool = False) -> int:
-        """Обновление файла конфигурации с новыми данными"""
+    def apply_record(self, document: ConfigDocument, server_name: str, server_info: ServerRecord,
+                     is_relay_file: bool = False) -> int:
+        """Правка строки одного сервера в документе, возвращает число замененных строк"""
+        if server_name not in document:
+            return 0
+        
+        server_info = ServerRecord.coerce(server_info)
+        new_line = self.format_relay_line(server_info) if is_relay_file else self.format_server_line(server_info)
+        if not new_line:
+            return 0
+        
+        print(f"✅ Обновлен: {server_name} -> {server_info.ip}")
+        return document.set_line(server_name, new_line)
+    
+    def update_config_file(self, filename: str, servers_data: Dict[str, ServerRecord], is_relay_file: bool = False,
+                           output_name: str = None, document: Optional[ConfigDocument] = None) -> int:
+        """Обновление файла конфигурации с новыми данными.
+        
+        document - уже разобранный файл (ConfigFileParser.load_document),
+        иначе файл разбирается здесь.
+        """
+        output_name = output_name or os.path.basename(filename)
         try:
             print(f"📝 Обновляем файл {filename}...")
             
-            # Читаем оригинальный файл
-            with open(filename, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
+            if document is None:
+                document = ConfigDocument.load(filename)
             
-            updated_lines = []
+            # Правим только строки известных серверов, по индексу документа
             updated_count = 0
+            for server_name, server_info in servers_data.items():
+                updated_count += self.apply_record(document, server_name, server_info, is_relay_file)
             
-            for line in lines:
-                original_line = line.rstrip()
-                
-                # Пропускаем комментарии, пустые строки, страны и города
-                if (not original_line or original_line.startswith('#') or 
-                    (original_line.startswith('[') and original_line.endswith(']')) or
-                    (original_line.startswith('"') and original_line.endswith('"'))):
-                    updated_lines.append(line)
-                    continue
-                
-                # Ищем имя сервера в данных
-                server_name = original_line.split()[0] if original_line.split() else ""
-                
-                if server_name in servers_data:
-                    # Форматируем строку в зависимости от типа файла
-                    if is_relay_file:
-                        new_line = self.format_relay_line(servers_data[server_name])
-                    else:
-                        new_line = self.format_server_line(servers_data[server_name])
-                    
-                    if new_line:
-                        updated_lines.append(new_line + '\n')
-                        updated_count += 1
-                        print(f"✅ Обновлен: {server_name} -> {servers_data[server_name]['ip']}")
-                    else:
-                        updated_lines.append(line)
-                else:
-                    # Оставляем оригинальную строку
-                    updated_lines.append(line)
-            
-            # Определяем выходную директорию
-            output_dir = '/app/output' if os.path.exists('/app') else './output'
-            
-            try:
-                if not os.path.exists(output_dir):
-                    os.makedirs(output_dir, mode=0o755, exist_ok=True)
-            except PermissionError:
-                print(f"⚠️ Не удалось создать директорию {output_dir}, используем текущую")
-                output_dir = '.'
-            
-            # Создаем резервную копию
-            backup_filename = os.path.join(output_dir, f"{os.path.basename(filename)}.original_backup")
-            try:
-                with open(backup_filename, 'w', encoding='utf-8') as f:
-                    f.writelines(lines)
-                print(f"💾 Резервная копия создана: {backup_filename}")
-            except PermissionError:
-                print(f"⚠️ Не удалось создать резервную копию, продолжаем без неё")
-            
-            # Записываем обновленный файл
-            output_filename = os.path.join(output_dir, os.path.basename(filename))
-            try:
-                with open(output_filename, 'w', encoding='utf-8') as f:
-                    f.writelines(updated_lines)
-                print(f"✅ Файл {output_filename} обновлен. Обновлено серверов: {updated_count}")
-            except PermissionError:
-                # Пробуем записать в альтернативную директорию
-                alt_filename = f"./{os.path.basename(filename)}"
-                try:
-                    with open(alt_filename, 'w', encoding='utf-8') as f:
-                        f.writelines(updated_lines)
-                    print(f"✅ Файл {alt_filename} обновлен в текущей директории. Обновлено серверов: {updated_count}")
-                except Exception as e:
-                    print(f"❌ Критическая ошибка записи файла: {e}")
-                    return 0
-            
+            if not self.save_document(document, output_name, updated_count):
+                return 0
             return updated_count
             
         except Exception as e:
             print(f"❌ Ошибка обновления файла {filename}: {e}")
-            return 0
\ No newline at end of file
+            return 0
+    
+    def save_document(self, document: ConfigDocument, output_name: str, updated_count: int = 0) -> bool:
+        """Резервная копия исходного файла и запись документа в выходную директорию"""
+        # Определяем выходную директорию
+        output_dir = '/app/output' if os.path.exists('/app') else './output'
+        
+        try:
+            if not os.path.exists(output_dir):
+                os.makedirs(output_dir, mode=0o755, exist_ok=True)
+        except PermissionError:
+            print(f"⚠️ Не удалось создать директорию {output_dir}, используем текущую")
+            output_dir = '.'
+        
+        # Создаем резервную копию
+        backup_filename = os.path.join(output_dir, f"{output_name}.original_backup")
+        try:
+            if write_text_atomic(backup_filename, document.original_text):
+                print(f"💾 Резервная копия создана: {backup_filename}")
+        except PermissionError:
+            print(f"⚠️ Не удалось создать резервную копию, продолжаем без неё")
+        
+        # Записываем обновленный файл (без записи, если содержимое совпадает)
+        output_filename = os.path.join(output_dir, output_name)
+        try:
+            if document.save(output_filename):
+                print(f"✅ Файл {output_filename} обновлен. Обновлено серверов: {updated_count}")
+            else:
+                print(f"✅ Файл {output_filename} не изменился. Проверено серверов: {updated_count}")
+        except PermissionError:
+            # Пробуем записать в альтернативную директорию
+            alt_filename = f"./{output_name}"
+            try:
+                document.save(alt_filename)
+                print(f"✅ Файл {alt_filename} обновлен в текущей директории. Обновлено серверов: {updated_count}")
+            except Exception as e:
+                print(f"❌ Критическая ошибка записи файла: {e}")
+                return False
+        
+        return True
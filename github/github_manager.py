@@ -4,24 +4,74 @@
 import os
 import time
 import base64
+import hashlib
 import json
 import requests
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+try:
+    from ..utils.metrics import REGISTRY
+except ImportError:
+    # Fallback для случаев когда относительный импорт не работает
+    import sys
+    from pathlib import Path
+    sys.path.append(str(Path(__file__).parent.parent))
+    from utils.metrics import REGISTRY
+
+COMMITS_TOTAL = REGISTRY.counter(
+    'dnscrypt_github_commits_total', 'Коммиты обновлений в GitHub по результату', ('result',)
+)
+COMMIT_SECONDS = REGISTRY.histogram(
+    'dnscrypt_github_commit_seconds', 'Длительность создания коммита через GitHub API',
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+)
+LAST_COMMIT_TIMESTAMP = REGISTRY.gauge(
+    'dnscrypt_github_last_commit_timestamp_seconds', 'Время последнего успешного коммита (unix)'
+)
 
 class GitHubManager:
     """Менеджер для работы с GitHub API"""
     
+    def __init__(self):
+        # SHA коммита последнего успешного create_github_commit (None - коммита не было)
+        self.last_commit_sha: Optional[str] = None
+        # SHA-256 отправленного содержимого {путь в репозитории: sha256} последнего коммита
+        self.last_pushed_files: Dict[str, str] = {}
+    
     def get_config(self) -> Dict[str, str]:
         """Получение конфигурации GitHub из переменных окружения"""
         return {
             'owner': os.getenv('GITHUB_OWNER', 'gopnikgame'),
             'repo': os.getenv('GITHUB_REPO', 'Installer_dnscypt'),
             'token': os.getenv('GITHUB_TOKEN'),
-            'branch': os.getenv('GITHUB_BRANCH', 'main')
+            'branch': os.getenv('GITHUB_BRANCH', 'main'),
+            # Адреса API и raw переопределяются для локального стенда (bench/)
+            'api_url': os.getenv('GITHUB_API_URL', 'https://api.github.com').rstrip('/'),
+            'raw_url': os.getenv('GITHUB_RAW_URL', 'https://raw.githubusercontent.com').rstrip('/')
         }
     
+    def get_raw_file_url(self, path: str) -> str:
+        """Прямой адрес файла репозитория для скачивания"""
+        config = self.get_config()
+        return f"{config['raw_url']}/{config['owner']}/{config['repo']}/{config['branch']}/{path}"
+    
     def create_github_commit(self, files_to_commit: Dict[str, str], commit_message: str) -> bool:
-        """Создание коммита с несколькими файлами через GitHub API"""
+        """Создание коммита с несколькими файлами через GitHub API.
+        
+        SHA созданного коммита доступен в last_commit_sha.
+        """
+        self.last_commit_sha = None
+        self.last_pushed_files = {}
+        started = time.time()
+        success = self._create_commit(files_to_commit, commit_message)
+        COMMIT_SECONDS.observe(time.time() - started)
+        COMMITS_TOTAL.inc(result='success' if success else 'failed')
+        if success:
+            LAST_COMMIT_TIMESTAMP.set_to_current_time()
+        return success
+    
+    def _create_commit(self, files_to_commit: Dict[str, str], commit_message: str) -> bool:
+        """Шаги Git Data API: blob'ы, дерево, коммит, обновление ветки"""
         try:
             config = self.get_config()
             
@@ -35,8 +85,10 @@ class GitHubManager:
                 'Content-Type': 'application/json'
             }
             
+            repo_url = f"{config['api_url']}/repos/{config['owner']}/{config['repo']}"
+            
             # Получаем последний коммит
-            url = f"https://api.github.com/repos/{config['owner']}/{config['repo']}/git/refs/heads/{config['branch']}"
+            url = f"{repo_url}/git/refs/heads/{config['branch']}"
             response = requests.get(url, headers=headers)
             if response.status_code != 200:
                 print(f"❌ Не удалось получить последний коммит: {response.status_code}")
@@ -45,7 +97,7 @@ class GitHubManager:
             last_commit_sha = response.json()['object']['sha']
             
             # Получаем дерево последнего коммита
-            url = f"https://api.github.com/repos/{config['owner']}/{config['repo']}/git/commits/{last_commit_sha}"
+            url = f"{repo_url}/git/commits/{last_commit_sha}"
             response = requests.get(url, headers=headers)
             if response.status_code != 200:
                 print(f"❌ Не удалось получить дерево коммита: {response.status_code}")
@@ -55,6 +107,7 @@ class GitHubManager:
             
             # Создаем новые blob'ы для файлов
             tree_items = []
+            pushed_files = {}
             
             for local_file, github_path in files_to_commit.items():
                 print(f"📤 Подготовка {local_file} -> {github_path}")
@@ -64,7 +117,7 @@ class GitHubManager:
                     content = f.read()
                 
                 # Создаем blob
-                blob_url = f"https://api.github.com/repos/{config['owner']}/{config['repo']}/git/blobs"
+                blob_url = f"{repo_url}/git/blobs"
                 blob_data = {
                     'content': base64.b64encode(content.encode('utf-8')).decode('utf-8'),
                     'encoding': 'base64'
@@ -76,6 +129,7 @@ class GitHubManager:
                     return False
                 
                 blob_sha = response.json()['sha']
+                pushed_files[github_path] = hashlib.sha256(content.encode('utf-8')).hexdigest()
                 
                 tree_items.append({
                     'path': github_path,
@@ -85,7 +139,7 @@ class GitHubManager:
                 })
             
             # Создаем новое дерево
-            tree_url = f"https://api.github.com/repos/{config['owner']}/{config['repo']}/git/trees"
+            tree_url = f"{repo_url}/git/trees"
             tree_data = {
                 'base_tree': base_tree_sha,
                 'tree': tree_items
@@ -99,7 +153,7 @@ class GitHubManager:
             new_tree_sha = response.json()['sha']
             
             # Создаем коммит
-            commit_url = f"https://api.github.com/repos/{config['owner']}/{config['repo']}/git/commits"
+            commit_url = f"{repo_url}/git/commits"
             commit_data = {
                 'message': commit_message,
                 'tree': new_tree_sha,
@@ -114,7 +168,7 @@ class GitHubManager:
             new_commit_sha = response.json()['sha']
             
             # Обновляем ссылку на ветку
-            ref_url = f"https://api.github.com/repos/{config['owner']}/{config['repo']}/git/refs/heads/{config['branch']}"
+            ref_url = f"{repo_url}/git/refs/heads/{config['branch']}"
             ref_data = {
                 'sha': new_commit_sha
             }
@@ -124,6 +178,8 @@ class GitHubManager:
                 print(f"❌ Не удалось обновить ветку: {response.status_code}")
                 return False
             
+            self.last_commit_sha = new_commit_sha
+            self.last_pushed_files = pushed_files
             print(f"✅ Коммит успешно создан: {new_commit_sha[:7]}")
             return True
             
@@ -369,12 +369,12 @@ view_scheduler_status() {
     echo ""
     log "YELLOW" "📁 Файлы состояния:"
     
-    if [ -f "$OUTPUT_DIR/last_run.txt" ]; then
+    if [ -f "$OUTPUT_DIR/schedule.json" ]; then
         local last_run
-        last_run=$(cat "$OUTPUT_DIR/last_run.txt")
-        log "GREEN" "⏰ Последний запуск: $last_run"
+        last_run=$(grep -o '"last_success": "[^"]*"' "$OUTPUT_DIR/schedule.json" | head -1 | cut -d'"' -f4)
+        log "GREEN" "⏰ Последний запуск: ${last_run:-еще не было}"
     else
-        log "YELLOW" "📅 Файл last_run.txt не найден"
+        log "YELLOW" "📅 Файл schedule.json не найден"
     fi
     
     if [ -f "$SCHEDULER_LOG_FILE" ]; then
@@ -4,8 +4,10 @@
 
 from .page_navigator import PageNavigator
 from .pagination_manager import PaginationManager
+from .heap_watchdog import HeapWatchdog
 
 __all__ = [
     'PageNavigator',
-    'PaginationManager'
+    'PaginationManager',
+    'HeapWatchdog'
 ]
\ No newline at end of file
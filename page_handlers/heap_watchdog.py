@@ -0,0 +1,140 @@
+"""
+Контроль памяти страницы: метрики рендерера через CDP и перезагрузка между серверами
+"""
+from typing import Any, Callable, Dict, Optional
+from selenium import webdriver
+
+# Используем относительный импорт для лучшей совместимости
+try:
+    from ..core.config import ParserConfig
+    from ..utils.metrics import REGISTRY
+except ImportError:
+    # Fallback для случаев когда относительный импорт не работает
+    import sys
+    from pathlib import Path
+    sys.path.append(str(Path(__file__).parent.parent))
+    from core.config import ParserConfig
+    from utils.metrics import REGISTRY
+
+# Метрики Performance.getMetrics, по которым принимается решение
+WATCHED_METRICS = ('JSHeapUsedSize', 'Nodes', 'JSEventListeners')
+
+RENDERER_METRIC = REGISTRY.gauge(
+    'dnscrypt_parser_renderer_metric', 'Метрики рендерера страницы (Performance.getMetrics)', ('metric',)
+)
+PAGE_REFRESHES_TOTAL = REGISTRY.counter(
+    'dnscrypt_parser_page_refreshes_total', 'Перезагрузки страницы по превышению порогов', ('reason',)
+)
+
+
+class HeapWatchdog:
+    """Проверка JSHeapUsedSize / Nodes / JSEventListeners каждые check_every серверов.
+
+    Оверлеи и обработчики Vuetify копятся после сотен открытий диалогов;
+    при превышении абсолютного порога или роста относительно замера после
+    загрузки страница перезагружается (refresh_page: навигация и пагинация),
+    а вызывающий перестраивает индекс строк.
+    """
+
+    def __init__(self, driver: webdriver.Chrome, config: ParserConfig,
+                 refresh_page: Callable[[], bool]):
+        self.driver = driver
+        self.config = config
+        self.refresh_page = refresh_page
+        self.check_every = max(1, config.HEAP_CHECK_EVERY)
+        self.limits = {
+            'JSHeapUsedSize': config.HEAP_MAX_JS_MB * 2**20,
+            'Nodes': config.HEAP_MAX_NODES,
+            'JSEventListeners': config.HEAP_MAX_LISTENERS
+        }
+        self.growth_factor = config.HEAP_GROWTH_FACTOR
+        self.baseline: Optional[Dict[str, float]] = None
+        self._servers_since_check = 0
+        self._enabled = False
+        self.stats = {
+            'checks': 0,
+            'refreshes': 0,
+            'failed_refreshes': 0,
+            'last': {},
+            'peak': {}
+        }
+
+    def read_metrics(self) -> Dict[str, float]:
+        """Текущие метрики рендерера (пустой словарь, если CDP недоступен)"""
+        try:
+            if not self._enabled:
+                self.driver.execute_cdp_cmd('Performance.enable', {})
+                self._enabled = True
+            response = self.driver.execute_cdp_cmd('Performance.getMetrics', {})
+        except Exception as e:
+            print(f"⚠️ Метрики рендерера недоступны: {e}")
+            return {}
+
+        metrics = {
+            item['name']: item['value'] for item in response.get('metrics', [])
+            if item.get('name') in WATCHED_METRICS
+        }
+        for name, value in metrics.items():
+            RENDERER_METRIC.set(value, metric=name)
+            if value > self.stats['peak'].get(name, 0):
+                self.stats['peak'][name] = value
+        self.stats['last'] = metrics
+        return metrics
+
+    def reset_baseline(self):
+        """Замер после загрузки страницы - точка отсчета роста"""
+        self._servers_since_check = 0
+        self.baseline = self.read_metrics() or None
+
+    def _exceeded(self, metrics: Dict[str, float]) -> Optional[str]:
+        for name, limit in self.limits.items():
+            if limit and metrics.get(name, 0) > limit:
+                return name
+        if self.growth_factor and self.baseline:
+            for name, base in self.baseline.items():
+                if base > 0 and metrics.get(name, 0) > base * self.growth_factor:
+                    return f"{name}_growth"
+        return None
+
+    def after_server(self) -> bool:
+        """Вызов в безопасной точке между серверами.
+
+        Возвращает True, если страница перезагружена и ссылки на строки
+        нужно получить заново.
+        """
+        self._servers_since_check += 1
+        if self._servers_since_check < self.check_every:
+            return False
+        self._servers_since_check = 0
+
+        if self.baseline is None:
+            self.reset_baseline()
+            return False
+
+        metrics = self.read_metrics()
+        self.stats['checks'] += 1
+        reason = self._exceeded(metrics)
+        if not reason:
+            return False
+
+        print(f"🧹 Рендерер превысил порог ({reason}): "
+              f"heap {metrics.get('JSHeapUsedSize', 0) / 2**20:.0f} МБ, "
+              f"узлов {metrics.get('Nodes', 0):.0f}, обработчиков {metrics.get('JSEventListeners', 0):.0f} - "
+              f"перезагрузка страницы")
+        PAGE_REFRESHES_TOTAL.inc(reason=reason)
+        try:
+            refreshed = self.refresh_page()
+        except Exception as e:
+            print(f"⚠️ Ошибка перезагрузки страницы: {e}")
+            refreshed = False
+
+        if refreshed:
+            self.stats['refreshes'] += 1
+        else:
+            self.stats['failed_refreshes'] += 1
+            print("⚠️ Перезагрузка страницы или настройка пагинации не удалась")
+        self.reset_baseline()
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
@@ -10,6 +10,8 @@ DNSCrypt Parser v2.0 - Полностью модульная версия
 
 import sys
 import os
+import signal
+import threading
 import time
 from pathlib import Path
 
@@ -25,12 +27,30 @@ load_dotenv()
 try:
     # Импорты модульной системы
     from core import DNSCryptParser
+    from core.config import ParserConfig
+    from utils.run_lease import RunLease, EXIT_LEASE_BUSY, LEASE_POLICIES, load_lease_result
     MODULAR_AVAILABLE = True
     print("🚀 Модульная система DNSCrypt Parser v2.0 загружена")
 except ImportError as e:
     print(f"⚠️ Модульная система недоступна: {e}")
     MODULAR_AVAILABLE = False
 
+# Мягкая остановка: SIGTERM/SIGUSR1 (scheduler до жесткого таймаута, docker stop)
+STOP_EVENT = threading.Event()
+
+def install_stop_handlers():
+    """Первый сигнал - мягкая остановка после текущего сервера, повторный - немедленный выход"""
+    def handle_stop(signum, frame):
+        if STOP_EVENT.is_set():
+            print(f"\n🛑 Повторный сигнал {signum}: немедленный выход")
+            sys.exit(128 + signum)
+        print(f"\n🛑 Получен сигнал {signum}: завершаем текущий сервер и сохраняем полученные данные")
+        STOP_EVENT.set()
+    
+    for name in ('SIGTERM', 'SIGUSR1'):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), handle_stop)
+
 def show_system_info():
     """Показать информацию о системе и доступных компонентах"""
     print("🔍 ИНФОРМАЦИЯ О СИСТЕМЕ:")
@@ -82,12 +102,15 @@ def run_modular_parser():
         print("=" * 70)
         
         # Создаем и запускаем парсер с context manager
-        with DNSCryptParser() as parser:
+        with DNSCryptParser(stop_event=STOP_EVENT) as parser:
             # Запускаем полный цикл парсинга
             result = parser.run_full_parsing()
             
             if result['success']:
-                print("\n🎉 МОДУЛЬНЫЙ ПАРСЕР ЗАВЕРШЕН УСПЕШНО!")
+                if result.get('cancelled'):
+                    print("\n🛑 МОДУЛЬНЫЙ ПАРСЕР ОСТАНОВЛЕН: ДАННЫЕ СОХРАНЕНЫ ЧАСТИЧНО")
+                else:
+                    print("\n🎉 МОДУЛЬНЫЙ ПАРСЕР ЗАВЕРШЕН УСПЕШНО!")
                 
                 # Выводим детальную статистику
                 parsing_result = result.get('parsing_result', {})
@@ -111,6 +134,63 @@ def run_modular_parser():
         traceback.print_exc()
         return False
 
+def run_with_lease():
+    """Запуск под арендой: один запуск парсера на каталог output.
+    
+    Если аренду держит другой запуск (scheduler или разовый запуск), по
+    PARSER_RUN_LEASE_POLICY: wait - дождаться и запуститься, piggyback -
+    дождаться и взять его результат, exit - выйти сразу с кодом 75.
+    """
+    config = ParserConfig.from_env()
+    if not config.RUN_LEASE_FILE:
+        return run_modular_parser()
+    
+    lease = RunLease(
+        config.RUN_LEASE_FILE, 'parser_new', config.RUN_LEASE_HEARTBEAT, config.RUN_LEASE_STALE_AFTER,
+        os.path.abspath(config.RUN_RESULT_FILE) if config.RUN_RESULT_FILE else None
+    )
+    
+    # Аренду держит запустивший нас scheduler
+    holder = lease.active()
+    if holder and holder.get('token') == os.getenv('PARSER_RUN_LEASE_TOKEN'):
+        print(f"🔒 Аренда запуска у scheduler'а: {lease.describe(holder)}")
+        return run_modular_parser()
+    
+    if not lease.try_acquire():
+        holder = lease.active() or {}
+        policy = config.RUN_LEASE_POLICY if config.RUN_LEASE_POLICY in LEASE_POLICIES else 'exit'
+        print(f"🔒 Парсер уже запущен: {lease.describe(holder)}")
+        
+        if policy == 'exit':
+            print("🚪 Выход без запуска (PARSER_RUN_LEASE_POLICY=exit)")
+            sys.exit(EXIT_LEASE_BUSY)
+        
+        if policy == 'piggyback':
+            print("📎 Ожидание результата текущего запуска...")
+            if not lease.wait_for_release(config.RUN_LEASE_WAIT_TIMEOUT, cancel=STOP_EVENT):
+                print("⏰ Текущий запуск не завершился за время ожидания")
+                sys.exit(EXIT_LEASE_BUSY)
+            document = load_lease_result(holder, config.RUN_RESULT_FILE)
+            if document is None:
+                print("⚠️ Текущий запуск завершился без документа результата")
+                sys.exit(EXIT_LEASE_BUSY)
+            counts = document['counts']
+            print(f"📎 Результат запуска {holder.get('owner')}: "
+                  f"{'✅ успешно' if document['success'] else '❌ ошибка'}, "
+                  f"серверов {counts['successful']}/{counts['total_processed']}, "
+                  f"обновлено {document['diff']['total_updated']}")
+            return document['success']
+        
+        print("⏳ Ожидание завершения текущего запуска...")
+        if not lease.acquire(config.RUN_LEASE_WAIT_TIMEOUT, cancel=STOP_EVENT):
+            print("⏰ Аренда не освободилась за время ожидания")
+            sys.exit(EXIT_LEASE_BUSY)
+    
+    try:
+        return run_modular_parser()
+    finally:
+        lease.release()
+
 def main():
     """Главная функция"""
     start_time = time.time()
@@ -145,7 +225,8 @@ def main():
     print("🚀 НАЧАЛО ВЫПОЛНЕНИЯ")
     print("="*70)
     
-    success = run_modular_parser()
+    install_stop_handlers()
+    success = run_with_lease()
     
     # Финальный отчет
     end_time = time.time()
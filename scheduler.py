@@ -1,18 +1,27 @@
 #!/usr/bin/env python3
 """
-Scheduler для автоматического запуска парсера DNSCrypt каждые 7 дней
+Scheduler для автоматического запуска парсера DNSCrypt по расписанию (интервал или cron)
 Поддержка модульной системы v2.0
 """
 
-import time
 import subprocess
 import sys
 import os
 import signal
 import logging
+import threading
+from collections import deque
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from utils.metrics import REGISTRY, METRICS_DB_NAME
+from utils.metrics_store import MetricsStore
+from utils.job_scheduler import JobScheduler, NextRunTable, ScheduledJob, IntervalSchedule, parse_schedule
+from utils.run_result import build_run_result, load_run_result
+from utils.run_lease import RunLease, LEASE_POLICIES, DEFAULT_STALE_AFTER, load_lease_result
+from utils.change_watch import ChangeWatcher, DEFAULT_WATCH_URLS, parse_watch_urls
+from github.github_manager import GitHubManager
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
@@ -24,10 +33,38 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Метрики scheduler'а (HTTP /metrics или textfile для node-exporter)
+RUNS_TOTAL = REGISTRY.counter(
+    'dnscrypt_scheduler_runs_total', 'Запуски парсера по результату', ('result',)
+)
+RUN_SECONDS = REGISTRY.histogram(
+    'dnscrypt_scheduler_run_duration_seconds', 'Длительность запуска парсера',
+    buckets=(60.0, 120.0, 300.0, 600.0, 900.0, 1200.0, 1800.0, 2700.0, 3600.0)
+)
+LAST_RUN_TIMESTAMP = REGISTRY.gauge(
+    'dnscrypt_scheduler_last_run_timestamp_seconds', 'Время начала последнего запуска (unix)'
+)
+LAST_SUCCESS_TIMESTAMP = REGISTRY.gauge(
+    'dnscrypt_scheduler_last_success_timestamp_seconds', 'Время начала последнего успешного запуска (unix)'
+)
+NEXT_RUN_TIMESTAMP = REGISTRY.gauge(
+    'dnscrypt_scheduler_next_run_timestamp_seconds', 'Плановое время следующего запуска (unix)'
+)
+ROLLUP_SESSIONS = REGISTRY.gauge(
+    'dnscrypt_scheduler_rollup_sessions', 'Сессии парсинга за 7 дней (задача metrics_rollup)'
+)
+ROLLUP_SUCCESS_RATE = REGISTRY.gauge(
+    'dnscrypt_scheduler_rollup_success_rate', 'Средний процент успеха за 7 дней (задача metrics_rollup)'
+)
+
 class DNSCryptScheduler:
     def __init__(self):
         self.is_running = True
+        # Ожидание задач прерывается этим событием сразу после сигнала завершения
+        self.stop_event = threading.Event()
+        # Прежний файл времени запуска переносится в таблицу запусков
         self.last_run_file = '/app/output/last_run.txt'
+        self.schedule_file = os.getenv('SCHEDULER_STATE_FILE', '/app/output/schedule.json')
         
         # Получаем интервал из переменных окружения или используем значение по умолчанию
         self.interval_days = int(os.getenv('SCHEDULER_INTERVAL_DAYS', '7'))
@@ -43,6 +80,71 @@ class DNSCryptScheduler:
         self.parser_mode = os.getenv('PARSER_MODE', 'auto')
         self.parser_script = self._determine_parser_script()
         
+        # Режим выполнения: subprocess (отдельный процесс) или inprocess (DNSCryptParser напрямую)
+        self.execution_mode = os.getenv('SCHEDULER_EXECUTION_MODE', 'subprocess').lower()
+        if self.execution_mode == 'inprocess' and not (self.parser_script or '').endswith('parser_new.py'):
+            logger.warning("⚠️ Режим inprocess доступен только для модульного парсера - используем subprocess")
+            self.execution_mode = 'subprocess'
+        # Сколько последних строк вывода процесса хранить для анализа и отчета
+        self.output_buffer_lines = int(os.getenv('SCHEDULER_OUTPUT_BUFFER_LINES', '500'))
+        
+        # Остановка долгого запуска: мягкая (SIGTERM - парсер дорабатывает текущий сервер и
+        # записывает полученные данные), затем через grace минут - kill
+        self.soft_timeout_seconds = float(os.getenv('SCHEDULER_SOFT_TIMEOUT_MINUTES', '50')) * 60
+        self.stop_grace_seconds = float(os.getenv('SCHEDULER_STOP_GRACE_MINUTES', '10')) * 60
+        # Текущий запуск (процесс или DNSCryptParser) - ему передается сигнал завершения scheduler'а
+        self.active_process = None
+        self.active_parser = None
+        
+        # Документ результата запуска, который пишет парсер (PARSER_RUN_RESULT_FILE)
+        self.run_result_file = os.getenv('SCHEDULER_RUN_RESULT_FILE', '/app/output/run_result.json')
+        
+        # Аренда запуска, общая с parser_new.py и разовыми запусками (пусто - без аренды)
+        self.run_lease = None
+        lease_file = os.getenv('SCHEDULER_RUN_LEASE_FILE', '/app/output/run.lease')
+        if lease_file:
+            self.run_lease = RunLease(
+                lease_file, 'scheduler',
+                stale_after=float(os.getenv('SCHEDULER_LEASE_STALE_SECONDS', str(DEFAULT_STALE_AFTER))),
+                run_result_file=self.run_result_file
+            )
+        self.lease_policy = os.getenv('SCHEDULER_LEASE_POLICY', 'piggyback').lower()
+        if self.lease_policy not in LEASE_POLICIES:
+            logger.warning(f"⚠️ Неизвестная политика аренды {self.lease_policy} - используем piggyback")
+            self.lease_policy = 'piggyback'
+        self.lease_wait_seconds = int(os.getenv('SCHEDULER_LEASE_WAIT_MINUTES', '90')) * 60
+        
+        # Повтор после неудачи: задержка удваивается с каждой неудачей подряд
+        self.retry_base_seconds = int(os.getenv('SCHEDULER_RETRY_BASE_MINUTES', '60')) * 60
+        
+        # Запуск по изменениям (change): частый опрос источников, полный парсинг только
+        # при изменении и не чаще минимального интервала; интервал в днях остается запасным
+        self.trigger_mode = os.getenv('SCHEDULER_TRIGGER_MODE', 'interval').lower()
+        self.poll_seconds = int(os.getenv('SCHEDULER_POLL_MINUTES', '15')) * 60
+        self.min_interval_seconds = int(os.getenv('SCHEDULER_MIN_INTERVAL_HOURS', '6')) * 3600
+        self.change_watcher = None
+        # Отпечатки источников, снятые перед текущим запуском парсера (их принимает успешный запуск)
+        self.run_fingerprints = None
+        if self.trigger_mode == 'change':
+            self.change_watcher = ChangeWatcher(
+                self._watch_urls(), os.getenv('SCHEDULER_WATCH_STATE_DIR', '/app/output/change_watch')
+            )
+        
+        # Задачи (full_parse, incremental_refresh, metrics_rollup, status) и таблица следующих запусков
+        self.jitter_seconds = int(os.getenv('SCHEDULER_JITTER_SECONDS', '300'))
+        self.metrics_db = os.getenv('SCHEDULER_METRICS_DB', f'/app/output/{METRICS_DB_NAME}')
+        self.schedule_table = NextRunTable(self.schedule_file)
+        self._import_last_run_file()
+        self.consecutive_failures = self.schedule_table.get('full_parse').get('failures', 0)
+        self.jobs = self._build_jobs()
+        self.engine = JobScheduler(self.jobs, self.schedule_table, self.stop_event)
+        
+        # Экспорт метрик Prometheus
+        self.metrics_port = int(os.getenv('SCHEDULER_METRICS_PORT', '0'))
+        self.metrics_textfile = os.getenv('SCHEDULER_METRICS_TEXTFILE', '')
+        if self.metrics_port:
+            REGISTRY.start_http_server(self.metrics_port)
+        
         # Обработчики сигналов для корректного завершения
         signal.signal(signal.SIGTERM, self.signal_handler)
         signal.signal(signal.SIGINT, self.signal_handler)
@@ -51,10 +153,29 @@ class DNSCryptScheduler:
         logger.info(f"📅 Интервал обновления: {self.interval_days} дней")
         logger.info(f"⚙️ Режим парсера: {self.parser_mode}")
         logger.info(f"📄 Скрипт парсера: {self.parser_script}")
+        logger.info(f"🧵 Режим выполнения: {self.execution_mode}")
+        for job in self.jobs:
+            logger.info(f"🗓️ Задача {job.name}: {job.schedule}")
+        if self.change_watcher:
+            logger.info(f"👀 Запуск по изменениям: опрос каждые {self.poll_seconds // 60} мин, "
+                        f"не чаще раза в {self.min_interval_seconds // 3600} ч, источники: "
+                        f"{', '.join(self.change_watcher.urls)}")
         
         # Проверяем переменные окружения
         self.check_environment()
         
+    def _watch_urls(self):
+        """Отслеживаемые источники: SCHEDULER_WATCH_URLS или списки резолверов и файлы конфигурации"""
+        configured = os.getenv('SCHEDULER_WATCH_URLS', '')
+        if configured:
+            return parse_watch_urls(configured)
+        
+        github_manager = GitHubManager()
+        urls = dict(DEFAULT_WATCH_URLS)
+        urls['DNSCrypt_relay.txt'] = github_manager.get_raw_file_url('lib/DNSCrypt_relay.txt')
+        urls['DNSCrypt_servers.txt'] = github_manager.get_raw_file_url('lib/DNSCrypt_servers.txt')
+        return urls
+        
     def _determine_parser_script(self):
         """Автоматическое определение доступного парсера"""
         if self.parser_mode == 'legacy':
@@ -113,65 +234,235 @@ class DNSCryptScheduler:
         """Обработчик сигналов для корректного завершения"""
         logger.info(f"📨 Получен сигнал {signum}. Завершение работы...")
         self.is_running = False
+        self.stop_event.set()
+        self._request_parser_stop()
+    
+    def _request_parser_stop(self):
+        """Мягкая остановка текущего запуска парсера (если он идет)"""
+        if self.active_parser is not None:
+            self.active_parser.request_stop()
+        process = self.active_process
+        if process is not None and process.poll() is None:
+            process.send_signal(signal.SIGTERM)
         
     def get_last_run_time(self):
-        """Получить время последнего запуска"""
-        try:
-            if os.path.exists(self.last_run_file):
-                with open(self.last_run_file, 'r') as f:
-                    timestamp = f.read().strip()
-                    if timestamp:
-                        return datetime.fromisoformat(timestamp)
-        except Exception as e:
-            logger.warning(f"⚠️ Не удалось прочитать время последнего запуска: {e}")
-        return None
+        """Получить время последнего успешного запуска (таблица запусков)"""
+        return self.schedule_table.get_time('full_parse', 'last_success')
         
     def save_last_run_time(self, run_time=None):
-        """Сохранить время последнего запуска"""
+        """Сохранить время последнего успешного запуска"""
         if run_time is None:
             run_time = datetime.now()
-            
+        self.schedule_table.update('full_parse', last_success=run_time)
+        logger.info(f"💾 Время последнего запуска сохранено: {run_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    
+    def _import_last_run_file(self):
+        """Перенос last_run.txt в таблицу запусков (файл переименовывается в .migrated)"""
+        if not os.path.exists(self.last_run_file):
+            return
         try:
-            os.makedirs(os.path.dirname(self.last_run_file), exist_ok=True)
-            with open(self.last_run_file, 'w') as f:
-                f.write(run_time.isoformat())
-            logger.info(f"💾 Время последнего запуска сохранено: {run_time.strftime('%Y-%m-%d %H:%M:%S')}")
+            with open(self.last_run_file, 'r') as f:
+                timestamp = f.read().strip()
+            if timestamp and self.get_last_run_time() is None:
+                last_run = datetime.fromisoformat(timestamp)
+                self.schedule_table.update(
+                    'full_parse', last_success=last_run,
+                    next_run=last_run + timedelta(seconds=self.interval_seconds)
+                )
+                logger.info(f"📦 Время последнего запуска перенесено из {self.last_run_file}")
+            os.replace(self.last_run_file, self.last_run_file + '.migrated')
         except Exception as e:
-            logger.error(f"❌ Ошибка сохранения времени последнего запуска: {e}")
-            
-    def should_run_parser(self):
-        """Проверить, нужно ли запускать парсер"""
+            logger.warning(f"⚠️ Не удалось перенести время последнего запуска: {e}")
+    
+    def _build_jobs(self):
+        """Задачи scheduler'а по настройкам SCHEDULER_*_CRON (пустое значение - интервал)"""
+        jobs = [
+            # Полный парсинг; без записи в таблице (первый запуск) - сразу
+            ScheduledJob(
+                'full_parse',
+                parse_schedule(os.getenv('SCHEDULER_FULL_PARSE_CRON', ''), self.interval_seconds),
+                self._full_parse_job, self.jitter_seconds, run_on_start=True
+            )
+        ]
+        if self.change_watcher:
+            jobs.append(ScheduledJob(
+                'incremental_refresh',
+                parse_schedule(os.getenv('SCHEDULER_INCREMENTAL_CRON', ''), self.poll_seconds),
+                self._incremental_refresh_job
+            ))
+        rollup_cron = os.getenv('SCHEDULER_ROLLUP_CRON', '30 3 * * *')
+        if rollup_cron.lower() != 'off':
+            jobs.append(ScheduledJob(
+                'metrics_rollup', parse_schedule(rollup_cron, 24 * 3600), self._metrics_rollup_job, self.jitter_seconds
+            ))
+        jobs.append(ScheduledJob('status', IntervalSchedule(6 * 3600), self._status_job))
+        return jobs
+    
+    def _full_parse_job(self):
+        """Задача full_parse: срок следующего запуска назначает _finish_run"""
+        self.run_parser()
+        return self.schedule_table.get_time('full_parse', 'next_run')
+    
+    def _incremental_refresh_job(self):
+        """Задача incremental_refresh: опрос источников и парсинг только при изменении"""
+        if self.consecutive_failures:
+            logger.debug("🔁 Ожидается повтор после неудачи - опрос источников пропущен")
+            return None
         last_run = self.get_last_run_time()
+        if last_run and (datetime.now() - last_run).total_seconds() < self.min_interval_seconds:
+            logger.debug("⏳ Минимальный интервал между запусками не истек")
+            return None
+        if self._sources_changed():
+            self.run_parser()
+        return None
+    
+    def _metrics_rollup_job(self):
+        """Задача metrics_rollup: хранение сырых метрик и сводка за неделю"""
+        if not os.path.exists(self.metrics_db):
+            logger.debug(f"📊 База метрик не найдена: {self.metrics_db}")
+            return None
         
-        if last_run is None:
-            logger.info("🔥 Первый запуск - парсер будет выполнен немедленно")
-            return True
+        store = MetricsStore(self.metrics_db, int(os.getenv('PARSER_METRICS_RETENTION_DAYS', '30')))
+        removed = store.apply_retention()
+        if removed:
+            logger.info(f"🧹 Удалено устаревших метрик серверов: {removed}")
+        
+        summary = store.historical_summary(7)
+        ROLLUP_SESSIONS.set(summary.get('sessions_count', 0))
+        ROLLUP_SUCCESS_RATE.set(summary.get('avg_success_rate', 0))
+        if 'sessions_count' in summary:
+            logger.info(f"📊 За 7 дней: сессий {summary['sessions_count']}, "
+                        f"успешность {summary['avg_success_rate']:.1f}%")
+        self._publish_metrics()
+        return None
+    
+    def _status_job(self):
+        self.log_status()
+        return None
             
-        time_since_last_run = datetime.now() - last_run
-        time_until_next_run = timedelta(seconds=self.interval_seconds) - time_since_last_run
+    def _sources_changed(self):
+        """Опрос источников в режиме change (ошибка опроса - не изменение)"""
+        try:
+            changed = self.change_watcher.changed()
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка опроса источников: {e}")
+            return False
         
-        if time_since_last_run.total_seconds() >= self.interval_seconds:
-            logger.info(f"⏰ Время запуска парсера (прошло {time_since_last_run.days} дней)")
+        if changed:
+            logger.info(f"🔔 Изменились источники: {', '.join(changed)} - запуск парсера")
+            self.run_fingerprints = dict(self.change_watcher.last_poll)
             return True
-        else:
-            if time_until_next_run.days > 0:
-                logger.debug(f"⏳ До следующего запуска: {time_until_next_run.days} дней {time_until_next_run.seconds // 3600} часов")
-            else:
-                hours_left = time_until_next_run.seconds // 3600
-                minutes_left = (time_until_next_run.seconds % 3600) // 60
-                logger.debug(f"⏳ До следующего запуска: {hours_left} ч {minutes_left} мин")
-            return False
-            
+        logger.debug("👀 Источники не изменились")
+        return False
+    
+    def _poll_sources(self):
+        """Отпечатки источников перед запуском (None - опрос не удался)"""
+        try:
+            return dict(self.change_watcher.poll())
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка опроса источников: {e}")
+            return None
+    
+    def _accept_sources(self, document=None):
+        """Принять отпечатки после успешного запуска.
+        
+        Источники не опрашиваются заново: изменение, вышедшее во время
+        парсинга, иначе было бы принято без обработки. Берутся отпечатки,
+        снятые перед запуском, а для файлов, которые отправил сам парсер, -
+        SHA-256 отправленного содержимого (raw CDN отдает их с задержкой).
+        """
+        fingerprints = dict(self.run_fingerprints or {})
+        pushed_files = ((document or {}).get('github') or {}).get('pushed_files') or {}
+        if pushed_files:
+            github_manager = GitHubManager()
+            for path, sha256 in pushed_files.items():
+                url = github_manager.get_raw_file_url(path)
+                for name, watched_url in self.change_watcher.urls.items():
+                    if watched_url == url:
+                        fingerprints[name] = sha256
+        if not fingerprints:
+            logger.warning("⚠️ Нет отпечатков источников для этого запуска - состояние не изменено")
+            return
+        try:
+            self.change_watcher.accept(fingerprints)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось обновить отпечатки источников: {e}")
+    
     def run_parser(self):
-        """Запуск парсера с поддержкой модульной системы"""
+        """Запуск парсера с поддержкой модульной системы.
+        
+        Итог запуска и решения (следующий запуск, повтор с задержкой)
+        определяются по документу результата парсера, а без него - по коду
+        завершения процесса.
+        """
+        start_time = datetime.now()
         if not self.parser_script:
             logger.error("❌ Парсер не найден!")
-            return False
+            self.run_fingerprints = None
+            return self._finish_run(start_time, 'error')
+        
+        # Отпечатки источников до запуска (по изменениям они уже сняты опросом)
+        if self.change_watcher and self.run_fingerprints is None:
+            self.run_fingerprints = self._poll_sources()
+        try:
+            return self._run_parser_leased(start_time)
+        finally:
+            self.run_fingerprints = None
+    
+    def _run_parser_leased(self, start_time):
+        """Запуск под арендой (если она настроена)"""
+        if self.run_lease is None:
+            return self._execute_parser(start_time)
+        
+        if not self.run_lease.try_acquire():
+            return self._on_lease_busy(start_time)
+        try:
+            return self._execute_parser(start_time)
+        finally:
+            self.run_lease.release()
+    
+    def _on_lease_busy(self, start_time):
+        """Аренду держит другой запуск: ждать, взять его результат или пропустить"""
+        holder = self.run_lease.active() or {}
+        logger.warning(f"🔒 Парсер уже запущен: {self.run_lease.describe(holder)}")
+        
+        if self.lease_policy == 'wait':
+            logger.info("⏳ Ожидание завершения текущего запуска...")
+            if self.run_lease.acquire(self.lease_wait_seconds, cancel=self.stop_event):
+                # Источники могли измениться (и быть отправлены) за время ожидания
+                if self.change_watcher:
+                    self.run_fingerprints = self._poll_sources()
+                try:
+                    return self._execute_parser(datetime.now())
+                finally:
+                    self.run_lease.release()
+        elif self.lease_policy == 'piggyback':
+            logger.info("📎 Ожидание результата текущего запуска...")
+            if self.run_lease.wait_for_release(self.lease_wait_seconds, cancel=self.stop_event):
+                document = load_lease_result(holder, self.run_result_file)
+                if document is not None:
+                    logger.info(f"📎 Используем результат запуска {holder.get('owner')}")
+                    # Наш опрос был позже начала чужого запуска: принимаем только отправленные им файлы
+                    self.run_fingerprints = None
+                    return self._finish_run(start_time, self._run_outcome(document), document)
+                logger.warning("⚠️ Текущий запуск завершился без документа результата")
+        
+        # Запуск пропущен: попробуем снова через базовую задержку повтора, без учета неудачи
+        next_run = datetime.now() + timedelta(seconds=self.retry_base_seconds)
+        logger.info(f"⏭️ Запуск пропущен, следующая попытка: {next_run.strftime('%Y-%m-%d %H:%M:%S')}")
+        RUNS_TOTAL.inc(result='busy')
+        self.engine.reschedule('full_parse', next_run)
+        self._publish_metrics()
+        return False
+    
+    def _execute_parser(self, start_time):
+        """Запуск парсера выбранным способом (аренда уже получена)"""
+        if self.execution_mode == 'inprocess':
+            return self._run_parser_inprocess(start_time)
             
         logger.info(f"🚀 Запуск парсера: {self.parser_script}")
         
         try:
-            start_time = datetime.now()
             
             # Определяем команду запуска
             if self.parser_script.endswith('.sh'):
@@ -181,78 +472,238 @@ class DNSCryptScheduler:
                 # Python скрипт
                 cmd = [sys.executable, self.parser_script]
             
-            # Запускаем парсер
-            result = subprocess.run(
-                cmd,
-                cwd='/app',
-                capture_output=True,
-                text=True,
-                timeout=3600  # Таймаут 1 час
-            )
-            
-            duration = datetime.now() - start_time
+            # Мягкую остановку по SIGTERM обрабатывает только модульный парсер -
+            # остальные ждут полного таймаута
+            soft_timeout = None
+            if self.parser_script.endswith('parser_new.py'):
+                soft_timeout = self.soft_timeout_seconds
             
-            if result.returncode == 0:
-                logger.info(f"✅ Парсер завершен успешно за {duration}")
-                
-                # Анализируем вывод для получения статистики
-                self._analyze_parser_output(result.stdout)
-                
-                if self.debug_mode:
-                    logger.debug(f"📊 Полный вывод парсера:\n{result.stdout}")
-                else:
-                    # В обычном режиме показываем только последние строки
-                    stdout_lines = result.stdout.split('\n')
-                    if len(stdout_lines) > 10:
-                        logger.info("📊 Последние строки вывода парсера:")
-                        for line in stdout_lines[-10:]:
-                            if line.strip():
-                                logger.info(f"   {line}")
-                    else:
-                        logger.info(f"📊 Вывод парсера:\n{result.stdout}")
-                
-                # Сохраняем время успешного запуска
-                self.save_last_run_time(start_time)
-                
-                # Создаем краткий отчет о работе scheduler'а
-                self.create_scheduler_report(start_time, duration, True, result.stdout)
-                
-                return True
-            else:
-                logger.error(f"❌ Парсер завершился с ошибкой (код {result.returncode})")
-                logger.error(f"📝 Stderr: {result.stderr}")
-                if self.debug_mode:
-                    logger.error(f"📝 Stdout: {result.stdout}")
-                
-                # Создаем отчет об ошибке
-                self.create_scheduler_report(start_time, duration, False, result.stderr)
-                
-                return False
+            # Запускаем парсер: вывод идет в лог построчно
+            returncode, output_lines = self._run_subprocess(
+                cmd, timeout=self.soft_timeout_seconds + self.stop_grace_seconds, soft_timeout=soft_timeout
+            )
                 
+        except subprocess.TimeoutExpired as e:
+            logger.error(f"⏰ Парсер превысил время ожидания ({e.timeout / 60:.0f} мин) и остановлен принудительно")
+            return self._finish_run(start_time, 'timeout')
+        except Exception as e:
+            logger.error(f"❌ Ошибка запуска парсера: {e}")
+            return self._finish_run(start_time, 'error')
+        
+        document = self._load_run_result(start_time)
+        if document is not None:
+            outcome = self._run_outcome(document)
+        else:
+            logger.warning(f"⚠️ Документ результата запуска не найден: {self.run_result_file}")
+            outcome = 'success' if returncode == 0 else 'failed'
+        
+        if outcome != 'success':
+            logger.error(f"❌ Запуск парсера неуспешен: {outcome} (код {returncode})")
+            if document is None:
+                logger.error("📝 Последние строки вывода:")
+                for line in output_lines[-20:]:
+                    logger.error(f"   {line}")
+        
+        return self._finish_run(start_time, outcome, document, output_lines)
+    
+    def _run_subprocess(self, cmd, timeout, soft_timeout=None):
+        """Запуск процесса с построчной передачей вывода в лог.
+        
+        Вывод не копится целиком: в памяти остаются последние
+        output_buffer_lines строк (кольцевой буфер) для отчета.
+        Через soft_timeout секунд процесс получает SIGTERM, через timeout -
+        kill (TimeoutExpired). Возвращает (код завершения, строки буфера).
+        """
+        output_lines = deque(maxlen=self.output_buffer_lines)
+        env = dict(os.environ, PYTHONUNBUFFERED='1', PARSER_RUN_RESULT_FILE=self.run_result_file)
+        if self.run_lease is not None and self.run_lease.held:
+            # parser_new.py узнает аренду scheduler'а и не захватывает свою
+            env['PARSER_RUN_LEASE_TOKEN'] = self.run_lease.token
+        process = subprocess.Popen(
+            cmd,
+            cwd='/app',
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            env=env
+        )
+        
+        def forward_output():
+            for line in process.stdout:
+                line = line.rstrip('\n')
+                output_lines.append(line)
+                if line.strip():
+                    logger.info(f"   │ {line}")
+        
+        # Чтение в отдельном потоке, чтобы таймаут работал и при молчащем процессе
+        reader = threading.Thread(target=forward_output, name="parser-output", daemon=True)
+        reader.start()
+        self.active_process = process
+        try:
+            try:
+                returncode = process.wait(timeout=soft_timeout if soft_timeout is not None else timeout)
+            except subprocess.TimeoutExpired:
+                if soft_timeout is None or soft_timeout >= timeout:
+                    raise
+                logger.warning(f"🛑 Парсер работает {soft_timeout / 60:.0f} мин: мягкая остановка (SIGTERM), "
+                               f"принудительная - через {(timeout - soft_timeout) / 60:.0f} мин")
+                process.send_signal(signal.SIGTERM)
+                returncode = process.wait(timeout=timeout - soft_timeout)
         except subprocess.TimeoutExpired:
-            logger.error("⏰ Парсер превысил время ожидания (1 час)")
-            return False
+            process.kill()
+            process.wait()
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        finally:
+            self.active_process = None
+            reader.join(timeout=10)
+            process.stdout.close()
+        return returncode, list(output_lines)
+    
+    def _run_parser_inprocess(self, start_time):
+        """Запуск DNSCryptParser в процессе scheduler'а со структурированным результатом.
+        
+        Жесткого таймаута в этом режиме нет (убить парсер в том же процессе
+        нельзя): через soft_timeout парсер останавливается мягко.
+        """
+        logger.info("🚀 Запуск парсера в процессе scheduler'а (DNSCryptParser)")
+        
+        try:
+            from core import DNSCryptParser
+            
+            # Документ результата - туда же, где его ищет scheduler
+            os.environ['PARSER_RUN_RESULT_FILE'] = self.run_result_file
+            with DNSCryptParser() as parser:
+                self.active_parser = parser
+                soft_stop = threading.Timer(self.soft_timeout_seconds, self._soft_stop_inprocess)
+                soft_stop.daemon = True
+                soft_stop.start()
+                try:
+                    result = parser.run_full_parsing()
+                finally:
+                    soft_stop.cancel()
+                    self.active_parser = None
         except Exception as e:
             logger.error(f"❌ Ошибка запуска парсера: {e}")
-            return False
+            return self._finish_run(start_time, 'error')
+        
+        document = build_run_result(result)
+        outcome = self._run_outcome(document)
+        if outcome != 'success':
+            logger.error(f"❌ Парсер завершился с ошибкой: {document.get('error') or outcome}")
+        return self._finish_run(start_time, outcome, document)
+    
+    def _soft_stop_inprocess(self):
+        logger.warning(f"🛑 Парсер работает {self.soft_timeout_seconds / 60:.0f} мин: мягкая остановка")
+        self._request_parser_stop()
     
-    def _analyze_parser_output(self, output):
-        """Анализ вывода парсера для извлечения статистики"""
-        lines = output.split('\n')
-        stats = {}
-        
-        for line in lines:
-            # Ищем статистику в выводе
-            if 'обработано' in line.lower() or 'processed' in line.lower():
-                logger.info(f"📊 {line.strip()}")
-            elif 'успешно' in line.lower() or 'successful' in line.lower():
-                logger.info(f"✅ {line.strip()}")
-            elif 'github' in line.lower() and ('успешно' in line.lower() or 'success' in line.lower()):
-                logger.info(f"🚀 {line.strip()}")
-            elif 'время выполнения' in line.lower() or 'duration' in line.lower():
-                logger.info(f"⏱️ {line.strip()}")
+    def _load_run_result(self, start_time):
+        """Документ результата этого запуска (None - нет, поврежден или от прошлого запуска)"""
+        document = load_run_result(self.run_result_file)
+        if document is None or not document.get('started_at'):
+            return None
+        if datetime.fromisoformat(document['started_at']) < start_time:
+            logger.warning("⚠️ Документ результата остался от прошлого запуска")
+            return None
+        return document
+    
+    def _run_outcome(self, document):
+        """Итог запуска по документу: success, failed, cancelled или push_failed.
+        
+        Неудачная отправка обновлений в GitHub и остановленный запуск
+        (данные частичные) считаются неуспехом: иначе изменения ждали бы
+        полный интервал до следующего запуска.
+        """
+        if not document.get('success'):
+            return 'failed'
+        if document.get('cancelled'):
+            return 'cancelled'
+        if document['github'].get('reason') in ('push_failed', 'exception'):
+            return 'push_failed'
+        return 'success'
+    
+    def _finish_run(self, start_time, outcome, document=None, output_lines=None):
+        """Сохранение итога: время успеха или повтор с задержкой, метрики, отчет"""
+        duration = datetime.now() - start_time
+        success = outcome == 'success'
+        
+        if success:
+            logger.info(f"✅ Парсер завершен успешно за {duration}")
+            self.consecutive_failures = 0
+            self.save_last_run_time(start_time)
+            # Следующий срок по расписанию full_parse (если он уже прошел за время запуска - от текущего)
+            full_parse = self.engine.jobs['full_parse']
+            next_run = self.engine.schedule_next(full_parse, start_time)
+            if next_run <= datetime.now():
+                next_run = self.engine.schedule_next(full_parse, datetime.now())
+            if self.change_watcher:
+                self._accept_sources(document)
+        else:
+            self.consecutive_failures += 1
+            # Задержка удваивается с каждой неудачей подряд, но не больше интервала
+            delay = min(self.retry_base_seconds * 2 ** (self.consecutive_failures - 1), self.interval_seconds)
+            next_run = datetime.now() + timedelta(seconds=delay)
+            logger.warning(f"⚠️ Повтор после неудачи ({self.consecutive_failures} подряд): "
+                           f"{next_run.strftime('%Y-%m-%d %H:%M:%S')}")
+        
+        # Любой запуск (и по изменениям) переносит срок full_parse
+        self.schedule_table.update('full_parse', failures=self.consecutive_failures)
+        self.engine.reschedule('full_parse', next_run)
+        
+        if document is not None:
+            self._log_run_result(document)
+        
+        self._record_run_metrics(start_time, outcome, next_run)
+        self.create_scheduler_report(start_time, duration, outcome, next_run, document, output_lines)
+        return success
+    
+    def _summarize_run_result(self, document):
+        """Строки краткой статистики из документа результата"""
+        counts = document.get('counts', {})
+        diff = document.get('diff', {})
+        github = document.get('github', {})
+        
+        if github.get('success'):
+            github_status = f"✅ {(github.get('commit_sha') or '')[:7] or 'Успешно'}"
+        else:
+            github_status = github.get('reason') or 'не выполнялся'
+        
+        lines = [
+            f"Обработано серверов: {counts.get('successful', 0)}/{counts.get('total_processed', 0)}",
+            f"Процент успеха: {counts.get('success_rate', 0):.1f}%",
+            f"Входные файлы изменились: {'да' if diff.get('inputs_changed') else 'нет'}",
+            f"Обновлено строк: {diff.get('total_updated', 0)} "
+            f"(релеев {diff.get('relay_updated', 0)}, серверов {diff.get('server_updated', 0)})",
+            f"GitHub: {github_status}",
+            f"Время выполнения: {document.get('duration', 0):.1f}с"
+        ]
+        if document.get('error'):
+            lines.append(f"Ошибка: {document['error']}")
+        for phase, timing in document.get('phase_timings', {}).items():
+            lines.append(f"Этап {phase}: {timing.get('duration', 0):.1f}с")
+        return lines
+    
+    def _log_run_result(self, document):
+        """Вывод статистики документа результата в лог"""
+        for line in self._summarize_run_result(document):
+            logger.info(f"📊 {line}")
+    
+    def _record_run_metrics(self, start_time, result, next_run):
+        """Метрики запуска парсера и запись textfile"""
+        RUNS_TOTAL.inc(result=result)
+        RUN_SECONDS.observe((datetime.now() - start_time).total_seconds())
+        LAST_RUN_TIMESTAMP.set(start_time.timestamp())
+        if result == 'success':
+            LAST_SUCCESS_TIMESTAMP.set(start_time.timestamp())
+        NEXT_RUN_TIMESTAMP.set(next_run.timestamp())
+        self._publish_metrics()
+    
+    def _publish_metrics(self):
+        """Атомарная запись textfile для node-exporter"""
+        if self.metrics_textfile:
+            REGISTRY.write_textfile(self.metrics_textfile)
             
-    def create_scheduler_report(self, start_time, duration, success, output=None):
+    def create_scheduler_report(self, start_time, duration, outcome, next_run, document=None, output_lines=None):
         """Создание отчета о работе scheduler'а"""
         try:
             report_file = '/app/output/scheduler_report.txt'
@@ -262,36 +713,26 @@ class DNSCryptScheduler:
                 f.write(f"# Дата: {start_time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
                 f.write(f"Режим парсера: {self.parser_mode}\n")
                 f.write(f"Скрипт парсера: {self.parser_script}\n")
+                f.write(f"Режим выполнения: {self.execution_mode}\n")
                 f.write(f"Интервал обновления: {self.interval_days} дней\n")
                 f.write(f"Время запуска: {start_time.strftime('%Y-%m-%d %H:%M:%S')}\n")
                 f.write(f"Длительность: {duration}\n")
-                f.write(f"Статус: {'✅ Успешно' if success else '❌ Ошибка'}\n")
+                f.write(f"Статус: {'✅ Успешно' if outcome == 'success' else f'❌ Ошибка ({outcome})'}\n")
                 
-                if output:
-                    f.write(f"\nВывод парсера:\n")
-                    # Извлекаем важную информацию из вывода
-                    lines = output.split('\n')
-                    important_lines = []
-                    
-                    for line in lines:
-                        line_lower = line.lower()
-                        if any(keyword in line_lower for keyword in [
-                            'успешно', 'ошибка', 'обработано', 'github', 
-                            'время выполнения', 'файлов обновлено', 
-                            'парсер завершен', 'модульн', 'legacy'
-                        ]):
-                            important_lines.append(line)
-                    
-                    if important_lines:
-                        f.write('\n'.join(important_lines))
-                    else:
-                        # Если важные строки не найдены, показываем последние 20 строк
-                        f.write('\n'.join(lines[-20:]))
+                if document is not None:
+                    f.write(f"\nРезультат парсера:\n")
+                    f.write('\n'.join(self._summarize_run_result(document)))
+                elif output_lines:
+                    # Документа результата нет - последние строки вывода
+                    f.write(f"\nВывод парсера (последние строки):\n")
+                    f.write('\n'.join(output_lines[-20:]))
                 
                 # Информация о следующем запуске
-                if success:
-                    next_run = start_time + timedelta(days=self.interval_days)
+                if outcome == 'success':
                     f.write(f"\n\nСледующий запуск: {next_run.strftime('%Y-%m-%d %H:%M:%S')}\n")
+                else:
+                    f.write(f"\n\nПовтор ({self.consecutive_failures}-я неудача подряд): "
+                            f"{next_run.strftime('%Y-%m-%d %H:%M:%S')}\n")
                     
         except Exception as e:
             logger.error(f"❌ Ошибка создания отчета scheduler'а: {e}")
@@ -310,75 +751,40 @@ class DNSCryptScheduler:
         
         if last_run:
             time_since_last = now - last_run
-            time_until_next = timedelta(seconds=self.interval_seconds) - time_since_last
-            
+            LAST_SUCCESS_TIMESTAMP.set(last_run.timestamp())
             logger.info(f"🔄 Последний запуск: {last_run.strftime('%Y-%m-%d %H:%M:%S')}")
             logger.info(f"⏱️ Прошло времени: {time_since_last.days} дней {time_since_last.seconds // 3600} часов")
-            
-            if time_until_next.total_seconds() > 0:
-                if time_until_next.days > 0:
-                    logger.info(f"⏳ До следующего запуска: {time_until_next.days} дней {time_until_next.seconds // 3600} часов")
-                else:
-                    hours = time_until_next.seconds // 3600
-                    minutes = (time_until_next.seconds % 3600) // 60
-                    logger.info(f"⏳ До следующего запуска: {hours} ч {minutes} мин")
-            else:
-                logger.info("🔥 Время для запуска парсера!")
         else:
             logger.info("🔥 Парсер еще не запускался - будет запущен немедленно")
-            
-        logger.info(f"📅 Интервал: каждые {self.interval_days} дней")
+        
+        if self.consecutive_failures:
+            logger.info(f"🔁 Неудачных запусков подряд: {self.consecutive_failures}")
+        
+        logger.info("🗓️ Задачи:")
+        for job in self.jobs:
+            next_run = self.schedule_table.get_time(job.name, 'next_run')
+            last_job_run = self.schedule_table.get_time(job.name, 'last_run')
+            logger.info(f"   {job.name} ({job.schedule}): следующий "
+                        f"{next_run.strftime('%Y-%m-%d %H:%M:%S') if next_run else '-'}, последний "
+                        f"{last_job_run.strftime('%Y-%m-%d %H:%M:%S') if last_job_run else '-'}")
+        
+        full_parse_next = self.schedule_table.get_time('full_parse', 'next_run')
+        if full_parse_next:
+            NEXT_RUN_TIMESTAMP.set(full_parse_next.timestamp())
         logger.info("=" * 60)
+        self._publish_metrics()
         
     def run(self):
-        """Основной цикл scheduler'а"""
+        """Основной цикл scheduler'а: ожидание ближайшей задачи до срока"""
         logger.info("🔄 Запуск основного цикла scheduler'а v2.0")
         
         # Показываем статус при запуске
         self.log_status()
         
-        # Проверяем, нужно ли запустить парсер сразу
-        if self.should_run_parser():
-            success = self.run_parser()
-            if success:
-                logger.info(f"😴 Следующий запуск через {self.interval_days} дней")
-            else:
-                logger.warning("⚠️ Парсер завершился с ошибкой, попробуем снова через час")
-        
-        # Основной цикл
-        check_interval = 3600  # Проверяем каждый час
-        status_interval = 6 * 3600  # Показываем статус каждые 6 часов
-        last_status_time = time.time()
-        
-        while self.is_running:
-            try:
-                current_time = time.time()
-                
-                # Показываем статус каждые 6 часов
-                if current_time - last_status_time >= status_interval:
-                    self.log_status()
-                    last_status_time = current_time
-                
-                # Проверяем, нужно ли запускать парсер
-                if self.should_run_parser():
-                    success = self.run_parser()
-                    if success:
-                        logger.info(f"😴 Следующий запуск через {self.interval_days} дней")
-                    else:
-                        logger.warning("⚠️ Парсер завершился с ошибкой, попробуем снова через час")
-                
-                # Ждем перед следующей проверкой
-                if self.debug_mode:
-                    logger.debug(f"😴 Ожидание {check_interval} секунд до следующей проверки...")
-                
-                time.sleep(check_interval)
-                
-            except KeyboardInterrupt:
-                logger.info("⌨️ Получен сигнал прерывания")
-                break
-            except Exception as e:
-                logger.error(f"❌ Ошибка в основном цикле: {e}")
-                time.sleep(60)  # Ждем минуту при ошибке
+        try:
+            self.engine.run()
+        except KeyboardInterrupt:
+            logger.info("⌨️ Получен сигнал прерывания")
                 
         logger.info("🛑 Scheduler v2.0 завершен")
 
@@ -3,7 +3,9 @@
 """
 
 from .error_recovery import SmartErrorRecovery
+from .rate_governor import RateGovernor
 
 __all__ = [
-    'SmartErrorRecovery'
+    'SmartErrorRecovery',
+    'RateGovernor'
 ]
\ No newline at end of file
@@ -11,26 +11,52 @@ from typing import Dict, List, Callable, Optional
 # Используем относительный импорт для лучшей совместимости
 try:
     from ..core.config import ParserConfig
+    from .rate_governor import RateGovernor
+    from ..utils.metrics import REGISTRY
 except ImportError:
     # Fallback для случаев когда относительный импорт не работает
     import sys
     from pathlib import Path
     sys.path.append(str(Path(__file__).parent.parent))
     from core.config import ParserConfig
+    from strategies.rate_governor import RateGovernor
+    from utils.metrics import REGISTRY
+
+ERRORS_TOTAL = REGISTRY.counter(
+    'dnscrypt_parser_errors_total', 'Ошибки, переданные в восстановление, по типу', ('type',)
+)
+RECOVERIES_TOTAL = REGISTRY.counter(
+    'dnscrypt_parser_recoveries_total', 'Попытки восстановления по стратегии и результату', ('strategy', 'result')
+)
+
+# Признаки типов ошибок в тексте ошибки или страницы
+ERROR_PATTERNS = {
+    'cloudflare_protection': ['cloudflare', 'checking your browser', 'security check'],
+    'rate_limiting': ['too many requests', 'rate limit', 'slow down'],
+    'page_not_loaded': ['no data available', 'loading', 'please wait'],
+    'network_error': ['network error', 'connection timeout', 'failed to load'],
+    'javascript_error': ['script error', 'uncaught', 'undefined is not a function']
+}
+
+def classify_error_text(error_text: str) -> str:
+    """Классификация текста ошибки по ERROR_PATTERNS"""
+    error_text = error_text.lower()
+    for error_type, patterns in ERROR_PATTERNS.items():
+        if any(pattern in error_text for pattern in patterns):
+            return error_type
+    return 'unknown'
 
 class SmartErrorRecovery:
     """Система умного восстановления после ошибок"""
     
-    def __init__(self, driver: webdriver.Chrome, config: ParserConfig):
+    def __init__(self, driver: webdriver.Chrome, config: ParserConfig,
+                 rate_governor: Optional[RateGovernor] = None):
         self.driver = driver
         self.config = config
-        self.error_patterns = {
-            'cloudflare_protection': ['cloudflare', 'checking your browser', 'security check'],
-            'rate_limiting': ['too many requests', 'rate limit', 'slow down'],
-            'page_not_loaded': ['no data available', 'loading', 'please wait'],
-            'network_error': ['network error', 'connection timeout', 'failed to load'],
-            'javascript_error': ['script error', 'uncaught', 'undefined is not a function']
-        }
+        self.error_patterns = dict(ERROR_PATTERNS)
+        
+        # Паузы при блокировках задает общий регулятор скорости
+        self.rate_governor = rate_governor or RateGovernor.from_config(config)
         
         self.recovery_stats = {
             'total_errors': 0,
@@ -45,6 +71,7 @@ class SmartErrorRecovery:
         
         error_text = str(error).lower()
         error_type = self._classify_error(error_text)
+        ERRORS_TOTAL.inc(type=error_type)
         
         print(f"🛠️ Обнаружена ошибка типа '{error_type}': {error}")
         
@@ -58,9 +85,11 @@ class SmartErrorRecovery:
         }
         
         strategy = recovery_strategies.get(error_type, recovery_strategies['unknown'])
+        strategy_name = strategy.__name__.replace('_handle_', '', 1)
         
         try:
             success = strategy(context, error_text)
+            RECOVERIES_TOTAL.inc(strategy=strategy_name, result='success' if success else 'failed')
             
             if success:
                 self.recovery_stats['successful_recoveries'] += 1
@@ -74,6 +103,7 @@ class SmartErrorRecovery:
             
         except Exception as recovery_error:
             print(f"❌ Ошибка во время восстановления: {recovery_error}")
+            RECOVERIES_TOTAL.inc(strategy=strategy_name, result='error')
             self.recovery_stats['failed_recoveries'] += 1
             return False
     
@@ -89,17 +119,19 @@ class SmartErrorRecovery:
         print("🛡️ Обнаружена Cloudflare защита...")
         
         try:
-            wait_time = random.uniform(15, 30)
-            print(f"⏳ Ожидание {wait_time:.1f}с для прохождения проверки...")
-            time.sleep(wait_time)
+            self.rate_governor.on_throttle('cloudflare_protection')
+            print("⏳ Ожидание прохождения проверки...")
+            self.rate_governor.wait_cooldown()
             
             if self._check_page_accessibility():
                 print("✅ Cloudflare проверка пройдена")
                 return True
             
+            # Повторный сигнал удваивает паузу регулятора
+            self.rate_governor.on_throttle('cloudflare_protection')
+            self.rate_governor.wait_cooldown()
             print("🔄 Обновление страницы...")
             self.driver.refresh()
-            time.sleep(random.uniform(10, 20))
             
             return self._check_page_accessibility()
             
@@ -112,9 +144,9 @@ class SmartErrorRecovery:
         print("⏳ Обнаружено ограничение скорости...")
         
         try:
-            wait_time = random.uniform(30, 90)
-            print(f"⏳ Пауза {wait_time:.1f}с для снятия ограничений...")
-            time.sleep(wait_time)
+            cooldown = self.rate_governor.on_throttle('rate_limiting')
+            print(f"⏳ Пауза {cooldown:.1f}с для снятия ограничений...")
+            self.rate_governor.wait_cooldown()
             
             return self._check_page_accessibility()
             
@@ -0,0 +1,181 @@
+"""
+Глобальный регулятор скорости запросов: token bucket с AIMD политикой
+"""
+import time
+import random
+import threading
+from typing import Any, Dict, List, Tuple
+
+# Используем относительный импорт для лучшей совместимости
+try:
+    from ..utils.metrics import REGISTRY
+except ImportError:
+    # Fallback для случаев когда относительный импорт не работает
+    import sys
+    from pathlib import Path
+    sys.path.append(str(Path(__file__).parent.parent))
+    from utils.metrics import REGISTRY
+
+# Сигналы, при которых скорость резко снижается
+THROTTLE_SIGNALS = ('rate_limiting', 'cloudflare_protection')
+
+RATE_CURRENT = REGISTRY.gauge(
+    'dnscrypt_parser_rate_current', 'Текущая разрешенная скорость запросов к сайту, запросов в секунду'
+)
+RATE_COOLDOWN_UNTIL = REGISTRY.gauge(
+    'dnscrypt_parser_rate_cooldown_until_timestamp_seconds', 'Окончание паузы после сигнала блокировки (unix)'
+)
+RATE_CONSECUTIVE_BLOCKS = REGISTRY.gauge(
+    'dnscrypt_parser_rate_consecutive_blocks', 'Сигналы блокировки подряд (0 - пауза не удлиняется)'
+)
+
+
+class RateGovernor:
+    """Token bucket, общий для всех путей извлечения.
+
+    Скорость растет на additive_step после каждого чистого ответа и
+    умножается на decrease_factor при сигнале блокировки/ограничения,
+    после которого действует пауза, удваивающаяся при повторных сигналах.
+    """
+
+    def __init__(self, initial_rate: float = 0.8, min_rate: float = 0.05, max_rate: float = 3.0,
+                 additive_step: float = 0.05, decrease_factor: float = 0.5, burst: float = 1.0,
+                 block_cooldown: float = 15.0, max_cooldown: float = 120.0, jitter: float = 0.3):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = min(max(initial_rate, min_rate), max_rate)
+        self.additive_step = additive_step
+        self.decrease_factor = decrease_factor
+        self.burst = burst
+        self.block_cooldown = block_cooldown
+        self.max_cooldown = max_cooldown
+        self.jitter = jitter
+
+        self._lock = threading.Lock()
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._consecutive_blocks = 0
+
+        self.stats = {
+            'acquired': 0,
+            'total_wait': 0.0,
+            'increases': 0,
+            'decreases': 0,
+            'signals': {}
+        }
+        self.min_seen_rate = self.rate
+        self.max_seen_rate = self.rate
+        # История изменений скорости: (время, скорость)
+        self.rate_history: List[Tuple[float, float]] = [(time.time(), self.rate)]
+        RATE_CURRENT.set(self.rate)
+        RATE_CONSECUTIVE_BLOCKS.set(0)
+
+    @classmethod
+    def from_config(cls, config) -> 'RateGovernor':
+        return cls(
+            initial_rate=config.RATE_INITIAL,
+            min_rate=config.RATE_MIN,
+            max_rate=config.RATE_MAX,
+            additive_step=config.RATE_INCREASE_STEP,
+            decrease_factor=config.RATE_DECREASE_FACTOR,
+            block_cooldown=config.RATE_BLOCK_COOLDOWN,
+            max_cooldown=config.RATE_MAX_COOLDOWN
+        )
+
+    @property
+    def current_rate(self) -> float:
+        """Текущая разрешенная скорость, запросов в секунду"""
+        return self.rate
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Резервирование токенов без ожидания: через сколько секунд можно начинать"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= tokens
+
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            if self.jitter:
+                # Неравномерные интервалы выглядят естественнее
+                delay += random.uniform(0, self.jitter / self.rate)
+            delay = max(delay, self._blocked_until - now)
+
+            self.stats['acquired'] += 1
+            self.stats['total_wait'] += delay
+            return delay
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Ожидание разрешения на запрос, возвращает время ожидания"""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def on_success(self):
+        """Чистый ответ: аддитивное увеличение скорости"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._consecutive_blocks:
+                self._consecutive_blocks = 0
+                RATE_CONSECUTIVE_BLOCKS.set(0)
+            if self.rate < self.max_rate:
+                self._set_rate(min(self.max_rate, self.rate + self.additive_step))
+                self.stats['increases'] += 1
+
+    def on_throttle(self, signal: str = 'rate_limiting') -> float:
+        """Сигнал блокировки: мультипликативное снижение и пауза, возвращает паузу"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._consecutive_blocks += 1
+            self._set_rate(max(self.min_rate, self.rate * self.decrease_factor))
+            self.stats['decreases'] += 1
+            self.stats['signals'][signal] = self.stats['signals'].get(signal, 0) + 1
+
+            cooldown = min(self.max_cooldown, self.block_cooldown * 2 ** (self._consecutive_blocks - 1))
+            self._blocked_until = max(self._blocked_until, now + cooldown)
+            RATE_COOLDOWN_UNTIL.set(time.time() + self._blocked_until - now)
+            RATE_CONSECUTIVE_BLOCKS.set(self._consecutive_blocks)
+            # Накопленный запас токенов после блокировки не используется
+            self._tokens = min(self._tokens, 0.0)
+
+        print(f"🐢 Сигнал '{signal}': скорость снижена до {self.rate:.2f} запр/с, пауза {cooldown:.0f}с")
+        return cooldown
+
+    def wait_cooldown(self) -> float:
+        """Ожидание окончания паузы после блокировки"""
+        with self._lock:
+            remaining = self._blocked_until - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+            return remaining
+        return 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика для метрик сессии"""
+        with self._lock:
+            return {
+                'current_rate': self.rate,
+                'min_rate': self.min_seen_rate,
+                'max_rate': self.max_seen_rate,
+                'acquired': self.stats['acquired'],
+                'total_wait': self.stats['total_wait'],
+                'increases': self.stats['increases'],
+                'decreases': self.stats['decreases'],
+                'signals': dict(self.stats['signals'])
+            }
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+
+    def _set_rate(self, rate: float):
+        self.rate = rate
+        RATE_CURRENT.set(rate)
+        self.min_seen_rate = min(self.min_seen_rate, rate)
+        self.max_seen_rate = max(self.max_seen_rate, rate)
+        self.rate_history.append((time.time(), rate))
+        if len(self.rate_history) > 1000:
+            del self.rate_history[:500]
@@ -0,0 +1,10 @@
+"""
+Общие настройки тестов: корень репозитория в sys.path
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Пакеты модульной системы импортируются через core, как в parser_new.py
+import core  # noqa: E402,F401
@@ -0,0 +1,47 @@
+"""
+Модель конфигурационного файла: правки строк без лишних байтов и права опубликованных файлов
+"""
+import os
+import stat
+
+from file_handlers.config_document import ConfigDocument, write_text_atomic
+
+
+def file_mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_write_keeps_mode_of_replaced_file(tmp_path):
+    path = tmp_path / "DNSCrypt_servers.txt"
+    path.write_text("old\n")
+    os.chmod(path, 0o644)
+
+    assert write_text_atomic(str(path), "new\n")
+    assert path.read_text() == "new\n"
+    assert file_mode(path) == 0o644
+
+
+def test_new_file_gets_umask_mode(tmp_path):
+    umask = os.umask(0o022)
+    try:
+        path = tmp_path / "DNSCrypt_servers.txt.original_backup"
+        assert write_text_atomic(str(path), "backup\n")
+    finally:
+        os.umask(umask)
+    assert file_mode(path) == 0o644
+
+
+def test_set_line_keeps_missing_final_newline(tmp_path):
+    text = "[Germany]\r\nserver-a 1.1.1.1\r\nserver-b 2.2.2.2"
+    document = ConfigDocument(text)
+
+    assert document.set_line('server-b', 'server-b 3.3.3.3') == 1
+    assert document.set_line('server-a', 'server-a 1.1.1.1') == 1
+    assert document.to_text() == "[Germany]\r\nserver-a 1.1.1.1\r\nserver-b 3.3.3.3"
+
+    path = tmp_path / "DNSCrypt_servers.txt"
+    path.write_bytes(text.encode())
+    document = ConfigDocument.load(str(path))
+    document.set_line('server-b', 'server-b 2.2.2.2')
+    assert not document.modified
+    assert not document.save(str(path))
@@ -0,0 +1,48 @@
+"""
+Кэш условных загрузок: хранилище не растет при смене содержимого источника
+"""
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from file_handlers.download_cache import ConditionalDownloader
+
+
+@pytest.fixture
+def source():
+    state = {'body': b'version 1\n'}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(state['body'])))
+            self.end_headers()
+            self.wfile.write(state['body'])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield state, f"http://127.0.0.1:{server.server_port}/relays.md"
+    server.shutdown()
+    server.server_close()
+
+
+def test_unreferenced_objects_are_pruned(tmp_path, source):
+    state, url = source
+    downloader = ConditionalDownloader(str(tmp_path))
+
+    first = downloader.fetch_all({'relays.md': url})['relays.md']
+    for number in range(2, 5):
+        state['body'] = f"version {number}\n".encode()
+        result = downloader.fetch_all({'relays.md': url})['relays.md']
+        assert result.changed
+
+    assert os.listdir(downloader.objects_dir) == [result.sha256]
+    assert not os.path.exists(first.path)
+    with open(result.path, 'rb') as f:
+        assert f.read() == b'version 4\n'
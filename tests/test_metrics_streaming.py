@@ -0,0 +1,51 @@
+"""
+Метрики серверов пишутся в базу (без базы - в CSV) по мере извлечения, а не копятся в сессии
+"""
+import dataclasses
+
+from utils import metrics as metrics_module
+from utils.metrics import ParsingMetrics, SessionMetrics
+
+
+def _record(metrics, count):
+    for i in range(count):
+        metrics.record_server_extraction(
+            f"server-{i}", success=i % 3 != 0, duration=0.1 * (i + 1),
+            error_type=None if i % 3 else 'timeout', extraction_method='dialog'
+        )
+
+
+def test_rows_are_streamed_to_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics_module, 'METRICS_FLUSH_ROWS', 4)
+    metrics = ParsingMetrics(output_dir=str(tmp_path))
+    session_id = metrics.start_session('s1')
+    _record(metrics, 10)
+
+    assert 'server_metrics' not in {f.name for f in dataclasses.fields(SessionMetrics)}
+    assert len(metrics._pending_rows) < 4
+    assert len(list(metrics.store.iter_server_metrics(session_id))) == 8
+
+    session = metrics.end_session()
+    assert session.total_servers == 10
+    assert len(list(metrics.store.iter_server_metrics(session_id))) == 10
+    assert sum(r['attempts'] for r in metrics.store.daily_rollups(days=1)) == 10
+    assert metrics.store.failed_servers(session_id) == [
+        ('server-0', 'timeout'), ('server-3', 'timeout'), ('server-6', 'timeout'), ('server-9', 'timeout')
+    ]
+
+    report = metrics.generate_detailed_report()
+    assert 'ПРОБЛЕМНЫЕ СЕРВЕРЫ (4)' in report
+    assert 'server-9: timeout' in report
+
+
+def test_rows_go_to_session_csv_without_store(tmp_path):
+    metrics = ParsingMetrics(output_dir=str(tmp_path))
+    metrics.store = None
+    metrics.start_session('s2')
+    _record(metrics, 5)
+    metrics.end_session()
+
+    assert (tmp_path / 'server_metrics_s2.csv').exists()
+    rows = list(metrics._iter_metric_rows())
+    assert [row[1] for row in rows] == [f"server-{i}" for i in range(5)]
+    assert metrics._failed_servers('s2', 10) == [('server-0', 'timeout'), ('server-3', 'timeout')]
@@ -0,0 +1,66 @@
+"""
+Сопоставление строк таблицы с целевыми серверами: неточные совпадения не подменяют сервер
+"""
+import pytest
+
+from data_handlers.row_matcher import RowMatchIndex, is_sibling_name
+
+# Имена соседних серверов: отличаются на 1-2 правки, но это разные серверы
+SIBLING_PAIRS = [
+    ('dnscrypt.uk-ipv4', 'dnscrypt.uk-ipv6'),
+    ('dnscrypt.ca-1', 'dnscrypt.ca-2'),
+    ('ahadns-doh-nl', 'ahadns-doh-la'),
+    ('dnscry.pt-ip6-filter-pri', 'dnscry.pt-ip4-filter-pri'),
+]
+
+
+def build_index(names, **kwargs):
+    index = RowMatchIndex(**kwargs)
+    for name in names:
+        index.add(name, f"row:{name}")
+    return index
+
+
+@pytest.mark.parametrize('query, table_name', SIBLING_PAIRS)
+def test_sibling_names_are_not_matched(query, table_name):
+    assert is_sibling_name(query, table_name)
+    index = build_index([table_name], max_distance=2)
+    row, match_type, _ = index.lookup(query)
+    assert row is None
+    assert match_type == 'not_found'
+    assert index.rejected_matches[0]['matched'] == table_name
+
+
+@pytest.mark.parametrize('query, table_name', [
+    ('cloudflare-security', 'cloudflare'),
+    ('adguard-dns-family', 'adguard-dns'),
+])
+def test_longer_query_does_not_match_shorter_server(query, table_name):
+    index = build_index([table_name], max_distance=2)
+    assert index.find(query) is None
+
+
+def test_unambiguous_longer_table_name_matches_by_prefix():
+    index = build_index(['scaleway-fr-ipv4', 'cloudflare'])
+    assert index.lookup('scaleway-fr') == ('row:scaleway-fr-ipv4', 'prefix', 'scaleway-fr-ipv4')
+
+
+def test_prefix_is_rejected_when_ambiguous_or_another_target():
+    index = build_index(['scaleway-fr-ipv4', 'scaleway-fr-ipv6'])
+    assert index.find('scaleway-fr') is None
+
+    index = build_index(['scaleway-fr-ipv4'], known_names=['scaleway-fr', 'scaleway-fr-ipv4'])
+    assert index.find('scaleway-fr') is None
+
+
+def test_fuzzy_is_disabled_by_default():
+    index = build_index(['cloudflare'])
+    assert index.find('cloudfare') is None
+
+
+def test_fuzzy_matches_typo_but_not_another_target():
+    index = build_index(['cloudflare'], max_distance=2)
+    assert index.lookup('cloudfare') == ('row:cloudflare', 'fuzzy', 'cloudflare')
+
+    index = build_index(['cloudflare'], max_distance=2, known_names=['cloudfare', 'cloudflare'])
+    assert index.find('cloudfare') is None
@@ -0,0 +1,105 @@
+"""
+Отслеживание изменений источников между запусками: списки резолверов, файлы конфигурации, данные сайта
+"""
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Используем относительный импорт для лучшей совместимости
+try:
+    from ..file_handlers.download_cache import ConditionalDownloader
+except ImportError:
+    # Fallback для случаев когда относительный импорт не работает
+    import sys
+    from pathlib import Path
+    sys.path.append(str(Path(__file__).parent.parent))
+    from file_handlers.download_cache import ConditionalDownloader
+
+STATE_FILE = "state.json"
+
+# Источники по умолчанию (кроме файлов конфигурации в GitHub - их адреса задает scheduler)
+DEFAULT_WATCH_URLS = {
+    # Данные, из которых строится таблица dnscrypt.info/public-servers
+    'public-resolvers.json': 'https://download.dnscrypt.info/dnscrypt-resolvers/json/public-resolvers.json',
+    'relays.md': 'https://download.dnscrypt.info/resolvers-list/v3/relays.md'
+}
+
+
+def parse_watch_urls(value: str) -> Dict[str, str]:
+    """'имя=url,имя=url' -> {имя: url} (без имени - имя берется из url)"""
+    urls = {}
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, separator, url = item.partition('=')
+        if not separator or '://' in name:
+            url = item
+            name = url.rstrip('/').rsplit('/', 1)[-1]
+        urls[name.strip()] = url.strip()
+    return urls
+
+
+class ChangeWatcher:
+    """Дешевый опрос источников: условные запросы (ETag/Last-Modified) и SHA-256 содержимого.
+
+    Отпечаток источника - SHA-256 последнего содержимого; ответ 304 стоит
+    один запрос без тела. Изменением считается расхождение с принятыми
+    отпечатками (state.json), которые обновляет accept() после запуска.
+    Принимаются отпечатки, снятые до запуска (изменение, вышедшее во время
+    парсинга, вызовет следующий запуск), а для файлов, которые отправил
+    сам парсер, - SHA-256 отправленного содержимого: raw CDN GitHub
+    несколько минут отдает версию до коммита.
+    """
+
+    def __init__(self, urls: Dict[str, str], state_dir: str = "./output/change_watch"):
+        self.urls = urls
+        self.state_dir = state_dir
+        self.state_file = os.path.join(state_dir, STATE_FILE)
+        self.downloader = ConditionalDownloader(state_dir)
+        self.state = self._load_state()
+        self.last_poll: Dict[str, Optional[str]] = {}
+
+    def poll(self) -> Dict[str, Optional[str]]:
+        """Текущие отпечатки {имя: sha256}; None - источник недоступен"""
+        results = self.downloader.fetch_all(self.urls)
+        self.last_poll = {name: result.sha256 if result.ok else None for name, result in results.items()}
+        return self.last_poll
+
+    def changed(self) -> List[str]:
+        """Источники, отпечаток которых отличается от принятого.
+
+        Недоступный источник изменением не считается: при сбое сети
+        остается запуск по фиксированному интервалу.
+        """
+        fingerprints = self.poll()
+        accepted = self.state.get('fingerprints', {})
+        return [name for name, sha256 in fingerprints.items()
+                if sha256 is not None and sha256 != accepted.get(name)]
+
+    def accept(self, fingerprints: Optional[Dict[str, Optional[str]]] = None):
+        """Принять отпечатки (по умолчанию - последнего опроса) как состояние после запуска"""
+        if fingerprints is None:
+            fingerprints = self.last_poll
+        accepted = self.state.setdefault('fingerprints', {})
+        accepted.update({name: sha256 for name, sha256 in fingerprints.items() if sha256 is not None})
+        self.state['accepted_at'] = datetime.now().isoformat()
+        self._save_state()
+
+    def _load_state(self) -> Dict:
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        """Атомарная запись принятых отпечатков"""
+        temp_file = self.state_file + ".tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, indent=2, ensure_ascii=False)
+            os.replace(temp_file, self.state_file)
+        except OSError as e:
+            print(f"⚠️ Не удалось сохранить состояние отслеживания изменений: {e}")
@@ -0,0 +1,142 @@
+"""
+Колоночный экспорт метрик серверов: один файл array на столбец, строки - словарями
+"""
+import os
+import sys
+import json
+import array
+import tempfile
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Используем относительный импорт для лучшей совместимости
+try:
+    from ..file_handlers.config_document import copy_target_mode
+except ImportError:
+    # Fallback для случаев когда относительный импорт не работает
+    from pathlib import Path
+    sys.path.append(str(Path(__file__).parent.parent))
+    from file_handlers.config_document import copy_target_mode
+
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+
+# Столбец -> код типа array (строковые столбцы хранятся номерами в словаре)
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ('session', 'I'),
+    ('server', 'I'),
+    ('success', 'B'),
+    ('duration', 'd'),
+    ('attempts', 'H'),
+    ('error', 'I'),
+    ('method', 'I'),
+    ('ts', 'd'),
+)
+DICTIONARY_COLUMNS = ('session', 'server', 'error', 'method')
+
+
+class ColumnarMetricsWriter:
+    """Дозапись строк метрик (формат MetricsStore.iter_server_metrics) в столбцы.
+
+    meta.json пишется атомарно последним: строки после meta['count'],
+    оставшиеся от прерванной записи, отбрасываются при следующей дозаписи
+    и не видны load_columns.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.meta = self._load_meta()
+        self._codes = {
+            name: {value: code for code, value in enumerate(values)}
+            for name, values in self.meta['dictionaries'].items()
+        }
+
+    def _load_meta(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.directory, META_FILE), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('version') == FORMAT_VERSION and meta.get('byteorder') == sys.byteorder:
+                return meta
+            print(f"⚠️ Колоночный экспорт {self.directory} в другом формате, начинается заново")
+        except (OSError, ValueError):
+            pass
+        return {
+            'version': FORMAT_VERSION,
+            'byteorder': sys.byteorder,
+            'count': 0,
+            'columns': {name: typecode for name, typecode in COLUMNS},
+            # Код 0 - пустое значение
+            'dictionaries': {name: [''] for name in DICTIONARY_COLUMNS}
+        }
+
+    def _encode(self, column: str, value) -> int:
+        value = value or ''
+        codes = self._codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+            self.meta['dictionaries'][column].append(value)
+        return code
+
+    def append(self, rows: Iterable[Tuple]) -> int:
+        """Дозапись строк (session_id, server_name, success, duration,
+        attempt_count, error_type, extraction_method, ts), возвращает их число"""
+        columns = {name: array.array(typecode) for name, typecode in COLUMNS}
+        for session_id, server_name, success, duration, attempts, error_type, method, ts in rows:
+            columns['session'].append(self._encode('session', session_id))
+            columns['server'].append(self._encode('server', server_name))
+            columns['success'].append(1 if success else 0)
+            columns['duration'].append(float(duration or 0.0))
+            columns['attempts'].append(min(max(int(attempts or 0), 0), 0xFFFF))
+            columns['error'].append(self._encode('error', error_type))
+            columns['method'].append(self._encode('method', method))
+            columns['ts'].append(float(ts))
+
+        added = len(columns['ts'])
+        if not added:
+            return 0
+
+        count = self.meta['count']
+        for name, values in columns.items():
+            path = os.path.join(self.directory, f"{name}.bin")
+            with open(path, 'ab') as f:
+                f.truncate(count * values.itemsize)
+                values.tofile(f)
+
+        self.meta['count'] = count + added
+        self._save_meta()
+        return added
+
+    def _save_meta(self):
+        fd, temp_path = tempfile.mkstemp(prefix=".meta.", suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.meta, f, ensure_ascii=False)
+            copy_target_mode(temp_path, os.path.join(self.directory, META_FILE))
+            os.replace(temp_path, os.path.join(self.directory, META_FILE))
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+
+def load_columns(directory: str) -> Tuple[Dict[str, array.array], Dict[str, List[str]]]:
+    """Столбцы экспорта и словари строковых столбцов.
+
+    Значение строки: dictionaries['server'][columns['server'][i]].
+    """
+    with open(os.path.join(directory, META_FILE), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+
+    count = meta['count']
+    columns = {}
+    for name, typecode in meta['columns'].items():
+        values = array.array(typecode)
+        with open(os.path.join(directory, f"{name}.bin"), 'rb') as f:
+            values.fromfile(f, count)
+        if meta['byteorder'] != sys.byteorder:
+            values.byteswap()
+        columns[name] = values
+    return columns, meta['dictionaries']
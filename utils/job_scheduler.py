@@ -0,0 +1,262 @@
+"""
+Планировщик именованных задач: cron-выражения, jitter, ожидание до срока и таблица следующих запусков
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Версия формата таблицы запусков
+TABLE_VERSION = 1
+
+# Максимальное ожидание за один раз: срок пересчитывается и после перевода часов
+MAX_WAIT_SECONDS = 3600
+
+CRON_ALIASES = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *'
+}
+
+MONTH_NAMES = {name: number for number, name in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), start=1)}
+DAY_NAMES = {name: number for number, name in enumerate(('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'))}
+
+# Поля cron: (минимум, максимум, имена)
+CRON_FIELDS = (
+    (0, 59, {}),            # минута
+    (0, 23, {}),            # час
+    (1, 31, {}),            # день месяца
+    (1, 12, MONTH_NAMES),   # месяц
+    (0, 7, DAY_NAMES)       # день недели (0 и 7 - воскресенье)
+)
+
+
+class CronExpression:
+    """Cron-выражение из пяти полей: минута, час, день месяца, месяц, день недели.
+
+    Поддерживаются '*', списки, диапазоны, шаги ('*/15', '1-5/2'), имена
+    месяцев и дней недели и псевдонимы @daily, @weekly и т.д. Если заданы и
+    день месяца, и день недели, подходит любой из них (как в cron).
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        fields = CRON_ALIASES.get(self.expression.lower(), self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron-выражение должно содержать 5 полей: '{expression}'")
+
+        parsed = [self._parse_field(field, *limits) for field, limits in zip(fields, CRON_FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {day % 7 for day in weekdays}
+        self.days_restricted = fields[2] != '*'
+        self.weekdays_restricted = fields[4] != '*'
+
+    @staticmethod
+    def _parse_field(field: str, minimum: int, maximum: int, names: Dict[str, int]) -> set:
+        def value(token: str) -> int:
+            token = token.lower()
+            number = names[token] if token in names else int(token)
+            if not minimum <= number <= maximum:
+                raise ValueError(f"Значение {token} вне диапазона {minimum}-{maximum}")
+            return number
+
+        values = set()
+        for item in field.split(','):
+            base, _, step = item.partition('/')
+            if base == '*':
+                start, end = minimum, maximum
+            elif '-' in base:
+                start, end = (value(token) for token in base.split('-', 1))
+            else:
+                start = value(base)
+                end = maximum if step else start
+            step_value = int(step) if step else 1
+            if step_value < 1 or start > end:
+                raise ValueError(f"Некорректное поле cron: '{item}'")
+            values.update(range(start, end + 1, step_value))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        """Ближайшее время срабатывания строго после moment (с точностью до минуты)"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+
+        while candidate < limit:
+            if candidate.month not in self.months:
+                year, month = divmod(candidate.month, 12)
+                candidate = candidate.replace(year=candidate.year + year, month=month + 1,
+                                              day=1, hour=0, minute=0)
+            elif not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+            elif candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron-выражение '{self.expression}' никогда не срабатывает")
+
+    def __str__(self) -> str:
+        return self.expression
+
+
+class IntervalSchedule:
+    """Фиксированный интервал от предыдущего запуска"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def next_after(self, moment: datetime) -> datetime:
+        return moment + timedelta(seconds=self.seconds)
+
+    def __str__(self) -> str:
+        return f"каждые {timedelta(seconds=self.seconds)}"
+
+
+def parse_schedule(value: str, default_seconds: float):
+    """Cron-выражение из настройки или интервал по умолчанию (пустое значение)"""
+    if value and value.strip():
+        return CronExpression(value)
+    return IntervalSchedule(default_seconds)
+
+
+@dataclass
+class ScheduledJob:
+    """Именованная задача.
+
+    action возвращает время следующего запуска, если задача назначает его
+    сама (например, повтор после неудачи), иначе None - время берется из
+    расписания со случайной задержкой до jitter секунд.
+    """
+    name: str
+    schedule: Any
+    action: Callable[[], Optional[datetime]]
+    jitter: float = 0.0
+    # Без записи в таблице задача выполняется сразу, а не в следующий срок расписания
+    run_on_start: bool = False
+
+
+class NextRunTable:
+    """Таблица запусков задач в JSON: {задача: {'next_run', 'last_run', ...}} с атомарной записью"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self.jobs: Dict[str, Dict[str, Any]] = self._load()
+
+    def get(self, name: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.jobs.get(name, {}))
+
+    def get_time(self, name: str, field: str) -> Optional[datetime]:
+        value = self.get(name).get(field)
+        return datetime.fromisoformat(value) if value else None
+
+    def update(self, name: str, **fields):
+        """Обновление полей задачи (datetime хранится в ISO формате) и запись файла"""
+        with self._lock:
+            row = self.jobs.setdefault(name, {})
+            for field, value in fields.items():
+                row[field] = value.isoformat() if isinstance(value, datetime) else value
+            self._save()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != TABLE_VERSION:
+            return {}
+        return data.get('jobs', {})
+
+    def _save(self):
+        temp_file = self.filename + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.filename)), exist_ok=True)
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': TABLE_VERSION, 'jobs': self.jobs}, f, indent=2, ensure_ascii=False)
+            os.replace(temp_file, self.filename)
+        except OSError as e:
+            logger.error(f"❌ Не удалось сохранить таблицу запусков: {e}")
+
+
+class JobScheduler:
+    """Цикл задач: ожидание ближайшего срока на threading.Event и выполнение.
+
+    Ожидание прерывается stop_event (сигнал завершения) сразу, а не после
+    очередной паузы; задачи выполняются по очереди в потоке run().
+    """
+
+    def __init__(self, jobs: List[ScheduledJob], table: NextRunTable,
+                 stop_event: Optional[threading.Event] = None):
+        self.jobs = {job.name: job for job in jobs}
+        self.table = table
+        self.stop_event = stop_event or threading.Event()
+
+        now = datetime.now()
+        for job in jobs:
+            if self.table.get_time(job.name, 'next_run') is None:
+                self.table.update(job.name, next_run=now if job.run_on_start else self.schedule_next(job, now))
+
+    def schedule_next(self, job: ScheduledJob, after: datetime) -> datetime:
+        """Следующий срок по расписанию со случайной задержкой jitter"""
+        next_run = job.schedule.next_after(after)
+        if job.jitter > 0:
+            next_run += timedelta(seconds=random.uniform(0, job.jitter))
+        return next_run
+
+    def reschedule(self, name: str, when: datetime):
+        """Новый срок задачи (вызывается и из других задач)"""
+        self.table.update(name, next_run=when)
+
+    def next_due(self) -> Tuple[ScheduledJob, datetime]:
+        return min(((job, self.table.get_time(job.name, 'next_run')) for job in self.jobs.values()),
+                   key=lambda item: item[1])
+
+    def run(self):
+        while not self.stop_event.is_set():
+            job, due = self.next_due()
+            wait = (due - datetime.now()).total_seconds()
+            if wait > 0:
+                logger.debug(f"😴 Ожидание задачи {job.name} до {due.strftime('%Y-%m-%d %H:%M:%S')}")
+                self.stop_event.wait(min(wait, MAX_WAIT_SECONDS))
+                continue
+            self.run_job(job)
+
+    def run_job(self, job: ScheduledJob):
+        """Выполнение задачи и назначение следующего срока"""
+        started = datetime.now()
+        logger.info(f"▶️ Задача {job.name}")
+        error = None
+        next_run = None
+        try:
+            next_run = job.action()
+        except Exception as e:
+            error = str(e)
+            logger.error(f"❌ Ошибка задачи {job.name}: {e}")
+
+        if next_run is None:
+            next_run = self.schedule_next(job, datetime.now())
+        self.table.update(job.name, next_run=next_run, last_run=started,
+                          last_duration=round(time.time() - started.timestamp(), 3), last_error=error)
+        logger.info(f"⏭️ Следующий запуск {job.name}: {next_run.strftime('%Y-%m-%d %H:%M:%S')}")
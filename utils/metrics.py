@@ -1,12 +1,168 @@
 # Система метрик и мониторинга парсера - ИСПРАВЛЕННАЯ ВЕРСИЯ v2.1
+import csv
 import time
 import json
+import math
 import os
 import tempfile
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, field, asdict
 
+from .metrics_store import MetricsStore, metric_row
+from .columnar_export import ColumnarMetricsWriter
+
+METRICS_DB_NAME = "parsing_metrics.db"
+# Прежний формат: вся история одним JSON (импортируется в базу один раз)
+LEGACY_METRICS_NAME = "parsing_metrics.json"
+# Метрики серверов копятся в буфере не более стольких строк, затем пишутся в базу (без базы - в CSV)
+METRICS_FLUSH_ROWS = 50
+
+class LatencyHistogram:
+    """Гистограмма задержек с логарифмическими корзинами (сливаемая, с перцентилями)"""
+    
+    # Значения меньше микросекунды считаются нулевыми
+    MIN_VALUE = 1e-6
+    
+    def __init__(self, relative_accuracy: float = 0.05):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+    
+    def record(self, value: float):
+        """Добавление значения (секунды)"""
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if value < self.MIN_VALUE:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+    
+    def merge(self, other: 'LatencyHistogram'):
+        """Слияние с другой гистограммой той же точности"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Нельзя слить гистограммы с разной точностью")
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+    
+    def quantile(self, q: float) -> float:
+        """Оценка перцентиля (q от 0 до 1) с заданной относительной точностью"""
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                value = 2 * self._gamma ** key / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+    
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Сериализация для JSON"""
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'buckets': {str(key): count for key, count in self.buckets.items()},
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'LatencyHistogram':
+        histogram = cls(data.get('relative_accuracy', 0.05))
+        histogram.buckets = {int(key): count for key, count in data.get('buckets', {}).items()}
+        histogram.zero_count = data.get('zero_count', 0)
+        histogram.count = data.get('count', 0)
+        histogram.total = data.get('total', 0.0)
+        histogram.min = data.get('min')
+        histogram.max = data.get('max')
+        return histogram
+
+class LatencySketches:
+    """Гистограммы длительностей по группам: группа -> ключ -> LatencyHistogram.
+    
+    Память не зависит от числа записей (только от числа ключей и корзин),
+    наборы из разных сессий и процессов сливаются через merge.
+    """
+    
+    QUANTILES = (0.5, 0.95, 0.99)
+    
+    def __init__(self, relative_accuracy: float = 0.05):
+        self.relative_accuracy = relative_accuracy
+        self.groups: Dict[str, Dict[str, LatencyHistogram]] = {}
+    
+    def record(self, group: str, key: str, value: float):
+        histograms = self.groups.setdefault(group, {})
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = LatencyHistogram(self.relative_accuracy)
+        histogram.record(value)
+    
+    def get(self, group: str, key: str) -> Optional[LatencyHistogram]:
+        return self.groups.get(group, {}).get(key)
+    
+    def merge(self, other: 'LatencySketches'):
+        for group, histograms in other.groups.items():
+            own = self.groups.setdefault(group, {})
+            for key, histogram in histograms.items():
+                if key not in own:
+                    own[key] = LatencyHistogram(histogram.relative_accuracy)
+                own[key].merge(histogram)
+    
+    def quantiles(self, group: str, key: str) -> Dict[str, float]:
+        """Число, среднее и p50/p95/p99 (секунды)"""
+        histogram = self.get(group, key)
+        if histogram is None:
+            return {'count': 0, 'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+        result = {'count': histogram.count, 'mean': histogram.mean()}
+        for q in self.QUANTILES:
+            result[f"p{int(q * 100)}"] = histogram.quantile(q)
+        return result
+    
+    def summary(self, group: str) -> Dict[str, Dict[str, float]]:
+        return {key: self.quantiles(group, key) for key in self.groups.get(group, {})}
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            group: {key: histogram.to_dict() for key, histogram in histograms.items()}
+            for group, histograms in self.groups.items()
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], relative_accuracy: float = 0.05) -> 'LatencySketches':
+        sketches = cls(relative_accuracy)
+        for group, histograms in (data or {}).items():
+            sketches.groups[group] = {
+                key: LatencyHistogram.from_dict(histogram) for key, histogram in histograms.items()
+            }
+        return sketches
+
 @dataclass
 class ServerExtractionMetric:
     """Метрика извлечения одного сервера"""
@@ -35,15 +191,37 @@ class SessionMetrics:
     # Статистика по методам извлечения
     method_stats: Dict[str, int] = field(default_factory=dict)
     
-    # Статистика по времени извлечения
+    # Статистика по времени извлечения: среднее и p50/p95/p99 из гистограмм
     timing_stats: Dict[str, float] = field(default_factory=dict)
     
-    # Список метрик серверов
-    server_metrics: List[ServerExtractionMetric] = field(default_factory=list)
+    # Гистограммы длительностей (LatencySketches.to_dict): общая, успешных
+    # извлечений, по этапам, методам и серверам; заполняются в finalize
+    latency_sketches: Dict[str, Any] = field(default_factory=dict)
+    
+    # Время первой метрики сервера (сами метрики пишутся в базу / CSV, в сессии не хранятся)
+    first_metric_time: Optional[str] = None
+    
+    # Команды WebDriver: число по типу и этапу, гистограммы задержек по типу
+    # (LatencyHistogram.to_dict) и накопленное время по местам вызова
+    webdriver_commands: Dict[str, int] = field(default_factory=dict)
+    webdriver_phases: Dict[str, int] = field(default_factory=dict)
+    webdriver_latency: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    webdriver_call_sites: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    
+    # Регулятор скорости: текущая/мин/макс скорость (запр/с), ожидание, сигналы блокировки
+    rate_stats: Dict[str, Any] = field(default_factory=dict)
+    
+    # Ресурсы по этапам: {этап: {'samples', 'avg', 'peak'}} (ResourceSampler.summary)
+    resource_stats: Dict[str, Any] = field(default_factory=dict)
+    
+    def __post_init__(self):
+        # Рабочие гистограммы (не поле dataclass: в asdict попадает latency_sketches)
+        self.sketches = LatencySketches.from_dict(self.latency_sketches)
     
     def add_server_metric(self, metric: ServerExtractionMetric):
-        """Добавление метрики сервера"""
-        self.server_metrics.append(metric)
+        """Учет метрики сервера в счетчиках и гистограммах"""
+        if self.first_metric_time is None:
+            self.first_metric_time = metric.timestamp
         self.total_servers += 1
         
         if metric.success:
@@ -56,25 +234,40 @@ class SessionMetrics:
         if metric.extraction_method:
             self.method_stats[metric.extraction_method] = self.method_stats.get(metric.extraction_method, 0) + 1
         
-        # Обновляем статистику времени
-        self.timing_stats['total_duration'] = self.timing_stats.get('total_duration', 0) + metric.duration
-        self.timing_stats['avg_duration'] = self.timing_stats['total_duration'] / self.total_servers
-        
+        # Гистограммы длительностей
+        self.sketches.record('total', 'all', metric.duration)
         if metric.success:
-            self.timing_stats['avg_success_duration'] = (
-                self.timing_stats.get('success_duration_sum', 0) + metric.duration
-            ) / self.successful_extractions
-            self.timing_stats['success_duration_sum'] = (
-                self.timing_stats.get('success_duration_sum', 0) + metric.duration
-            )
+            self.sketches.record('total', 'success', metric.duration)
+        self.sketches.record('method', metric.extraction_method or 'unknown', metric.duration)
+        self.sketches.record('server', metric.server_name, metric.duration)
+    
+    def record_phase(self, phase: str, duration: float):
+        """Длительность этапа сессии"""
+        self.sketches.record('phase', phase, duration)
+    
+    def refresh_timing_stats(self):
+        """timing_stats и latency_sketches из рабочих гистограмм"""
+        overall = self.sketches.quantiles('total', 'all')
+        success = self.sketches.quantiles('total', 'success')
+        histogram = self.sketches.get('total', 'all')
+        self.timing_stats = {
+            'total_duration': histogram.total if histogram else 0.0,
+            'avg_duration': overall['mean'],
+            'avg_success_duration': success['mean'],
+            'p50_duration': overall['p50'],
+            'p95_duration': overall['p95'],
+            'p99_duration': overall['p99']
+        }
+        self.latency_sketches = self.sketches.to_dict()
     
     def finalize(self):
         """Финализация метрик сессии"""
         self.end_time = datetime.now().isoformat()
-        if self.server_metrics:
-            start = datetime.fromisoformat(self.server_metrics[0].timestamp)
+        if self.first_metric_time:
+            start = datetime.fromisoformat(self.first_metric_time)
             end = datetime.now()
             self.total_duration = (end - start).total_seconds()
+        self.refresh_timing_stats()
     
     def get_success_rate(self) -> float:
         """Получение процента успешности"""
@@ -98,18 +291,27 @@ class SessionMetrics:
 class ParsingMetrics:
     """Система метрик парсера - ИСПРАВЛЕННАЯ ВЕРСИЯ v2.1"""
     
-    def __init__(self, output_dir: str = "./output"):
+    def __init__(self, output_dir: str = "./output", raw_retention_days: int = 30):
         self.output_dir = output_dir
-        self.metrics_file = os.path.join(output_dir, "parsing_metrics.json")
+        self.metrics_file = os.path.join(output_dir, METRICS_DB_NAME)
+        self.raw_retention_days = raw_retention_days
         self.current_session: Optional[SessionMetrics] = None
+        # Сессии этого процесса; история хранится в SQLite и в память не загружается
         self.historical_metrics: List[SessionMetrics] = []
+        self.store: Optional[MetricsStore] = None
+        # Сессии, уже дописанные в CSV / колоночный экспорт
+        self._csv_exported: set = set()
+        self._columnar_exported: set = set()
+        # Строки метрик серверов, еще не записанные в базу, и CSV сессий без базы
+        self._pending_rows: List[Tuple] = []
+        self._spool_files: Dict[str, str] = {}
         
         # Безопасная инициализация директорий
         self._safe_initialize_directories()
         
-        # Загружаем исторические метрики если возможно
+        # Открываем базу метрик если возможно
         if self.metrics_file:
-            self._load_historical_metrics()
+            self._open_store()
     
     def _safe_initialize_directories(self):
         """Безопасная инициализация директорий с множественными fallback'ами"""
@@ -125,7 +327,7 @@ class ParsingMetrics:
         if self._try_create_directory(alt_dir):
             print(f"📁 Альтернативная директория: {alt_dir}")
             self.output_dir = alt_dir
-            self.metrics_file = os.path.join(alt_dir, "parsing_metrics.json")
+            self.metrics_file = os.path.join(alt_dir, METRICS_DB_NAME)
             return
         
         # Попытка 3: Временная директория системы
@@ -134,7 +336,7 @@ class ParsingMetrics:
             if self._try_create_directory(temp_dir):
                 print(f"📁 Временная директория: {temp_dir}")
                 self.output_dir = temp_dir
-                self.metrics_file = os.path.join(temp_dir, "parsing_metrics.json")
+                self.metrics_file = os.path.join(temp_dir, METRICS_DB_NAME)
                 return
         except Exception as e:
             print(f"⚠️ Ошибка создания временной директории: {e}")
@@ -145,7 +347,7 @@ class ParsingMetrics:
             if self._try_create_directory(home_dir):
                 print(f"📁 Домашняя директория: {home_dir}")
                 self.output_dir = home_dir
-                self.metrics_file = os.path.join(home_dir, "parsing_metrics.json")
+                self.metrics_file = os.path.join(home_dir, METRICS_DB_NAME)
                 return
         except Exception as e:
             print(f"⚠️ Ошибка создания директории в домашней папке: {e}")
@@ -181,6 +383,7 @@ class ParsingMetrics:
         if session_id is None:
             session_id = f"session_{int(time.time())}"
         
+        self._flush_metric_rows()
         self.current_session = SessionMetrics(
             session_id=session_id,
             start_time=datetime.now().isoformat()
@@ -215,17 +418,49 @@ class ParsingMetrics:
         )
         
         self.current_session.add_server_metric(metric)
+        self._pending_rows.append(metric_row(self.current_session.session_id, metric))
+        if len(self._pending_rows) >= METRICS_FLUSH_ROWS:
+            self._flush_metric_rows()
         
         # Выводим прогресс
         session = self.current_session
         print(f"📊 [{session.total_servers}] {server_name}: "
               f"{'✅' if success else '❌'} ({duration:.2f}s)")
     
+    def record_driver_stats(self, driver_stats: Dict[str, Any]):
+        """Сохранение статистики команд WebDriver в текущую сессию"""
+        if not self.current_session or not driver_stats:
+            return
+        
+        session = self.current_session
+        session.webdriver_commands = dict(driver_stats.get('by_command', {}))
+        session.webdriver_phases = dict(driver_stats.get('by_phase', {}))
+        session.webdriver_latency = dict(driver_stats.get('latency', {}))
+        session.webdriver_call_sites = dict(driver_stats.get('call_sites', {}))
+    
+    def record_phase_timings(self, phase_timings: Dict[str, Dict[str, Any]]):
+        """Длительности этапов парсинга в гистограммы текущей сессии"""
+        if not self.current_session:
+            return
+        for phase, timing in phase_timings.items():
+            self.current_session.record_phase(phase, timing.get('duration', 0.0))
+    
+    def record_rate_stats(self, rate_stats: Dict[str, Any]):
+        """Сохранение статистики регулятора скорости в текущую сессию"""
+        if self.current_session and rate_stats:
+            self.current_session.rate_stats = dict(rate_stats)
+    
+    def record_resource_stats(self, resource_stats: Dict[str, Any]):
+        """Сохранение пиков и средних ресурсов по этапам в текущую сессию"""
+        if self.current_session and resource_stats:
+            self.current_session.resource_stats = dict(resource_stats)
+    
     def end_session(self) -> Optional[SessionMetrics]:
         """Завершение текущей сессии"""
         if not self.current_session:
             return None
         
+        self._flush_metric_rows()
         self.current_session.finalize()
         self.historical_metrics.append(self.current_session)
         
@@ -254,6 +489,9 @@ class ParsingMetrics:
         if not session:
             return "📊 Нет данных для отчета"
         
+        if session is self.current_session:
+            session.refresh_timing_stats()
+        
         report = f"""
 📊 ДЕТАЛЬНЫЙ ОТЧЕТ ПАРСИНГА v2.1
 {'='*60}
@@ -270,6 +508,7 @@ class ParsingMetrics:
 ⏱️ ПРОИЗВОДИТЕЛЬНОСТЬ:
    Среднее время на сервер: {session.timing_stats.get('avg_duration', 0):.2f}с
    Среднее время успешного извлечения: {session.timing_stats.get('avg_success_duration', 0):.2f}с
+   Перцентили: p50 {session.timing_stats.get('p50_duration', 0):.2f}с, p95 {session.timing_stats.get('p95_duration', 0):.2f}с, p99 {session.timing_stats.get('p99_duration', 0):.2f}с
    Общее время: {session.total_duration:.1f}с
 
 ❌ СТАТИСТИКА ОШИБОК:"""
@@ -287,25 +526,105 @@ class ParsingMetrics:
             report += f"\n\n🔧 МЕТОДЫ ИЗВЛЕЧЕНИЯ:"
             for method, count in sorted(session.method_stats.items(), key=lambda x: x[1], reverse=True):
                 percentage = (count / session.total_servers) * 100
-                report += f"\n   {method}: {count} ({percentage:.1f}%)"
+                latency = session.sketches.quantiles('method', method)
+                report += (f"\n   {method}: {count} ({percentage:.1f}%), "
+                           f"p50 {latency['p50']:.2f}с, p95 {latency['p95']:.2f}с")
+        
+        # Добавляем длительности этапов
+        phases = session.sketches.summary('phase')
+        if phases:
+            report += f"\n\n⏱️ ЭТАПЫ:"
+            for phase, latency in phases.items():
+                report += f"\n   {phase}: {latency['mean']:.1f}с"
+
+        # Добавляем состояние регулятора скорости
+        if session.rate_stats:
+            rate = session.rate_stats
+            signals = ", ".join(f"{signal}: {count}" for signal, count in rate.get('signals', {}).items()) or "нет"
+            report += (f"\n\n🐢 РЕГУЛЯТОР СКОРОСТИ:"
+                       f"\n   Текущая скорость: {rate.get('current_rate', 0):.2f} запр/с "
+                       f"(мин {rate.get('min_rate', 0):.2f}, макс {rate.get('max_rate', 0):.2f})"
+                       f"\n   Ожидание разрешений: {rate.get('total_wait', 0):.1f}с на {rate.get('acquired', 0)} запросов"
+                       f"\n   Сигналы блокировки: {signals}")
+
+        # Добавляем ресурсы по этапам
+        if session.resource_stats:
+            report += f"\n\n🖥️ РЕСУРСЫ ПО ЭТАПАМ (среднее / пик):"
+            for phase, stats in session.resource_stats.items():
+                avg, peak = stats.get('avg', {}), stats.get('peak', {})
+                report += (f"\n   {phase} ({stats.get('samples', 0)} замеров):"
+                           f"\n      Python: CPU {avg.get('python_cpu', 0):.0f}% / {peak.get('python_cpu', 0):.0f}%, "
+                           f"RSS {avg.get('python_rss', 0) / 2**20:.0f} / {peak.get('python_rss', 0) / 2**20:.0f} МБ, "
+                           f"FD {peak.get('python_fds', 0):.0f}"
+                           f"\n      Chrome: CPU {avg.get('browser_cpu', 0):.0f}% / {peak.get('browser_cpu', 0):.0f}%, "
+                           f"RSS {avg.get('browser_rss', 0) / 2**20:.0f} / {peak.get('browser_rss', 0) / 2**20:.0f} МБ, "
+                           f"FD {peak.get('browser_fds', 0):.0f}, процессов {peak.get('browser_procs', 0):.0f}")
+        
+        # Добавляем статистику команд WebDriver
+        if session.webdriver_commands:
+            total_commands = sum(session.webdriver_commands.values())
+            report += f"\n\n🖥️ КОМАНДЫ WEBDRIVER ({total_commands}):"
+            for command, count in sorted(session.webdriver_commands.items(), key=lambda x: x[1], reverse=True)[:10]:
+                histogram = LatencyHistogram.from_dict(session.webdriver_latency.get(command, {}))
+                report += (f"\n   {command}: {count} "
+                           f"(p50 {histogram.quantile(0.5) * 1000:.1f} мс, "
+                           f"p95 {histogram.quantile(0.95) * 1000:.1f} мс, "
+                           f"всего {histogram.total:.1f}с)")
+            
+            if session.webdriver_phases:
+                phases = ", ".join(f"{phase}: {count}" for phase, count in session.webdriver_phases.items())
+                report += f"\n   По этапам: {phases}"
+        
+        if session.webdriver_call_sites:
+            report += f"\n\n📍 МЕСТА ВЫЗОВА (по суммарному времени):"
+            top_sites = sorted(session.webdriver_call_sites.items(),
+                               key=lambda x: x[1].get('total_time', 0), reverse=True)[:10]
+            for site, stats in top_sites:
+                report += f"\n   {site}: {stats.get('total_time', 0):.2f}с, {int(stats.get('count', 0))} команд"
 
         # Добавляем проблемные серверы
-        failed_servers = [m for m in session.server_metrics if not m.success]
-        if failed_servers:
-            report += f"\n\n❌ ПРОБЛЕМНЫЕ СЕРВЕРЫ ({len(failed_servers)}):"
-            for server in failed_servers[:10]:  # Показываем первые 10
-                report += f"\n   {server.server_name}: {server.error_type or 'Unknown error'}"
-            if len(failed_servers) > 10:
-                report += f"\n   ... и еще {len(failed_servers) - 10} серверов"
+        if session.failed_extractions:
+            report += f"\n\n❌ ПРОБЛЕМНЫЕ СЕРВЕРЫ ({session.failed_extractions}):"
+            for server_name, error_type in self._failed_servers(session.session_id, 10):  # Показываем первые 10
+                report += f"\n   {server_name}: {error_type or 'Unknown error'}"
+            if session.failed_extractions > 10:
+                report += f"\n   ... и еще {session.failed_extractions - 10} серверов"
 
         return report
     
+    def _failed_servers(self, session_id: str, limit: int) -> List[Tuple[str, Optional[str]]]:
+        """Первые неудачные извлечения сессии из базы (без базы - из CSV сессии)"""
+        self._flush_metric_rows()
+        if self.store and session_id not in self._spool_files:
+            try:
+                return self.store.failed_servers(session_id, limit)
+            except Exception as e:
+                print(f"⚠️ Не удалось прочитать метрики серверов из базы: {e}")
+                return []
+        
+        failed = []
+        for row in self._iter_session_rows(session_id):
+            if not row[2]:
+                failed.append((row[1], row[5]))
+                if len(failed) >= limit:
+                    break
+        return failed
+    
     def get_historical_summary(self, days: int = 7) -> Dict[str, Any]:
         """Получение исторической сводки за последние дни"""
-        cutoff_date = datetime.now() - timedelta(days=days)
+        if self.store:
+            try:
+                summary = self.store.historical_summary(days)
+                if 'sessions_count' in summary:
+                    summary['latency'] = self.get_latency_trends(days).quantiles('total', 'all')
+                return summary
+            except Exception as e:
+                print(f"⚠️ Не удалось получить сводку из базы метрик: {e}")
         
+        # Без базы - только сессии этого процесса
+        cutoff_date = datetime.now() - timedelta(days=days)
         recent_sessions = [
-            s for s in self.historical_metrics 
+            s for s in self.historical_metrics
             if datetime.fromisoformat(s.start_time) > cutoff_date
         ]
         
@@ -314,9 +633,7 @@ class ParsingMetrics:
         
         total_servers = sum(s.total_servers for s in recent_sessions)
         total_successful = sum(s.successful_extractions for s in recent_sessions)
-        avg_success_rate = (total_successful / total_servers * 100) if total_servers > 0 else 0
         
-        # Агрегируем ошибки
         all_errors = {}
         for session in recent_sessions:
             for error_type, count in session.error_stats.items():
@@ -327,67 +644,116 @@ class ParsingMetrics:
             "sessions_count": len(recent_sessions),
             "total_servers": total_servers,
             "total_successful": total_successful,
-            "avg_success_rate": avg_success_rate,
+            "avg_success_rate": (total_successful / total_servers * 100) if total_servers > 0 else 0,
             "top_errors": dict(sorted(all_errors.items(), key=lambda x: x[1], reverse=True)[:5]),
-            "latest_session": recent_sessions[-1].get_summary() if recent_sessions else None
+            "latest_session": recent_sessions[-1].get_summary()
         }
     
-    def _load_historical_metrics(self):
-        """Загрузка исторических метрик"""
-        if not self.metrics_file or not os.path.exists(self.metrics_file):
+    def get_latency_trends(self, days: int = 7) -> LatencySketches:
+        """Слияние гистограмм длительностей сессий за последние дни
+        (по этапам, методам и серверам: .summary('method') и т.д.)"""
+        merged = LatencySketches()
+        if self.store:
+            for data in self.store.iter_session_details(days, 'latency_sketches'):
+                merged.merge(LatencySketches.from_dict(data))
+        else:
+            cutoff_date = datetime.now() - timedelta(days=days)
+            for session in self.historical_metrics:
+                if datetime.fromisoformat(session.start_time) > cutoff_date:
+                    merged.merge(session.sketches)
+        return merged
+    
+    def _open_store(self):
+        """Открытие базы метрик (SQLite) и импорт прежнего JSON"""
+        try:
+            self.store = MetricsStore(self.metrics_file, raw_retention_days=self.raw_retention_days)
+        except Exception as e:
+            print(f"⚠️ Не удалось открыть базу метрик {self.metrics_file}: {e}")
+            self.store = None
+            self.metrics_file = None
+            return
+        
+        self._import_legacy_metrics()
+    
+    def _import_legacy_metrics(self):
+        """Одноразовый перенос parsing_metrics.json в базу (файл переименовывается в .migrated)"""
+        legacy_file = os.path.join(os.path.dirname(self.metrics_file), LEGACY_METRICS_NAME)
+        if not os.path.exists(legacy_file):
             return
         
         try:
-            with open(self.metrics_file, 'r', encoding='utf-8') as f:
+            with open(legacy_file, 'r', encoding='utf-8') as f:
                 data = json.load(f)
             
-            self.historical_metrics = []
+            imported = 0
             for session_data in data.get('sessions', []):
-                # Восстанавливаем SessionMetrics из JSON
                 session = SessionMetrics(**{
-                    k: v for k, v in session_data.items() 
-                    if k != 'server_metrics'
+                    k: v for k, v in session_data.items()
+                    if k in SessionMetrics.__dataclass_fields__
                 })
-                
-                # Восстанавливаем метрики серверов
-                for metric_data in session_data.get('server_metrics', []):
-                    metric = ServerExtractionMetric(**metric_data)
-                    session.server_metrics.append(metric)
-                
-                self.historical_metrics.append(session)
+                self.store.replace_server_metrics(session.session_id, [
+                    metric_row(session.session_id, ServerExtractionMetric(**metric_data))
+                    for metric_data in session_data.get('server_metrics', [])
+                ])
+                self.store.save_session(session)
+                imported += 1
             
-            print(f"📊 Загружено {len(self.historical_metrics)} исторических сессий")
+            self.store.apply_retention()
+            os.replace(legacy_file, legacy_file + ".migrated")
+            print(f"📊 Перенесено {imported} исторических сессий в {self.metrics_file}")
             
         except Exception as e:
-            print(f"⚠️ Не удалось загрузить исторические метрики: {e}")
-            self.historical_metrics = []
+            print(f"⚠️ Не удалось перенести исторические метрики: {e}")
+    
+    def _flush_metric_rows(self):
+        """Запись накопленных строк метрик серверов в базу, без базы (или при ошибке) - в CSV сессии"""
+        if not self._pending_rows:
+            return
+        rows, self._pending_rows = self._pending_rows, []
+        
+        if self.store:
+            try:
+                self.store.append_server_metrics(rows)
+                return
+            except Exception as e:
+                print(f"⚠️ Не удалось записать метрики серверов в базу: {e}")
+        
+        session_id = rows[0][0]
+        spool_file = self._spool_files.get(session_id)
+        if not spool_file:
+            spool_file = os.path.join(self.output_dir or tempfile.gettempdir(), f"server_metrics_{session_id}.csv")
+        try:
+            with open(spool_file, 'a', newline='', encoding='utf-8') as f:
+                csv.writer(f).writerows(rows)
+            self._spool_files[session_id] = spool_file
+        except Exception as e:
+            print(f"⚠️ Не удалось записать метрики серверов в {spool_file}: {e} ({len(rows)} строк потеряно)")
+    
+    def _iter_session_rows(self, session_id: str):
+        """Строки метрик серверов сессии: из базы и из CSV сессии (если база была недоступна)"""
+        if self.store:
+            yield from self.store.iter_server_metrics(session_id)
+        
+        spool_file = self._spool_files.get(session_id)
+        if not spool_file or not os.path.exists(spool_file):
+            return
+        with open(spool_file, 'r', newline='', encoding='utf-8') as f:
+            for sid, server_name, success, duration, attempts, error_type, method, ts in csv.reader(f):
+                yield (sid, server_name, int(success), float(duration), int(attempts),
+                       error_type or None, method or None, float(ts))
     
     def _save_metrics(self):
-        """Безопасное сохранение метрик в файл"""
-        if not self.metrics_file:
+        """Сохранение текущей сессии в базу метрик (одна транзакция)"""
+        if not self.store:
             print("⚠️ Сохранение метрик отключено (нет доступной директории)")
             return
         
         try:
-            data = {
-                "last_updated": datetime.now().isoformat(),
-                "sessions": [asdict(session) for session in self.historical_metrics]
-            }
-            
-            # Создаем временный файл для атомарной записи
-            temp_file = self.metrics_file + ".tmp"
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            
-            # Атомарно перемещаем файл
-            if os.path.exists(self.metrics_file):
-                backup_file = self.metrics_file + ".backup"
-                if os.path.exists(backup_file):
-                    os.remove(backup_file)
-                os.rename(self.metrics_file, backup_file)
-            
-            os.rename(temp_file, self.metrics_file)
-            print(f"📊 Метрики сохранены в {self.metrics_file}")
+            rows = self.store.save_session(self.current_session)
+            removed = self.store.apply_retention()
+            print(f"📊 Метрики сохранены в {self.metrics_file} ({rows} записей)")
+            if removed:
+                print(f"🧹 Удалено {removed} сырых метрик старше {self.raw_retention_days} дн. (сводки сохранены)")
             
         except Exception as e:
             print(f"⚠️ Не удалось сохранить метрики: {e}")
@@ -411,55 +777,111 @@ class ParsingMetrics:
         except Exception as e:
             print(f"❌ Полный сбой сохранения метрик: {e}")
     
-    def export_csv_report(self, filename: str = None) -> str:
-        """Безопасный экспорт отчета в CSV формат"""
+    CSV_HEADER = [
+        'Session ID', 'Server Name', 'Success', 'Duration (s)',
+        'Attempt Count', 'Error Type', 'Extraction Method', 'Timestamp'
+    ]
+    
+    def export_csv_report(self, filename: str = None, full: bool = False) -> str:
+        """Экспорт метрик в CSV.
+        
+        По умолчанию в месячный файл parsing_report_<ГГГГ-ММ>.csv дописываются
+        только сессии этого процесса, которые еще не выгружались; full=True -
+        вся история из базы в отдельный файл.
+        """
+        if full:
+            name = f"parsing_report_{int(time.time())}.csv"
+        else:
+            name = f"parsing_report_{datetime.now():%Y-%m}.csv"
+        
         if not self.output_dir:
             print("⚠️ Экспорт CSV ограничен (нет доступной директории)")
             # Пытаемся сохранить в временную директорию
             if not filename:
-                filename = os.path.join(tempfile.gettempdir(), f"parsing_report_{int(time.time())}.csv")
+                filename = os.path.join(tempfile.gettempdir(), name)
         else:
             if not filename:
-                filename = os.path.join(self.output_dir, f"parsing_report_{int(time.time())}.csv")
+                filename = os.path.join(self.output_dir, name)
+        
+        sessions = None
+        if not full:
+            sessions = [s for s in self.historical_metrics if s.session_id not in self._csv_exported]
+            if not sessions:
+                return ""
         
         try:
-            import csv
-            
             # Проверяем возможность записи в директорию
             test_dir = os.path.dirname(filename)
             if not self._try_create_directory(test_dir):
                 # Fallback в временную директорию
-                filename = os.path.join(tempfile.gettempdir(), f"parsing_report_{int(time.time())}.csv")
+                filename = os.path.join(tempfile.gettempdir(), name)
             
-            with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+            write_header = full or not os.path.exists(filename) or os.path.getsize(filename) == 0
+            rows = 0
+            with open(filename, 'w' if full else 'a', newline='', encoding='utf-8') as csvfile:
                 writer = csv.writer(csvfile)
                 
-                # Заголовки
-                writer.writerow([
-                    'Session ID', 'Server Name', 'Success', 'Duration (s)',
-                    'Attempt Count', 'Error Type', 'Extraction Method', 'Timestamp'
-                ])
+                if write_header:
+                    writer.writerow(self.CSV_HEADER)
                 
-                # Данные
-                for session in self.historical_metrics:
-                    for metric in session.server_metrics:
-                        writer.writerow([
-                            session.session_id,
-                            metric.server_name,
-                            metric.success,
-                            metric.duration,
-                            metric.attempt_count,
-                            metric.error_type or '',
-                            metric.extraction_method or '',
-                            metric.timestamp
-                        ])
+                for session_id, server_name, success, duration, attempts, error_type, method, ts \
+                        in self._iter_metric_rows(sessions):
+                    writer.writerow([
+                        session_id, server_name, bool(success), duration, attempts,
+                        error_type or '', method or '', datetime.fromtimestamp(ts).isoformat()
+                    ])
+                    rows += 1
             
-            print(f"📊 CSV отчет экспортирован: {filename}")
+            if sessions:
+                self._csv_exported.update(s.session_id for s in sessions)
+            
+            print(f"📊 CSV отчет экспортирован: {filename} (+{rows} строк)")
             return filename
             
         except Exception as e:
             print(f"❌ Ошибка экспорта CSV: {e}")
             return ""
+    
+    def export_columnar(self, directory: str = None, full: bool = False) -> int:
+        """Дозапись метрик серверов в колоночный экспорт (utils.columnar_export).
+        
+        По умолчанию - только новые сессии этого процесса; full=True - вся
+        история из базы (в пустой каталог). Возвращает число дописанных строк.
+        """
+        if not directory:
+            if not self.output_dir:
+                print("⚠️ Колоночный экспорт отключен (нет доступной директории)")
+                return 0
+            directory = os.path.join(self.output_dir, "metrics_columns")
+        
+        sessions = None
+        if not full:
+            sessions = [s for s in self.historical_metrics if s.session_id not in self._columnar_exported]
+            if not sessions:
+                return 0
+        
+        try:
+            added = ColumnarMetricsWriter(directory).append(self._iter_metric_rows(sessions))
+            if sessions:
+                self._columnar_exported.update(s.session_id for s in sessions)
+            print(f"📊 Колоночный экспорт: +{added} строк в {directory}")
+            return added
+        except Exception as e:
+            print(f"❌ Ошибка колоночного экспорта: {e}")
+            return 0
+    
+    def _iter_metric_rows(self, sessions: Optional[List[SessionMetrics]] = None):
+        """Строки метрик серверов в формате MetricsStore.iter_server_metrics:
+        указанных сессий, иначе вся история из базы (без базы - сессии процесса)"""
+        self._flush_metric_rows()
+        if sessions is None:
+            if self.store:
+                yield from self.store.iter_server_metrics()
+                return
+            sessions = self.historical_metrics
+        
+        for session in sessions:
+            yield from self._iter_session_rows(session.session_id)
 
 class ParsingCache:
     """Система кэширования для парсера - ИСПРАВЛЕННАЯ ВЕРСИЯ v2.1"""
@@ -660,4 +1082,225 @@ class ParsingCache:
                 try:
                     os.remove(temp_file)
                 except:
-                    pass
\ No newline at end of file
+                    pass
+
+
+# ==========================================
+# Реестр метрик в формате Prometheus
+# ==========================================
+
+# Границы корзин гистограмм по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') + '"'
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class _RegistryMetric:
+    """Метрика с метками: значения по кортежу значений меток"""
+    
+    TYPE = 'untyped'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames) or any(name not in labels for name in self.labelnames):
+            raise ValueError(f"{self.name}: ожидаются метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+    
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+    
+    def get(self, **labels) -> Any:
+        with self._lock:
+            return self._values.get(self._key(labels))
+
+
+class Counter(_RegistryMetric):
+    """Монотонно растущий счетчик"""
+    
+    TYPE = 'counter'
+    
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("Счетчик не может уменьшаться")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_RegistryMetric):
+    """Текущее значение"""
+    
+    TYPE = 'gauge'
+    
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+    
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+    
+    def set_to_current_time(self, **labels):
+        self.set(time.time(), **labels)
+
+
+class Histogram(_RegistryMetric):
+    """Распределение значений по фиксированным корзинам (_bucket, _sum, _count)"""
+    
+    TYPE = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+    
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][index] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+    
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        with self._lock:
+            for key, state in self._values.items():
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets, state['buckets']):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", dict(labels, le=_format_value(bound)), cumulative))
+                samples.append((f"{self.name}_sum", labels, state['sum']))
+                samples.append((f"{self.name}_count", labels, state['count']))
+        return samples
+
+
+class MetricsRegistry:
+    """Реестр счетчиков, измерителей и гистограмм для экспорта в Prometheus:
+    HTTP /metrics (start_http_server) или textfile для node-exporter (write_textfile)"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, _RegistryMetric] = {}
+        self._lock = threading.Lock()
+    
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, tuple(labelnames), **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Метрика {name} уже зарегистрирована с другим типом или метками")
+            return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+    
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+    
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+    
+    def render(self) -> str:
+        """Текстовый формат экспозиции Prometheus 0.0.4"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        
+        lines = []
+        for metric in metrics:
+            documentation = metric.documentation.replace('\\', '\\\\').replace('\n', '\\n')
+            lines.append(f"# HELP {metric.name} {documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+    
+    def write_textfile(self, path: str) -> bool:
+        """Атомарная запись для textfile collector (временный файл и rename)"""
+        try:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(self.render())
+                os.chmod(temp_path, 0o644)
+                os.replace(temp_path, path)
+            except BaseException:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                raise
+            return True
+        except Exception as e:
+            print(f"⚠️ Не удалось записать метрики в {path}: {e}")
+            return False
+    
+    def start_http_server(self, port: int, host: str = '') -> Optional[ThreadingHTTPServer]:
+        """HTTP /metrics в фоновом потоке"""
+        registry = self
+        
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        try:
+            server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            print(f"⚠️ Не удалось запустить HTTP сервер метрик на порту {port}: {e}")
+            return None
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"📡 Метрики Prometheus: http://{host or '0.0.0.0'}:{server.server_address[1]}/metrics")
+        return server
+
+
+# Общий реестр процесса (парсер или scheduler)
+REGISTRY = MetricsRegistry()
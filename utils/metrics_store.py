@@ -0,0 +1,309 @@
+"""
+Хранилище метрик в SQLite: сессии, метрики серверов, дневные сводки
+"""
+import json
+import time
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    start_time TEXT NOT NULL,
+    start_ts REAL NOT NULL,
+    end_time TEXT,
+    total_servers INTEGER NOT NULL DEFAULT 0,
+    successful INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    total_duration REAL NOT NULL DEFAULT 0,
+    avg_duration REAL NOT NULL DEFAULT 0,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_start ON sessions(start_ts);
+
+CREATE TABLE IF NOT EXISTS session_errors (
+    session_id TEXT NOT NULL,
+    error_type TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (session_id, error_type)
+);
+
+CREATE TABLE IF NOT EXISTS server_metrics (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    server_name TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    attempt_count INTEGER NOT NULL DEFAULT 1,
+    error_type TEXT,
+    extraction_method TEXT,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_server_metrics_ts ON server_metrics(ts);
+CREATE INDEX IF NOT EXISTS idx_server_metrics_server ON server_metrics(server_name, ts);
+CREATE INDEX IF NOT EXISTS idx_server_metrics_session ON server_metrics(session_id);
+
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    day TEXT NOT NULL,
+    server_name TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    successes INTEGER NOT NULL,
+    total_duration REAL NOT NULL,
+    max_duration REAL NOT NULL,
+    PRIMARY KEY (day, server_name)
+);
+"""
+
+# Поля SessionMetrics, которые хранятся JSON-ом в sessions.details
+DETAIL_FIELDS = (
+    'method_stats', 'timing_stats', 'webdriver_commands', 'webdriver_phases',
+    'webdriver_latency', 'webdriver_call_sites', 'rate_stats', 'latency_sketches',
+    'resource_stats'
+)
+
+
+def _to_timestamp(value: str) -> float:
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+
+def metric_row(session_id: str, metric) -> Tuple:
+    """Метрика сервера (ServerExtractionMetric) в формате строки server_metrics (без id)"""
+    return (session_id, metric.server_name, int(bool(metric.success)), metric.duration,
+            metric.attempt_count, metric.error_type, metric.extraction_method, _to_timestamp(metric.timestamp))
+
+
+class MetricsStore:
+    """SQLite база метрик: сырые метрики серверов хранятся raw_retention_days,
+    дневные сводки по серверам и сессии - без ограничения"""
+
+    def __init__(self, db_file: str, raw_retention_days: int = 30):
+        self.db_file = db_file
+        self.raw_retention_days = raw_retention_days
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def save_session(self, session) -> int:
+        """Сводка сессии одной транзакцией (метрики серверов дописываются
+        append_server_metrics по мере извлечения), возвращает число строк метрик"""
+        details = {name: getattr(session, name, {}) for name in DETAIL_FIELDS}
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM session_errors WHERE session_id = ?", (session.session_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, start_time, start_ts, end_time, total_servers, "
+                "successful, failed, total_duration, avg_duration, details) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (session.session_id, session.start_time, _to_timestamp(session.start_time), session.end_time,
+                 session.total_servers, session.successful_extractions, session.failed_extractions,
+                 session.total_duration, session.timing_stats.get('avg_duration', 0.0),
+                 json.dumps(details, ensure_ascii=False))
+            )
+            conn.executemany(
+                "INSERT INTO session_errors (session_id, error_type, count) VALUES (?, ?, ?)",
+                [(session.session_id, error_type, count) for error_type, count in session.error_stats.items()]
+            )
+            return conn.execute(
+                "SELECT count(*) FROM server_metrics WHERE session_id = ?", (session.session_id,)
+            ).fetchone()[0]
+
+    def append_server_metrics(self, rows: List[Tuple]) -> int:
+        """Дозапись строк метрик серверов (формат metric_row) с обновлением дневных сводок"""
+        if not rows:
+            return 0
+        with closing(self._connect()) as conn, conn:
+            self._insert_server_metrics(conn, rows)
+        return len(rows)
+
+    def replace_server_metrics(self, session_id: str, rows: List[Tuple]) -> int:
+        """Замена всех строк метрик сессии (сводки пересчитываются)"""
+        with closing(self._connect()) as conn, conn:
+            self._remove_session_rollups(conn, session_id)
+            conn.execute("DELETE FROM server_metrics WHERE session_id = ?", (session_id,))
+            self._insert_server_metrics(conn, rows)
+        return len(rows)
+
+    @staticmethod
+    def _insert_server_metrics(conn: sqlite3.Connection, rows: List[Tuple]):
+        conn.executemany(
+            "INSERT INTO server_metrics (session_id, server_name, success, duration, attempt_count, "
+            "error_type, extraction_method, ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        conn.executemany(
+            """
+            INSERT INTO daily_rollups (day, server_name, attempts, successes, total_duration, max_duration)
+            VALUES (date(?, 'unixepoch', 'localtime'), ?, 1, ?, ?, ?)
+            ON CONFLICT (day, server_name) DO UPDATE SET
+                attempts = daily_rollups.attempts + excluded.attempts,
+                successes = daily_rollups.successes + excluded.successes,
+                total_duration = daily_rollups.total_duration + excluded.total_duration,
+                max_duration = max(daily_rollups.max_duration, excluded.max_duration)
+            """,
+            [(ts, server_name, success, duration, duration)
+             for _, server_name, success, duration, _, _, _, ts in rows]
+        )
+
+    @staticmethod
+    def _remove_session_rollups(conn: sqlite3.Connection, session_id: str):
+        """Вычитание из сводок уже сохраненных строк сессии (max_duration не уменьшается)"""
+        conn.execute(
+            """
+            UPDATE daily_rollups SET
+                attempts = daily_rollups.attempts - old.attempts,
+                successes = daily_rollups.successes - old.successes,
+                total_duration = daily_rollups.total_duration - old.total_duration
+            FROM (
+                SELECT date(ts, 'unixepoch', 'localtime') AS day, server_name, count(*) AS attempts,
+                       sum(success) AS successes, sum(duration) AS total_duration
+                FROM server_metrics WHERE session_id = ? GROUP BY 1, 2
+            ) AS old
+            WHERE daily_rollups.day = old.day AND daily_rollups.server_name = old.server_name
+            """,
+            (session_id,)
+        )
+        conn.execute("DELETE FROM daily_rollups WHERE attempts <= 0")
+
+    def apply_retention(self) -> int:
+        """Удаление сырых метрик старше raw_retention_days (сводки остаются)"""
+        if not self.raw_retention_days or self.raw_retention_days <= 0:
+            return 0
+        cutoff = time.time() - self.raw_retention_days * 86400
+        with closing(self._connect()) as conn, conn:
+            removed = conn.execute("DELETE FROM server_metrics WHERE ts < ?", (cutoff,)).rowcount
+        return removed
+
+    def historical_summary(self, days: int = 7) -> Dict[str, Any]:
+        """Сводка за последние дни по таблице сессий"""
+        cutoff = time.time() - days * 86400
+        with closing(self._connect()) as conn:
+            sessions_count, total_servers, total_successful = conn.execute(
+                "SELECT count(*), coalesce(sum(total_servers), 0), coalesce(sum(successful), 0) "
+                "FROM sessions WHERE start_ts > ?", (cutoff,)
+            ).fetchone()
+            if not sessions_count:
+                return {"message": "Нет данных за указанный период"}
+
+            top_errors = conn.execute(
+                "SELECT e.error_type, sum(e.count) FROM session_errors e "
+                "JOIN sessions s ON s.session_id = e.session_id WHERE s.start_ts > ? "
+                "GROUP BY e.error_type ORDER BY 2 DESC LIMIT 5", (cutoff,)
+            ).fetchall()
+            latest = conn.execute(
+                "SELECT session_id FROM sessions WHERE start_ts > ? ORDER BY start_ts DESC LIMIT 1", (cutoff,)
+            ).fetchone()
+
+            return {
+                "period_days": days,
+                "sessions_count": sessions_count,
+                "total_servers": total_servers,
+                "total_successful": total_successful,
+                "avg_success_rate": (total_successful / total_servers * 100) if total_servers > 0 else 0,
+                "top_errors": dict(top_errors),
+                "latest_session": self._session_summary(conn, latest[0]) if latest else None
+            }
+
+    def iter_session_details(self, days: int = 7, name: str = 'latency_sketches') -> Iterator[Any]:
+        """Поле details сессий за последние дни (в порядке начала)"""
+        cutoff = time.time() - days * 86400
+        with closing(self._connect()) as conn:
+            for (details,) in conn.execute(
+                "SELECT details FROM sessions WHERE start_ts > ? ORDER BY start_ts", (cutoff,)
+            ):
+                try:
+                    value = json.loads(details or '{}').get(name)
+                except ValueError:
+                    continue
+                if value:
+                    yield value
+
+    def session_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            return self._session_summary(conn, session_id)
+
+    @staticmethod
+    def _session_summary(conn: sqlite3.Connection, session_id: str) -> Optional[Dict[str, Any]]:
+        """Формат SessionMetrics.get_summary"""
+        row = conn.execute(
+            "SELECT session_id, total_servers, successful, failed, total_duration, avg_duration "
+            "FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if not row:
+            return None
+        session_id, total_servers, successful, failed, total_duration, avg_duration = row
+        top_errors = conn.execute(
+            "SELECT error_type, count FROM session_errors WHERE session_id = ? ORDER BY count DESC LIMIT 5",
+            (session_id,)
+        ).fetchall()
+        return {
+            'session_id': session_id,
+            'success_rate': (successful / total_servers * 100) if total_servers else 0.0,
+            'total_servers': total_servers,
+            'successful': successful,
+            'failed': failed,
+            'duration': total_duration,
+            'avg_duration_per_server': avg_duration,
+            'top_errors': dict(top_errors)
+        }
+
+    def daily_rollups(self, days: int = 30, server_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Дневные сводки по серверам (успешность и время извлечения)"""
+        query = ("SELECT day, server_name, attempts, successes, total_duration, max_duration FROM daily_rollups "
+                 "WHERE day >= date('now', 'localtime', ?)")
+        params: List[Any] = [f"-{days} days"]
+        if server_name:
+            query += " AND server_name = ?"
+            params.append(server_name)
+        query += " ORDER BY day, server_name"
+
+        with closing(self._connect()) as conn:
+            return [
+                {
+                    'day': day,
+                    'server_name': name,
+                    'attempts': attempts,
+                    'successes': successes,
+                    'success_rate': successes / attempts * 100 if attempts else 0.0,
+                    'avg_duration': total_duration / attempts if attempts else 0.0,
+                    'max_duration': max_duration
+                }
+                for day, name, attempts, successes, total_duration, max_duration in conn.execute(query, params)
+            ]
+
+    def iter_server_metrics(self, session_id: Optional[str] = None) -> Iterator[Tuple]:
+        """Сырые метрики: (session_id, server_name, success, duration, attempt_count,
+        error_type, extraction_method, ts) в порядке записи"""
+        query = ("SELECT session_id, server_name, success, duration, attempt_count, error_type, "
+                 "extraction_method, ts FROM server_metrics")
+        params: Tuple = ()
+        if session_id is not None:
+            query += " WHERE session_id = ?"
+            params = (session_id,)
+        query += " ORDER BY id"
+
+        with closing(self._connect()) as conn:
+            yield from conn.execute(query, params)
+
+    def failed_servers(self, session_id: str, limit: int = 10) -> List[Tuple[str, Optional[str]]]:
+        """Первые неудачные извлечения сессии: (server_name, error_type)"""
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT server_name, error_type FROM server_metrics WHERE session_id = ? AND success = 0 "
+                "ORDER BY id LIMIT ?", (session_id, limit)
+            ).fetchall()
+
+    def sessions_count(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT count(*) FROM sessions").fetchone()[0]
@@ -0,0 +1,146 @@
+"""
+Фоновый замер ресурсов: процесс Python и дерево Chrome/chromedriver по этапам парсинга
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import psutil
+
+from .metrics import REGISTRY
+
+RESOURCE_CPU = REGISTRY.gauge(
+    'dnscrypt_parser_cpu_percent', 'Загрузка CPU (процент одного ядра)', ('process',)
+)
+RESOURCE_RSS = REGISTRY.gauge(
+    'dnscrypt_parser_rss_bytes', 'Резидентная память', ('process',)
+)
+RESOURCE_FDS = REGISTRY.gauge(
+    'dnscrypt_parser_open_fds', 'Открытые файловые дескрипторы', ('process',)
+)
+
+# Значения одного замера: (python|browser)_(cpu|rss|fds) и число процессов браузера
+FIELDS = ('python_cpu', 'python_rss', 'python_fds', 'browser_cpu', 'browser_rss', 'browser_fds', 'browser_procs')
+
+# Этап вне run_full_parsing (инициализация, очистка)
+IDLE_PHASE = 'idle'
+
+
+def _num_fds(process: psutil.Process) -> int:
+    try:
+        return process.num_fds()
+    except AttributeError:
+        # Windows: дескрипторы считаются как handles
+        return process.num_handles()
+
+
+class ResourceSampler:
+    """Поток замеров CPU%, RSS и FD с интервалом interval секунд.
+
+    Замер помечается текущим этапом (phase_getter) и сразу сводится в
+    среднее и пик по этапу, поэтому память не зависит от длительности сессии.
+    Дерево браузера - все дочерние процессы Python (chromedriver и Chrome).
+    """
+
+    def __init__(self, interval: float = 1.0, phase_getter: Optional[Callable[[], Optional[str]]] = None):
+        self.interval = interval
+        self.phase_getter = phase_getter or (lambda: None)
+        self.process = psutil.Process(os.getpid())
+        # Процессы по pid: cpu_percent считается между замерами одного объекта
+        self._children: Dict[int, psutil.Process] = {}
+        self._phases: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'ResourceSampler':
+        if self._thread:
+            return self
+        self._stop.clear()
+        self.process.cpu_percent(None)
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+        self._thread.start()
+        print(f"🖥️ Замер ресурсов каждые {self.interval:.1f}с")
+        return self
+
+    def stop(self):
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> Optional[Dict[str, float]]:
+        """Один замер с учетом в статистике текущего этапа"""
+        try:
+            values = {
+                'python_cpu': self.process.cpu_percent(None),
+                'python_rss': self.process.memory_info().rss,
+                'python_fds': _num_fds(self.process)
+            }
+        except psutil.Error:
+            return None
+
+        values.update(self._sample_browser())
+        RESOURCE_CPU.set(values['python_cpu'], process='python')
+        RESOURCE_CPU.set(values['browser_cpu'], process='browser')
+        RESOURCE_RSS.set(values['python_rss'], process='python')
+        RESOURCE_RSS.set(values['browser_rss'], process='browser')
+        RESOURCE_FDS.set(values['python_fds'], process='python')
+        RESOURCE_FDS.set(values['browser_fds'], process='browser')
+
+        phase = self.phase_getter() or IDLE_PHASE
+        with self._lock:
+            stats = self._phases.setdefault(phase, {'samples': 0, 'sum': dict.fromkeys(FIELDS, 0.0),
+                                                    'peak': dict.fromkeys(FIELDS, 0.0)})
+            stats['samples'] += 1
+            for name, value in values.items():
+                stats['sum'][name] += value
+                if value > stats['peak'][name]:
+                    stats['peak'][name] = value
+        return values
+
+    def _sample_browser(self) -> Dict[str, float]:
+        cpu = rss = fds = 0.0
+        alive = {}
+        try:
+            children = self.process.children(recursive=True)
+        except psutil.Error:
+            children = []
+
+        for child in children:
+            process = self._children.get(child.pid, child)
+            try:
+                if child.pid not in self._children:
+                    # Первый вызов cpu_percent только запоминает отсчет
+                    process.cpu_percent(None)
+                else:
+                    cpu += process.cpu_percent(None)
+                rss += process.memory_info().rss
+                fds += _num_fds(process)
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+            alive[child.pid] = process
+
+        self._children = alive
+        return {'browser_cpu': cpu, 'browser_rss': rss, 'browser_fds': fds, 'browser_procs': len(alive)}
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """{этап: {'samples': n, 'avg': {поле: значение}, 'peak': {поле: значение}}}"""
+        with self._lock:
+            return {
+                phase: {
+                    'samples': stats['samples'],
+                    'avg': {name: stats['sum'][name] / stats['samples'] for name in FIELDS},
+                    'peak': dict(stats['peak'])
+                }
+                for phase, stats in self._phases.items()
+            }
@@ -0,0 +1,200 @@
+"""
+Аренда запуска парсера: один запуск на каталог output (scheduler, разовый запуск, parser_new.py)
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from .run_result import load_run_result
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: без межпроцессной блокировки файла аренда работает без гарантии атомарности
+    fcntl = None
+
+# Поведение второго запуска при занятой аренде
+LEASE_POLICIES = ('wait', 'piggyback', 'exit')
+
+DEFAULT_HEARTBEAT_INTERVAL = 15.0
+DEFAULT_STALE_AFTER = 120.0
+
+# Код выхода parser_new.py, если запуск не выполнен из-за занятой аренды (EX_TEMPFAIL)
+EXIT_LEASE_BUSY = 75
+
+
+class RunLease:
+    """Аренда в JSON файле: владелец, pid, хост, время захвата и heartbeat.
+
+    Чтение и запись аренды выполняются под flock на соседнем .lock файле,
+    поэтому захват атомарен и между контейнерами с общим томом. Владелец
+    обновляет heartbeat в фоновом потоке; аренда без heartbeat дольше
+    stale_after секунд (процесс убит) перехватывается следующим запуском.
+    """
+
+    def __init__(self, filename: str, owner: str, heartbeat_interval: float = DEFAULT_HEARTBEAT_INTERVAL,
+                 stale_after: float = DEFAULT_STALE_AFTER, run_result_file: Optional[str] = None):
+        self.filename = filename
+        self.lock_file = f"{filename}.lock"
+        self.owner = owner
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = max(stale_after, heartbeat_interval * 2)
+        self.run_result_file = run_result_file
+        self.token = uuid.uuid4().hex
+        self.held = False
+        # Аренду перехватили (heartbeat не успевал) - результаты запуска уже не единственные
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.filename)), exist_ok=True)
+        with open(self.lock_file, 'a') as handle:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def read(self) -> Optional[Dict[str, Any]]:
+        """Текущая аренда (None - свободна)"""
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as f:
+                lease = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return lease if isinstance(lease, dict) else None
+
+    def is_stale(self, lease: Dict[str, Any]) -> bool:
+        return time.time() - lease.get('heartbeat_ts', 0) > self.stale_after
+
+    def active(self) -> Optional[Dict[str, Any]]:
+        """Действующая чужая аренда (None - свободна, устарела или наша)"""
+        lease = self.read()
+        if lease is None or lease.get('token') == self.token or self.is_stale(lease):
+            return None
+        return lease
+
+    @staticmethod
+    def describe(lease: Dict[str, Any]) -> str:
+        return (f"{lease.get('owner')} (pid {lease.get('pid')}@{lease.get('host')}, "
+                f"с {lease.get('acquired_at', '?')[:19]}, heartbeat "
+                f"{time.time() - lease.get('heartbeat_ts', 0):.0f}с назад)")
+
+    def try_acquire(self) -> bool:
+        """Захват без ожидания; устаревшая аренда перехватывается"""
+        with self._locked():
+            current = self.read()
+            if current and current.get('token') != self.token:
+                if not self.is_stale(current):
+                    return False
+                print(f"⚠️ Перехват устаревшей аренды запуска: {self.describe(current)}")
+
+            now = time.time()
+            self._write({
+                'owner': self.owner,
+                'token': self.token,
+                'pid': os.getpid(),
+                'host': socket.gethostname(),
+                'acquired_at': datetime.fromtimestamp(now).isoformat(),
+                'heartbeat_at': datetime.fromtimestamp(now).isoformat(),
+                'heartbeat_ts': now,
+                'run_result_file': self.run_result_file
+            })
+
+        self.held = True
+        self.lost.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._heartbeat, name="run-lease-heartbeat", daemon=True)
+        self._thread.start()
+        return True
+
+    def acquire(self, timeout: float = 0.0, poll_interval: float = 5.0,
+                cancel: Optional[threading.Event] = None) -> bool:
+        """Захват с ожиданием до timeout секунд (cancel прерывает ожидание)"""
+        deadline = time.time() + timeout
+        while True:
+            if self.try_acquire():
+                return True
+            if not self._pause(deadline, poll_interval, cancel):
+                return False
+
+    def wait_for_release(self, timeout: float, poll_interval: float = 5.0,
+                         cancel: Optional[threading.Event] = None) -> bool:
+        """Ожидание освобождения чужой аренды без захвата (True - свободна)"""
+        deadline = time.time() + timeout
+        while self.active() is not None:
+            if not self._pause(deadline, poll_interval, cancel):
+                return False
+        return True
+
+    @staticmethod
+    def _pause(deadline: float, poll_interval: float, cancel: Optional[threading.Event]) -> bool:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        wait = min(poll_interval, remaining)
+        if cancel is not None:
+            return not cancel.wait(wait)
+        time.sleep(wait)
+        return True
+
+    def release(self):
+        """Освобождение аренды (чужую - перехваченную - не трогаем)"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if not self.held:
+            return
+        self.held = False
+        with self._locked():
+            current = self.read()
+            if current and current.get('token') == self.token:
+                try:
+                    os.remove(self.filename)
+                except OSError:
+                    pass
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            with self._locked():
+                current = self.read()
+                if not current or current.get('token') != self.token:
+                    self.lost.set()
+                    print("⚠️ Аренда запуска потеряна: ее перехватил другой запуск")
+                    return
+                now = time.time()
+                current['heartbeat_at'] = datetime.fromtimestamp(now).isoformat()
+                current['heartbeat_ts'] = now
+                self._write(current)
+
+    def _write(self, lease: Dict[str, Any]):
+        """Атомарная запись (вызывается под блокировкой)"""
+        temp_file = f"{self.filename}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(lease, f, indent=2, ensure_ascii=False)
+        os.replace(temp_file, self.filename)
+
+
+def load_lease_result(lease: Dict[str, Any], default_file: str) -> Optional[Dict[str, Any]]:
+    """Документ результата запуска, выполненного под арендой lease (для piggyback).
+
+    Документ принимается, только если запуск начался после захвата аренды -
+    иначе это результат более раннего запуска.
+    """
+    document = load_run_result(lease.get('run_result_file') or default_file)
+    if document is None or not document.get('started_at') or not lease.get('acquired_at'):
+        return None
+    if datetime.fromisoformat(document['started_at']) < datetime.fromisoformat(lease['acquired_at']):
+        return None
+    return document
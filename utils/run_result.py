@@ -0,0 +1,88 @@
+"""
+Документ результата запуска парсера (run_result.json) для scheduler'а и внешних инструментов
+"""
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+# Версия формата: увеличивается при несовместимых изменениях полей
+RUN_RESULT_VERSION = 1
+
+
+def build_run_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Документ из результата run_full_parsing: этапы, счетчики, изменения, коммит"""
+    session_stats = result.get('session_stats') or {}
+    parsing_result = result.get('parsing_result') or {}
+    update_result = result.get('update_result') or {}
+    download_result = result.get('download_result') or {}
+    github_result = result.get('github_result') or {}
+
+    started = session_stats.get('start_time')
+    finished = session_stats.get('end_time') or time.time()
+
+    return {
+        'version': RUN_RESULT_VERSION,
+        'success': bool(result.get('success')),
+        # Запуск остановлен досрочно (мягкая остановка): счетчики и файлы частичные
+        'cancelled': bool(result.get('cancelled')),
+        'error': result.get('error'),
+        'started_at': datetime.fromtimestamp(started).isoformat() if started else None,
+        'finished_at': datetime.fromtimestamp(finished).isoformat(),
+        'duration': result.get('duration', finished - started if started else 0.0),
+        'phase_timings': result.get('phase_timings') or {},
+        'counts': {
+            'total_processed': parsing_result.get('total_processed', 0),
+            'successful': parsing_result.get('successful', 0),
+            'failed': parsing_result.get('failed', 0),
+            'success_rate': parsing_result.get('success_rate', 0),
+            'cache_hits': parsing_result.get('cache_hits', 0),
+            'recovery_attempts': parsing_result.get('recovery_attempts', 0)
+        },
+        'diff': {
+            'inputs_changed': bool(download_result.get('changed')),
+            'total_updated': update_result.get('total_updated', 0),
+            'relay_updated': update_result.get('relay_updated', 0),
+            'server_updated': update_result.get('server_updated', 0),
+            'files': update_result.get('files', {})
+        },
+        'github': {
+            'success': bool(github_result.get('success')),
+            'reason': github_result.get('reason'),
+            'commit_sha': github_result.get('commit_sha'),
+            # SHA-256 отправленного содержимого {путь в репозитории: sha256}
+            'pushed_files': github_result.get('pushed_files') or {}
+        },
+        'results_file': result.get('results_file')
+    }
+
+
+def write_run_result(filename: str, document: Dict[str, Any]) -> bool:
+    """Атомарная запись: временный файл и os.replace"""
+    try:
+        directory = os.path.dirname(os.path.abspath(filename))
+        os.makedirs(directory, exist_ok=True)
+        temp_file = f"{filename}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(document, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, filename)
+        return True
+    except Exception as e:
+        print(f"⚠️ Не удалось записать результат запуска: {e}")
+        return False
+
+
+def load_run_result(filename: str) -> Optional[Dict[str, Any]]:
+    """Чтение документа; None, если файла нет, он поврежден или другой версии"""
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            document = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(document, dict) or document.get('version') != RUN_RESULT_VERSION:
+        return None
+    return document
@@ -0,0 +1,285 @@
+"""
+Запись и воспроизведение сайта dnscrypt.info для офлайн прогонов парсера
+
+Запись:        python -m utils.site_replay record --out bench/fixtures/site
+Воспроизведение: python -m utils.site_replay serve bench/fixtures/site --latency 0.05
+"""
+import os
+import sys
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+DEFAULT_URL = "https://dnscrypt.info/public-servers"
+MANIFEST_FILE = "manifest.json"
+REPLAY_PREFIX = "/_replay/"
+
+# Типы содержимого, в которых переписываются абсолютные ссылки
+TEXT_TYPES = ('text/', 'javascript', 'json', 'xml', 'css')
+
+
+class SiteRecorder:
+    """Запись HTML/JS/данных страницы через performance-лог Chrome (CDP)"""
+
+    def __init__(self, driver, output_dir: str):
+        self.driver = driver
+        self.output_dir = output_dir
+        self.bodies_dir = os.path.join(output_dir, "bodies")
+
+    def collect(self, entry_url: str) -> Dict[str, Any]:
+        """Сбор всех ответов из performance-лога и сохранение фикстуры"""
+        os.makedirs(self.bodies_dir, exist_ok=True)
+
+        responses = {}
+        for entry in self.driver.get_log('performance'):
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            if message.get('method') != 'Network.responseReceived':
+                continue
+            params = message['params']
+            response = params['response']
+            if not response.get('url', '').startswith('http'):
+                continue
+            responses[response['url']] = {
+                'request_id': params['requestId'],
+                'status': response.get('status', 200),
+                'content_type': response.get('mimeType') or 'application/octet-stream'
+            }
+
+        resources = {}
+        for url, info in responses.items():
+            try:
+                body = self.driver.execute_cdp_cmd(
+                    'Network.getResponseBody', {'requestId': info['request_id']}
+                )
+            except Exception as e:
+                print(f"⚠️ Тело ответа недоступно для {url}: {e}")
+                continue
+
+            data = body.get('body', '')
+            content = base64.b64decode(data) if body.get('base64Encoded') else data.encode('utf-8')
+
+            filename = hashlib.sha1(url.encode('utf-8')).hexdigest()
+            with open(os.path.join(self.bodies_dir, filename), 'wb') as f:
+                f.write(content)
+
+            resources[url] = {
+                'file': filename,
+                'status': info['status'],
+                'content_type': info['content_type']
+            }
+
+        parts = urlsplit(entry_url)
+        manifest = {
+            'origin': f"{parts.scheme}://{parts.netloc}",
+            'entry': parts.path or '/',
+            'recorded_at': datetime.now().isoformat(),
+            'resources': resources
+        }
+        with open(os.path.join(self.output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+        print(f"💾 Записано {len(resources)} ответов в {self.output_dir}")
+        return manifest
+
+
+class ReplayServer:
+    """Локальный HTTP сервер, отдающий записанные ответы с настраиваемой задержкой"""
+
+    def __init__(self, fixture_dir: str, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        self.fixture_dir = fixture_dir
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+
+        # Детерминированный генератор задержек для воспроизводимых замеров
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        with open(os.path.join(fixture_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._routes: Dict[str, Dict[str, Any]] = {}
+        self.requests_served = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def entry_url(self) -> str:
+        return self.base_url + self.manifest.get('entry', '/')
+
+    def url_for(self, original_url: str) -> str:
+        """Локальный адрес для исходного URL"""
+        parts = urlsplit(original_url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        if origin == self.manifest['origin']:
+            return self.base_url + path
+        return f"{self.base_url}{REPLAY_PREFIX}{parts.netloc}{path}"
+
+    def start(self) -> 'ReplayServer':
+        """Запуск сервера в фоновом потоке"""
+        handler = self._make_handler()
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._load_routes()
+
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"🎬 Replay сервер запущен: {self.entry_url} "
+              f"(задержка {self.latency * 1000:.0f}±{self.jitter * 1000:.0f} мс)")
+        return self
+
+    def stop(self):
+        """Остановка сервера"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            print(f"🎬 Replay сервер остановлен, обслужено запросов: {self.requests_served}")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _load_routes(self):
+        """Подготовка маршрутов: тела читаются и переписываются один раз"""
+        hosts = {urlsplit(url).netloc for url in self.manifest['resources']}
+        origin_host = urlsplit(self.manifest['origin']).netloc
+        replacements = []
+        for host in hosts:
+            local = self.base_url if host == origin_host else f"{self.base_url}{REPLAY_PREFIX}{host}"
+            replacements.append((f"https://{host}".encode(), local.encode()))
+            replacements.append((f"http://{host}".encode(), local.encode()))
+        # Длинные хосты первыми, чтобы не задеть их префиксы
+        replacements.sort(key=lambda item: len(item[0]), reverse=True)
+
+        for url, info in self.manifest['resources'].items():
+            with open(os.path.join(self.fixture_dir, 'bodies', info['file']), 'rb') as f:
+                body = f.read()
+            if any(marker in info['content_type'] for marker in TEXT_TYPES):
+                for source, target in replacements:
+                    body = body.replace(source, target)
+
+            route = self.url_for(url)[len(self.base_url):]
+            self._routes[route] = {
+                # Записанные 3xx (кэш, редиректы) отдаются как готовое содержимое
+                'status': 200 if 300 <= info['status'] < 400 else info['status'],
+                'content_type': info['content_type'],
+                'body': body
+            }
+
+    def _next_delay(self) -> float:
+        with self._lock:
+            return self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def _make_handler(self):
+        server = self
+
+        class ReplayHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                delay = server._next_delay()
+                if delay > 0:
+                    time.sleep(delay)
+
+                route = server._routes.get(self.path)
+                if route is None and '?' in self.path:
+                    # Параметры запроса (cache-busting) могут отличаться от записанных
+                    route = server._routes.get(self.path.split('?', 1)[0])
+                if route is None:
+                    self.send_error(404, "Not recorded")
+                    return
+
+                with server._lock:
+                    server.requests_served += 1
+                self.send_response(route['status'])
+                self.send_header('Content-Type', route['content_type'])
+                self.send_header('Content-Length', str(len(route['body'])))
+                self.send_header('Cache-Control', 'no-store')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self.wfile.write(route['body'])
+
+            def log_message(self, format, *args):
+                # Лог каждого запроса искажает замеры времени
+                pass
+
+        return ReplayHandler
+
+
+def record_site(url: str, output_dir: str) -> Dict[str, Any]:
+    """Запись страницы после загрузки данных и настройки пагинации"""
+    from core.config import ParserConfig
+    from core.driver_manager import SmartDriverManager
+    from page_handlers.page_navigator import PageNavigator
+    from page_handlers.pagination_manager import PaginationManager
+
+    config = ParserConfig.from_env()
+    config.RECORD_NETWORK = True
+    driver_manager = SmartDriverManager(config)
+    driver = driver_manager.create_stealth_driver()
+    try:
+        if not PageNavigator(driver, config).navigate_to_page(url):
+            print("⚠️ Страница загрузилась с проблемами, записываем что есть")
+        PaginationManager(driver, config).setup_pagination()
+        return SiteRecorder(driver, output_dir).collect(url)
+    finally:
+        driver_manager.quit_driver()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Запись и воспроизведение dnscrypt.info")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', help="записать сайт в фикстуру")
+    record.add_argument('--url', default=DEFAULT_URL)
+    record.add_argument('--out', required=True)
+
+    serve = commands.add_parser('serve', help="воспроизвести фикстуру локально")
+    serve.add_argument('fixture_dir')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--latency', type=float, default=0.0, help="задержка ответа, секунды")
+    serve.add_argument('--jitter', type=float, default=0.0, help="случайная добавка, секунды")
+    serve.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        record_site(args.url, args.out)
+        return 0
+
+    server = ReplayServer(args.fixture_dir, args.host, args.port,
+                          args.latency, args.jitter, args.seed).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.exit(main())